@@ -1,20 +1,18 @@
-import random
-from copy import copy
+from typing import Optional
 
-import gymnasium as gym
-from gymnasium import spaces
 import numpy as np
-from typing import Dict, Tuple, List
 
-from numpy.random import logseries
-
-from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.state_index import Observation
 
 
 class LiarsBarGame:
-    def __init__(self, logs = False):
+    def __init__(self, logs = False, round_cls = None, rng: Optional[np.random.Generator] = None):
+        """rng draws the lives and is handed to every round; a seed is accepted too."""
         self._agents = []
+        self._round_cls = FastLiarsBarRound if round_cls is None else round_cls
+        self._rng = np.random.default_rng(rng)
         self._agent_lives = []
+        self._eliminated = []
         self._starting_player_index = 0
         self._logs = logs
 
@@ -31,7 +29,7 @@ class LiarsBarGame:
 
             current_players = self._get_alive_players()
 
-            game_round = LiarsBarRound(current_players, self._starting_player_index, self._logs)
+            game_round = self._round_cls(current_players, self._starting_player_index, self._logs, self._rng)
             loser_index = game_round.run_round()
 
             self._shoot_player(self._agents.index(current_players[loser_index]))
@@ -46,7 +44,8 @@ class LiarsBarGame:
 
 
     def initialize_game_state(self):
-        self._agent_lives = [random.choice([1, 2, 3, 4, 5, 6]) for _ in self._agents]
+        self._agent_lives = self._rng.integers(1, 7, size=len(self._agents)).tolist()
+        self._eliminated = []
 
     def _get_alive_players(self):
         players = []
@@ -66,6 +65,12 @@ class LiarsBarGame:
 
     def _shoot_player(self, index):
         self._agent_lives[index] -= 1
+        if self._agent_lives[index] == 0:
+            self._eliminated.append(index)
+
+    def get_ranking(self):
+        """Agent indices of the last game from the winner to the first player eliminated."""
+        return [self._get_winner_index()] + self._eliminated[::-1]
 
     def _get_winner_index(self):
         for index, agent in enumerate(self._agents):
@@ -85,14 +90,18 @@ class LiarsBarGame:
                 break
 
 
+DECK = (0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3)
+HAND_SIZE = 5
+
+
 class LiarsBarRound:
-    def __init__(self, players, starting_player, logs = False):
+    def __init__(self, players, starting_player, logs = False, rng: Optional[np.random.Generator] = None):
         self._players = players
+        self._rng = np.random.default_rng(rng)
         self._generate_hands()
         self._current_player = starting_player
         self._previous_player = None
         self._previous_action = None
-        self._table_card = random.choice([1, 2, 3])
         self._history = []
         self._loser = None
         self._logs = logs
@@ -114,26 +123,23 @@ class LiarsBarRound:
 
 
     def _generate_hands(self):
-        deck = [0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3]
+        # The uniforms of the deal and of the table card are drawn in one call
+        uniforms = self._rng.random(len(self._players) * HAND_SIZE + 1).tolist()
+        self._table_card = 1 + int(uniforms.pop() * 3)
+        deck = list(DECK)
+        uniform = iter(uniforms)
         self._hands = []
 
         for _ in self._players:
             hand = [0, 0, 0, 0]
-            for _ in range(5):
-                card = random.choice(deck)
-                deck.pop(deck.index(card))
+            for _ in range(HAND_SIZE):
+                card = deck.pop(int(next(uniform) * len(deck)))
                 hand[card] += 1
             self._hands.append(hand)
 
-    def _get_state(self) -> Dict:
-        hand = self._hands[self._current_player]
-
-        return {
-            "num_players": len(self._players),
-            "hand": copy(hand),
-            "table_card": copy(self._table_card),
-            "history": copy(self._history),
-        }
+    def _get_state(self) -> Observation:
+        return Observation(tuple(self._hands[self._current_player]), self._table_card, tuple(self._history),
+                           len(self._players))
 
     def _perform_action(self, action):
         if action == [0, 0, 0, 0]:
@@ -167,14 +173,89 @@ class LiarsBarRound:
         self._history.append(sum(action))
 
 
+class FastLiarsBarRound:
+    """
+    Same round as LiarsBarRound with the per-step work kept small: hands are dealt
+    with one pass of a partial shuffle of the deck, the cards left of every player and the
+    cards on the table are counted incrementally, and hands and history are
+    immutable tuples, so the Observation given to act() shares them instead of copying.
+    """
 
+    def __init__(self, players, starting_player, logs = False, rng: Optional[np.random.Generator] = None):
+        self._players = players
+        self._num_players = len(players)
+        self._rng = np.random.default_rng(rng)
+        self._generate_hands()
+        self._current_player = starting_player
+        self._previous_player = None
+        self._previous_action = None
+        self._history = ()
+        self._loser = None
+        self._logs = logs
 
+    def run_round(self):
+        while self._loser is None:
+            action = self._players[self._current_player].act(self._get_state())
 
+            if self._logs:
+                print(f"Player: {self._current_player} - {self._players[self._current_player].name} has hand: {list(self._hands[self._current_player])} and played: {action}")
 
+            self._perform_action(action)
 
+        return self._loser
 
+    def _generate_hands(self):
+        # Partial Fisher-Yates: every card is drawn from the cards not dealt yet,
+        # which are kept at the front of the deck. The uniforms of the deal and of the
+        # table card are drawn in one call.
+        uniforms = self._rng.random(self._num_players * HAND_SIZE + 1).tolist()
+        self._table_card = 1 + int(uniforms.pop() * 3)
+        deck = list(DECK)
+        remaining = len(deck)
+        uniform = iter(uniforms)
+        self._hands = []
+        for _ in range(self._num_players):
+            hand = [0, 0, 0, 0]
+            for _ in range(HAND_SIZE):
+                index = int(next(uniform) * remaining)
+                remaining -= 1
+                hand[deck[index]] += 1
+                deck[index] = deck[remaining]
+            self._hands.append(tuple(hand))
+        self._cards_left = [HAND_SIZE] * self._num_players
 
+    def _get_state(self) -> Observation:
+        return Observation(self._hands[self._current_player], self._table_card, self._history, self._num_players)
 
+    def _perform_action(self, action):
+        if action[0] == action[1] == action[2] == action[3] == 0:
+            self._challenge()
+        else:
+            self._play_cards(action)
 
+        self._previous_player = self._current_player
+        self._previous_action = action
+
+        player = (self._current_player + 1) % self._num_players
+        while self._cards_left[player] == 0:
+            player = (player + 1) % self._num_players
+        self._current_player = player
+
+    def _challenge(self):
+        action = self._previous_action
+        if action[0] + action[self._table_card] != action[0] + action[1] + action[2] + action[3]:
+            self._loser = self._previous_player
+            if self._logs:
+                print(f"Player: {self._previous_player} - {self._players[self._previous_player].name} has been caught lying")
+        else:
+            self._loser = self._current_player
+            if self._logs:
+                print(f"Player: {self._current_player} - {self._players[self._current_player].name} has challenged incorrectly")
 
+    def _play_cards(self, action):
+        hand = self._hands[self._current_player]
+        self._hands[self._current_player] = (hand[0] - action[0], hand[1] - action[1], hand[2] - action[2], hand[3] - action[3])
 
+        cards = action[0] + action[1] + action[2] + action[3]
+        self._cards_left[self._current_player] -= cards
+        self._history += (cards,)
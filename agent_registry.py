@@ -0,0 +1,93 @@
+"""
+Registry of the agent types, imported on first use.
+
+Only the registry is imported up front; an agent's module (and its backend:
+gymnasium for the trainers, torch for DQN) is imported the first time the type is
+asked for, so processes that never meet a DQN agent never import torch.
+
+    agent_cls = agent_class("MonteCarloAgent")
+    agent = load_agent("checkpoints/mc1000")
+"""
+import importlib
+import os
+import pickle
+from typing import Dict, NamedTuple, Optional
+
+
+class AgentType(NamedTuple):
+    agent: str                     # "module:Class" of the agent
+    trainer: Optional[str] = None  # "module:Class" or "module:function" that trains it
+
+
+AGENT_TYPES: Dict[str, AgentType] = {
+    "MonteCarloAgent": AgentType("monte_carlo.mc_agent:MonteCarloAgent", "monte_carlo.mc_trainer:MonteCarloTrainer"),
+    "SarsaAgent": AgentType("sarsa.sarsa_agent:SarsaAgent", "sarsa.sarsa_agent:SarsaTrainer"),
+    "QLearningAgent": AgentType("qlearn.q_agent:QLearningAgent", "qlearn.q_trainer:QLearningTrainer"),
+    "DQNAgent": AgentType("dqn.dqn_agent:DQNAgent", "dqn.dqn_train:train_n_dqn"),
+    "NumpyDQNPolicy": AgentType("dqn.numpy_qnetwork:NumpyDQNPolicy"),
+    "BluffOracleAgent": AgentType("solver.bluff_oracle:BluffOracleAgent"),
+    "EndgameAgent": AgentType("solver.endgame:EndgameAgent"),
+    "PolicyAgent": AgentType("solver.policy:PolicyAgent", "solver.mccfr:train_mccfr"),
+    "HumanAgent": AgentType("HumanAgent:HumanAgent"),
+}
+
+
+def register_agent_type(name: str, agent: str, trainer: Optional[str] = None):
+    AGENT_TYPES[name] = AgentType(agent, trainer)
+
+
+def _resolve(path: str):
+    module, name = path.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _agent_type(name: str) -> AgentType:
+    if name not in AGENT_TYPES:
+        raise ValueError(f"Unknown agent type {name}, registered: {', '.join(AGENT_TYPES)}")
+    return AGENT_TYPES[name]
+
+
+def agent_class(name: str):
+    return _resolve(_agent_type(name).agent)
+
+
+def trainer_class(name: str):
+    trainer = _agent_type(name).trainer
+    if trainer is None:
+        raise ValueError(f"Agent type {name} has no trainer.")
+    return _resolve(trainer)
+
+
+def load_agent(path):
+    """
+    Load an agent saved to `path`: Q-table checkpoint directories (memory-mapped,
+    so all workers share one copy), DQN checkpoints, pickled DQNAgent .pt files,
+    DQN weights exported to .npz (played with NumPy, without importing torch) or pickles.
+    """
+    path = os.fspath(path)
+    if os.path.isdir(path):
+        from monte_carlo.checkpoint import read_meta
+        return agent_class(read_meta(path)["agent"]).load(path, mmap=True)
+
+    if path.endswith(".npz"):
+        return agent_class("NumpyDQNPolicy").load(path)
+
+    if path.endswith(".pt"):
+        import torch
+        try:
+            return agent_class("DQNAgent").load(path)
+        except (pickle.UnpicklingError, ValueError):
+            # Whole agents pickled before the weights-only checkpoints
+            return torch.load(path, weights_only=False)
+
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def build_agent(spec):
+    """Agent described by spec: a checkpoint path, a factory, or an agent."""
+    if isinstance(spec, (str, os.PathLike)):
+        return load_agent(spec)
+    if callable(spec) and not hasattr(spec, "act"):
+        return spec()
+    return spec
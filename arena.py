@@ -1,81 +1,84 @@
-from random import shuffle
-
-from HumanAgent import HumanAgent
-from LiarsBarArena import LiarsBarGame
-from dqn.dqn_train import train_n_dqn
-from monte_carlo.mc_agent import MonteCarloAgent
-from monte_carlo.mc_env import LiarsBarEdiEnv
-from monte_carlo.mc_trainer import MonteCarloTrainer
-from monte_carlo.random_agent import RandomAgent
-from qlearn.q_agent import QLearningAgent
-from qlearn.q_trainer import QLearningTrainer
-from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
-
-env = LiarsBarEdiEnv()
-mc10000 = MonteCarloAgent(env)
-mc1000 = MonteCarloAgent(env)
-mc100 = MonteCarloAgent(env)
-mc10 = MonteCarloAgent(env)
-
-human = HumanAgent()
-
-sarsa1000 = SarsaAgent(env)
-sarsa100 = SarsaAgent(env)
-
-qlearn1000 = QLearningAgent(env)
-qlearn100 = QLearningAgent(env)
-
-wins = [0, 0, 0, 0]
-agents = []
-agents_index = [0,1,2,3]
-
-no_agents = 4
-dqn_env = LiarsBarEdiEnv(num_players=4)
-dqn_agents = train_n_dqn(dqn_env, no_agents=no_agents, episodes=100)
-
-# trainer = MonteCarloTrainer(env, mc10000)
-# trainer.train(episodes=10000)
-trainer = MonteCarloTrainer(env, mc1000)
-trainer.train(episodes=1000)
-trainer = MonteCarloTrainer(env, mc100)
-trainer.train(episodes=100)
-# trainer = MonteCarloTrainer(env, mc10)
-# trainer.train(episodes=10)
-
-trainer = SarsaTrainer(env, sarsa1000)
-trainer.train(episodes=1000)
-trainer = SarsaTrainer(env, sarsa100)
-trainer.train(episodes=100)
-
-trainer = QLearningTrainer(env, qlearn1000)
-trainer.train(episodes=1000)
-trainer = QLearningTrainer(env, qlearn100)
-trainer.train(episodes=100)
-
-agents.append(qlearn1000)
-agents.append(sarsa1000)
-agents.append(dqn_agents[0])
-agents.append(mc1000)
-# arena.register_agent(dqn_agents[0])
-# arena.register_agent(dqn_agents[1])
-
-for i in range(1000):
-    arena = LiarsBarGame()
-    arena.register_agent(agents[agents_index[0]])
-    arena.register_agent(agents[agents_index[1]])
-    arena.register_agent(agents[agents_index[2]])
-    arena.register_agent(agents[agents_index[3]])
-    print(i)
-    winner = arena.run_game()
-    wins[agents_index[winner]] += 1
-    shuffle(agents_index)
-
-
-print(wins)
+import os
+
+from agent_registry import agent_class, build_agent, trainer_class
+from tournament import run_tournament, seat_schedule
+
+CHECKPOINTS = "checkpoints"
+
+
+def load_or_train(agent_type, env, episodes, name):
+    """Load the agent from checkpoints/<name>, or train it and save it there."""
+    agent_cls = agent_class(agent_type)
+    path = os.path.join(CHECKPOINTS, name)
+    if os.path.exists(path):
+        return agent_cls.load(path, env)
+
+    agent = agent_cls(env)
+    trainer_class(agent_type)(env, agent).train(episodes=episodes)
+    agent.save(path)
+    return agent
+
+
+def train_dqn(episodes, name):
+    """
+    Train 4 DQN agents and save the first one, unless it is already saved.
+    Returns the path of its exported weights, which the workers play with NumPy, without importing torch.
+    """
+    from monte_carlo.mc_env import LiarsBarEdiEnv
+
+    path = os.path.join(CHECKPOINTS, f"{name}.npz")
+    if not os.path.exists(path):
+        train_n_dqn = trainer_class("DQNAgent")
+        dqn_agents = train_n_dqn(LiarsBarEdiEnv(num_players=4), no_agents=4, episodes=episodes)
+        dqn_agents[0].save(os.path.join(CHECKPOINTS, f"{name}.pt"))
+        dqn_agents[0].export_weights(path)
+    return path
+
+
+def solve_endgame(iterations, name):
+    """Solve the 2-player round with CFR+ (see solver.endgame), unless its policy is already saved."""
+    path = os.path.join(CHECKPOINTS, name)
+    if not os.path.exists(path):
+        from solver.endgame import solve
+        solve(iterations).save(path)
+    return path
+
+
+if __name__ == "__main__":
+    # The environment (and gymnasium) is only needed to train the agents without a checkpoint
+    from monte_carlo.mc_env import LiarsBarEdiEnv
+    env = LiarsBarEdiEnv()
+
+    load_or_train("MonteCarloAgent", env, 1000, "mc1000")
+    load_or_train("MonteCarloAgent", env, 100, "mc100")
+    load_or_train("SarsaAgent", env, 1000, "sarsa1000")
+    load_or_train("SarsaAgent", env, 100, "sarsa100")
+    load_or_train("QLearningAgent", env, 1000, "qlearn1000")
+    load_or_train("QLearningAgent", env, 100, "qlearn100")
+    dqn100 = train_dqn(100, "dqn100")
+    endgame = solve_endgame(1000, "endgame")
+
+    # Agents are given as checkpoint paths, the workers share the memory-mapped tables
+    lineup = {
+        "qlearn1000": os.path.join(CHECKPOINTS, "qlearn1000"),
+        "sarsa1000": os.path.join(CHECKPOINTS, "sarsa1000"),
+        "dqn_agents[0]": dqn100,
+        "mc1000": os.path.join(CHECKPOINTS, "mc1000"),
+        "bluff_oracle": agent_class("BluffOracleAgent")(),
+        "endgame": endgame,
+    }
+    # Every seating of the lineup is played the same number of times (3 x 360 = 1080 matches)
+    result = run_tournament(lineup, matches=3 * len(seat_schedule(len(lineup), 4)), seats=4)
+
+    print(result)
+    print()
+    # Win counts depend on the lineups, exploitability in the 2-player round does not
+    from solver.exploitability import report
+    print(report({name: build_agent(spec) for name, spec in lineup.items()}))
 
 # mc10000: 21 - mc1000: 8 - dqn100: 61 - dqn100: 10
 # mc10000: 17 - mc1000:  64 - dqn100: 13 - dqn100: 6
 # mc10000: 185 - mc1000:  529 - dqn300: 243 - dqn300: 43
 # sarsa1000: 603 - dqn100: 46 - dqn100: 59 - mc1000: 292 (with shuffled players)
 # qlearn1000: 205 - dqn_agent[1]: 46 - dqn_agent[0]:374 - mc1000: 375
-# qlearn1000: 135 - sarsa1000: 483 - dqn_agent[0]: 49 - mc1000: 333
\ No newline at end of file
+# qlearn1000: 135 - sarsa1000: 483 - dqn_agent[0]: 49 - mc1000: 333
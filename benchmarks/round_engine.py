@@ -0,0 +1,55 @@
+"""
+Rounds per second of LiarsBarRound against FastLiarsBarRound.
+
+    python -m benchmarks.round_engine --rounds 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from LiarsBarArena import FastLiarsBarRound, LiarsBarRound
+
+
+class RandomCardAgent:
+    """Challenges 30% of the time and otherwise plays one random card, cheap enough not to hide the engine cost."""
+
+    name = "RandomCardAgent"
+
+    def __init__(self, rng: np.random.Generator):
+        self.rng = rng
+
+    def act(self, state):
+        hand = state["hand"]
+        history = state["history"]
+        if history and (self.rng.random() < 0.3 or state["num_players"] * 5 - sum(history) == sum(hand)):
+            return [0, 0, 0, 0]
+        action = [0, 0, 0, 0]
+        ranks = [rank for rank in range(4) if hand[rank] > 0]
+        action[ranks[int(self.rng.random() * len(ranks))]] = 1
+        return action
+
+
+def rounds_per_second(round_cls, rounds: int, num_players: int = 4, seed: int = 0) -> float:
+    rng = np.random.default_rng(seed)
+    players = [RandomCardAgent(rng) for _ in range(num_players)]
+    start = time.perf_counter()
+    for i in range(rounds):
+        round_cls(players, i % num_players, rng=rng).run_round()
+    return rounds / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20000)
+    parser.add_argument("--players", type=int, default=4)
+    args = parser.parse_args()
+
+    before = rounds_per_second(LiarsBarRound, args.rounds, args.players)
+    after = rounds_per_second(FastLiarsBarRound, args.rounds, args.players)
+    print(f"LiarsBarRound:     {before:10.0f} rounds/sec")
+    print(f"FastLiarsBarRound: {after:10.0f} rounds/sec ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
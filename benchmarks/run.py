@@ -0,0 +1,104 @@
+"""
+Run the benchmark suite, write the results as JSON and compare them with a baseline.
+
+    python -m benchmarks.run                                  # everything, compared with benchmarks/baseline.json
+    python -m benchmarks.run env_step round_engine --scale 0.2
+    python -m benchmarks.run --output results.json --threshold 0.25
+    python -m benchmarks.run --save-baseline                  # overwrite the baseline with this run
+
+The exit code is 1 when a metric regressed by more than the threshold
+(a relative drop of a throughput or a relative growth of a memory peak).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.suite import BENCHMARKS, Metric, run
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.2
+
+
+def to_json(metrics: List[Metric], scale: float) -> Dict:
+    return {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "scale": scale,
+        },
+        "results": {
+            metric.name: {"value": metric.value, "unit": metric.unit, "higher_is_better": metric.higher_is_better}
+            for metric in metrics
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Names (with details) of the metrics that regressed by more than threshold against the baseline."""
+    regressions = []
+    for name, current in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None or reference["value"] == 0:
+            continue
+        change = current["value"] / reference["value"] - 1
+        if not current["higher_is_better"]:
+            change = -change
+        if change < -threshold:
+            regressions.append(f"{name}: {current['value']:.6g} {current['unit']} vs baseline {reference['value']:.6g} ({change:+.1%})")
+    return regressions
+
+
+def print_table(results: Dict, baseline: Dict = None):
+    width = max(len(name) for name in results["results"])
+    for name, current in results["results"].items():
+        line = f"{name:<{width}}  {current['value']:14.6g} {current['unit']:<12}"
+        reference = baseline["results"].get(name) if baseline else None
+        if reference and reference["value"]:
+            line += f"  baseline {reference['value']:14.6g}  ({current['value'] / reference['value'] - 1:+.1%})"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Liar's Bar benchmark suite")
+    parser.add_argument("benchmarks", nargs="*", help=f"subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the amount of work of every benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the baseline file")
+    args = parser.parse_args(argv)
+
+    results = to_json(run(args.benchmarks, args.scale), args.scale)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print_table(results)
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_table(results, baseline)
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
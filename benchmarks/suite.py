@@ -0,0 +1,263 @@
+"""
+Throughput and memory benchmarks of the environments, agents and trainers.
+
+Every benchmark is a function registered with @benchmark that takes a scale
+(multiplies the amount of work, not the result) and returns Metric values.
+Throughputs are per second and higher is better; memory is in bytes and lower is better.
+"""
+import contextlib
+import copy
+import io
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+
+from LiarsBarArena import FastLiarsBarRound, LiarsBarRound
+from benchmarks.round_engine import rounds_per_second
+from monte_carlo.mc_env import LiarsBarEdiEnv
+
+
+class Metric(NamedTuple):
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+
+
+BENCHMARKS: Dict[str, Callable[[float], List[Metric]]] = {}
+MEMORY_EPISODES = 2000
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def seed_everything(seed: int = 0) -> np.random.Generator:
+    """Seed the global generators and return a Generator for the envs and agents."""
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        import torch
+    except ImportError:
+        pass
+    else:
+        torch.manual_seed(seed)
+    return np.random.default_rng(seed)
+
+
+@contextlib.contextmanager
+def quiet():
+    """The trainers print every episode, which would dominate the timings."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def random_legal_action(env: LiarsBarEdiEnv):
+    return random.choice(env._get_available_actions())
+
+
+def sample_states(count: int, seed: int = 0) -> List[Dict]:
+    """Observations met by random play, used to time act()."""
+    env = LiarsBarEdiEnv(rng=seed_everything(seed))
+    states = []
+    while len(states) < count:
+        env.reset()
+        done = False
+        while not done and len(states) < count:
+            states.append(env.get_obs())
+            _, _, done, _ = env.step(random_legal_action(env))
+    return states
+
+
+def per_second(count: int, seconds: float) -> float:
+    return count / max(seconds, 1e-9)
+
+
+@benchmark
+def env_step(scale: float) -> List[Metric]:
+    rng = seed_everything()
+    steps = int(20000 * scale)
+
+    env = LiarsBarEdiEnv(rng=rng)
+    env.reset()
+    elapsed = 0.0
+    for _ in range(steps):
+        action = random_legal_action(env)
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        elapsed += time.perf_counter() - start
+        if done:
+            env.reset()
+    metrics = [Metric("LiarsBarEdiEnv.step", per_second(steps, elapsed), "steps/s")]
+
+    from qlearn.q_env import QLearningEnv
+    env = QLearningEnv(num_players=4, rng=rng)
+    env.reset()
+    elapsed = 0.0
+    for _ in range(steps):
+        hand = env.players[env.player_turn]["hand"]
+        action = [0, 0, 0, 0]
+        if not env.last_played_cards or (random.random() >= 0.3 and env._calculate_active_players_in_round() > 1):
+            action[random.choice([rank for rank in range(4) if hand[rank] > 0])] = 1
+        start = time.perf_counter()
+        _, _, done, _ = env.step(action)
+        elapsed += time.perf_counter() - start
+        if done:
+            env.reset()
+    metrics.append(Metric("QLearningEnv.step", per_second(steps, elapsed), "steps/s"))
+    return metrics
+
+
+@benchmark
+def round_engine(scale: float) -> List[Metric]:
+    rounds = int(20000 * scale)
+    return [
+        Metric("LiarsBarRound.run_round", rounds_per_second(LiarsBarRound, rounds), "rounds/s"),
+        Metric("FastLiarsBarRound.run_round", rounds_per_second(FastLiarsBarRound, rounds), "rounds/s"),
+    ]
+
+
+def _tabular_agents():
+    from monte_carlo.mc_agent import MonteCarloAgent
+    from monte_carlo.mc_trainer import MonteCarloTrainer
+    from qlearn.q_agent import QLearningAgent
+    from qlearn.q_trainer import QLearningTrainer
+    from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
+    return {
+        "MonteCarloAgent": (MonteCarloAgent, MonteCarloTrainer),
+        "SarsaAgent": (SarsaAgent, SarsaTrainer),
+        "QLearningAgent": (QLearningAgent, QLearningTrainer),
+    }
+
+
+def _trained_agents(episodes: int):
+    from dqn.dqn_train import train_n_dqn
+
+    agents = {}
+    for name, (agent_cls, trainer_cls) in _tabular_agents().items():
+        rng = seed_everything()
+        env = LiarsBarEdiEnv(rng=rng)
+        agents[name] = agent_cls(env, rng=rng)
+        with quiet():
+            trainer_cls(env, agents[name]).train(episodes=episodes)
+    rng = seed_everything()
+    with quiet():
+        agents["DQNAgent"] = train_n_dqn(LiarsBarEdiEnv(rng=rng), no_agents=1, episodes=max(1, episodes // 10))[0]
+    agents["DQNAgent[numpy]"] = copy.deepcopy(agents["DQNAgent"])
+    agents["DQNAgent[numpy]"].backend = "numpy"
+    return agents
+
+
+@benchmark
+def agent_decisions(scale: float) -> List[Metric]:
+    decisions = int(5000 * scale)
+    agents = _trained_agents(200)
+    states = sample_states(decisions, seed=1)
+
+    metrics = []
+    for name, agent in agents.items():
+        seed_everything()
+        start = time.perf_counter()
+        for state in states:
+            agent.act(state)
+        metrics.append(Metric(f"{name}.act", per_second(decisions, time.perf_counter() - start), "decisions/s"))
+
+        # choose_action reads the legal actions from the agent's environment, so it is timed while playing
+        env = LiarsBarEdiEnv(rng=np.random.default_rng(0))
+        agent.env = env
+        env.reset()
+        elapsed = 0.0
+        for _ in range(decisions):
+            state = env.get_obs()
+            start = time.perf_counter()
+            action = agent.choose_action(state)
+            elapsed += time.perf_counter() - start
+            _, _, done, _ = env.step(action)
+            if done:
+                env.reset()
+        metrics.append(Metric(f"{name}.choose_action", per_second(decisions, elapsed), "decisions/s"))
+    return metrics
+
+
+@benchmark
+def trainer_episodes(scale: float) -> List[Metric]:
+    from dqn.dqn_train import train_n_dqn
+
+    episodes = int(500 * scale)
+    metrics = []
+    for name, (agent_cls, trainer_cls) in _tabular_agents().items():
+        rng = seed_everything()
+        env = LiarsBarEdiEnv(rng=rng)
+        trainer = trainer_cls(env, agent_cls(env, rng=rng))
+        start = time.perf_counter()
+        with quiet():
+            trainer.train(episodes=episodes)
+        metrics.append(Metric(f"{trainer_cls.__name__}.train", per_second(episodes, time.perf_counter() - start), "episodes/s"))
+
+    rng = seed_everything()
+    dqn_episodes = max(1, int(100 * scale))
+    start = time.perf_counter()
+    with quiet():
+        train_n_dqn(LiarsBarEdiEnv(rng=rng), no_agents=1, episodes=dqn_episodes)
+    metrics.append(Metric("train_n_dqn", per_second(dqn_episodes, time.perf_counter() - start), "episodes/s"))
+    return metrics
+
+
+@benchmark
+def q_table_memory(scale: float) -> List[Metric]:
+    """Peak memory allocated while training MEMORY_EPISODES episodes, whatever the scale."""
+    metrics = []
+    for name, (agent_cls, trainer_cls) in _tabular_agents().items():
+        rng = seed_everything()
+        env = LiarsBarEdiEnv(rng=rng)
+        agent = agent_cls(env, rng=rng)
+        trainer = trainer_cls(env, agent)
+        tracemalloc.start()
+        with quiet():
+            trainer.train(episodes=MEMORY_EPISODES)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics.append(Metric(f"{name}.peak_memory", peak, "bytes", higher_is_better=False))
+    return metrics
+
+
+# Imports done by the processes we start, timed in a fresh interpreter
+STARTUP_COMMANDS = {
+    "python": "pass",
+    "import arena": "import arena",
+    "tabular worker": "import tournament, agent_registry; agent_registry.agent_class('MonteCarloAgent')",
+    "numpy DQN worker": "import tournament, agent_registry; agent_registry.agent_class('NumpyDQNPolicy')",
+    "torch DQN worker": "import tournament, agent_registry; agent_registry.agent_class('DQNAgent')",
+}
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@benchmark
+def startup(scale: float) -> List[Metric]:
+    """Median wall time of starting an interpreter and doing the imports of STARTUP_COMMANDS."""
+    runs = max(3, int(5 * scale))
+    metrics = []
+    for name, command in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", command], cwd=REPOSITORY, check=True)
+            times.append(time.perf_counter() - start)
+        metrics.append(Metric(f"startup.{name}", float(np.median(times)), "s", higher_is_better=False))
+    return metrics
+
+
+def run(names: List[str] = None, scale: float = 1.0) -> List[Metric]:
+    metrics = []
+    for name in names or list(BENCHMARKS):
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}")
+        metrics.extend(BENCHMARKS[name](scale))
+    return metrics
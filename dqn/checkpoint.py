@@ -0,0 +1,95 @@
+"""
+DQN checkpoints holding only what is needed to rebuild the agent:
+
+    {"format", "version", "state_dict", "hyperparameters", "encoding"}
+
+The state_dict is the QNetwork weights and everything else is plain numbers and
+strings, so checkpoints load with torch.load(weights_only=True), without
+unpickling arbitrary objects (no env, optimizer or replay buffer).
+
+The saved_models/episodes_*.pt files are whole pickled DQNAgent objects;
+convert_legacy turns them into this format:
+
+    python -m dqn.checkpoint dqn/saved_models/episodes_100.pt checkpoints/dqn100.pt
+"""
+import argparse
+import os
+from typing import Dict
+
+import torch
+
+from monte_carlo.history_encoding import as_history_encoding
+
+FORMAT = "liars-bar-dqn"
+FORMAT_VERSION = 1
+
+# How observations and actions are turned into the network input, checked when loading
+ENCODING = {
+    "state_dim": 25,
+    "action_dim": 4,
+    "state": "hand counts [jokers, Q, K, A], table card, history padded with 0 to 20 plays",
+    "action": "card counts [jokers, Q, K, A], challenge is [0, 0, 0, 0]",
+}
+
+
+def encoding(hyperparameters: Dict) -> Dict:
+    """
+    ENCODING of an agent: the history is replaced by the features of its history encoding, and the
+    lie probability is appended to the state when it uses the bluff feature.
+    """
+    history_encoding = as_history_encoding(hyperparameters.get("history_encoding"))
+    if history_encoding.is_full and not hyperparameters.get("bluff_feature", False):
+        return ENCODING
+    result = dict(ENCODING)
+    if not history_encoding.is_full:
+        result["state_dim"] = 5 + history_encoding.feature_dim
+        result["state"] = f"hand counts [jokers, Q, K, A], table card, history features of {history_encoding}"
+    if hyperparameters.get("bluff_feature", False):
+        result["state_dim"] += 1
+        result["state"] += ", probability that the last play was a lie"
+    return result
+
+
+def save_checkpoint(path, state_dict: Dict, hyperparameters: Dict):
+    directory = os.path.dirname(os.fspath(path))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    torch.save({
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "state_dict": state_dict,
+        "hyperparameters": hyperparameters,
+        "encoding": encoding(hyperparameters),
+    }, path)
+
+
+def load_checkpoint(path) -> Dict:
+    checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+    if not isinstance(checkpoint, dict) or checkpoint.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a DQN checkpoint, legacy pickled agents can be converted with convert_legacy.")
+    if checkpoint["version"] > FORMAT_VERSION:
+        raise ValueError(f"Unsupported DQN checkpoint version {checkpoint['version']}.")
+    expected = encoding(checkpoint["hyperparameters"])
+    for name in ("state_dim", "action_dim"):
+        if checkpoint["encoding"][name] != expected[name]:
+            raise ValueError(f"Checkpoint {name} {checkpoint['encoding'][name]} does not match the encoding {expected[name]}.")
+    return checkpoint
+
+
+def convert_legacy(source, destination):
+    """Save a pickled DQNAgent (as written by dqn_test.py) as a weights-only checkpoint."""
+    agent = torch.load(source, map_location="cpu", weights_only=False)
+    agent.save(destination)
+    return agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickled DQNAgent files to weights-only checkpoints")
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+    convert_legacy(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()
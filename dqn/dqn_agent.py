@@ -1,14 +1,22 @@
-import random
+import copy
+import json
 import numpy as np
 import torch
 
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-from collections import deque
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+from dqn.checkpoint import load_checkpoint, save_checkpoint
+from dqn.numpy_qnetwork import ACTION_FEATURES, NumpyQNetwork, encode_state, state_dim
+from dqn.replay_buffer import PrioritizedReplayBuffer, ReplayBuffer
+from monte_carlo import actions
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
 from monte_carlo.mc_env import LiarsBarEdiEnv
+from solver.bluff_oracle import lie_probabilities
+
+BACKENDS = ("torch", "numpy")
 
 
 class QNetwork(nn.Module):
@@ -25,23 +33,15 @@ class QNetwork(nn.Module):
         return q_value
 
     def save(self, path):
-        torch.save(self.model.state_dict(), path)
-
-class ReplayBuffer:
-    def __init__(self, capacity=20000):
-        self.buffer = deque(maxlen=capacity)
-
-    def store(self, experience):
-        self.buffer.append(experience)
-
-    def sample(self, batch_size):
-        return random.sample(self.buffer, batch_size)
-
-    def __len__(self):
-        return len(self.buffer)
-
+        torch.save(self.state_dict(), path)
 
 class DQNAgent:
+    # Class defaults also cover agents pickled before the backends existed
+    backend = "torch"
+    bluff_feature = False
+    history_encoding = HistoryEncoding()
+    _numpy_network = None
+
     def __init__(
             self,
             env: LiarsBarEdiEnv,
@@ -49,8 +49,38 @@ class DQNAgent:
             epsilon=0.1,
             lr=1e-3,
             batch_size=32,
-            buffer_capacity=20000
+            buffer_capacity=20000,
+            use_target_network=False,
+            target_update="hard",
+            target_sync_every=100,
+            tau=0.005,
+            double_dqn=False,
+            mask_next_actions=True,
+            prioritized_replay=False,
+            per_alpha=0.6,
+            per_beta=0.4,
+            hidden_size=64,
+            backend="torch",
+            bluff_feature=False,
+            history_encoding: Optional[HistoryEncoding] = None,
+            rng: Optional[np.random.Generator] = None
     ):
+        """
+        - use_target_network: compute the targets with a copy of the network that follows it
+          every target_sync_every train steps ("hard") or by polyak averaging with tau ("soft")
+        - double_dqn: the online network picks the next action, the target network evaluates it
+        - mask_next_actions: only legal actions of the next state are candidates for max Q(s', a')
+        - prioritized_replay: sample transitions proportionally to their TD error (per_alpha, per_beta)
+        - backend: "numpy" evaluates the network with NumpyQNetwork when choosing actions,
+          from a copy of the weights refreshed after every train step; training always uses torch
+        - bluff_feature: append the probability that the last play was a lie (solver.bluff_oracle) to the state
+        - history_encoding: what of the history is in the state (monte_carlo.history_encoding, or its params)
+        - rng: generator of the exploration and of the replay buffer's samples (a seed is accepted too)
+        """
+        if target_update not in ("hard", "soft"):
+            raise ValueError(f"Unknown target update: {target_update}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
 
         self.name = "DQN Agent"
         self.env = env
@@ -58,34 +88,53 @@ class DQNAgent:
         self.epsilon = epsilon
         self.lr = lr
         self.batch_size = batch_size
-
-        self.memory = ReplayBuffer(capacity=buffer_capacity)
-        self.state_dim = 25
+        self.target_update = target_update
+        self.target_sync_every = target_sync_every
+        self.tau = tau
+        self.double_dqn = double_dqn
+        self.mask_next_actions = mask_next_actions
+        self.train_steps = 0
+        self.backend = backend
+        self.bluff_feature = bluff_feature
+        self.history_encoding = as_history_encoding(history_encoding)
+        self.rng = np.random.default_rng(rng)
+
+        self.state_dim = state_dim(self.history_encoding, bluff_feature)
         self.action_dim = 4
+        if prioritized_replay:
+            self.memory = PrioritizedReplayBuffer(capacity=buffer_capacity, state_dim=self.state_dim, alpha=per_alpha, beta=per_beta, seed=self.rng)
+        else:
+            self.memory = ReplayBuffer(capacity=buffer_capacity, state_dim=self.state_dim, seed=self.rng)
 
         # model and optimizer
         self.q_network = QNetwork(
             state_dim=self.state_dim,
             action_dim=self.action_dim,
-            hidden_size=64
+            hidden_size=hidden_size
         )
         self.optimizer = optim.Adam(self.q_network.parameters(), lr=self.lr)
         self.loss_fn = nn.MSELoss()
 
+        self.target_network = None
+        if use_target_network:
+            self.target_network = copy.deepcopy(self.q_network)
+            self.target_network.requires_grad_(False)
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        if "rng" not in state:
+            # Agents pickled before the rng existed get their own generator, not one shared by all of them
+            self.rng = np.random.default_rng()
+
     def encode_state(self, state: Dict) -> np.ndarray:
         """
         Encode the state in a np.array of shape (25,)
         - hand       -> 4 ints
         - table_card -> 1 int
-        - history    -> 20 ints ,concatenate 0 if it's shorter
+        - history    -> 20 ints ,concatenate 0 if it's shorter (or the features of history_encoding)
+        - with bluff_feature, the probability that the last play was a lie (solver.bluff_oracle) -> 1 float
         """
-        hand = state["hand"]
-        table_card = [state["table_card"]]
-        history = list(state["history"])
-        history = history + [0] * (20 - len(history))
-
-        state_vec = np.array(hand + table_card + history, dtype=np.float32)
-        return state_vec
+        return encode_state(state, self.bluff_feature, self.history_encoding)
 
     def encode_action(self, action: List[int]) -> np.ndarray:
         """
@@ -98,28 +147,102 @@ class DQNAgent:
         Epsilon-greedy: with probability epsilon, choose a random valid action,
                         else choose maximum Q action.
         """
-        available_actions = self.env._get_available_actions()
+        available_actions = np.flatnonzero(self.env.get_action_mask())
 
-        if np.random.rand() < self.epsilon:
-            return random.choice(available_actions)
+        if self.rng.random() < self.epsilon:
+            return actions.action_from_id(actions.random_action_id(available_actions, self.rng))
         else:
-            state_vec = self.encode_state(state)
-            best_action = None
-            best_q = -1e9
-
-            for a in available_actions:
-                a_vec = self.encode_action(a)
-                sa = np.concatenate([state_vec, a_vec], axis=0)
-                sa_t = torch.tensor(sa, dtype=torch.float32).unsqueeze(0)
-                with torch.no_grad():
-                    q_val = self.q_network(sa_t).item()
-                if q_val > best_q:
-                    best_q = q_val
-                    best_action = a
-            return best_action
+            return self._best_action(state, available_actions)
+
+    def numpy_network(self) -> NumpyQNetwork:
+        """NumPy copy of the current q_network weights."""
+        if self._numpy_network is None:
+            self._numpy_network = NumpyQNetwork.from_state_dict(self.q_network.state_dict())
+        return self._numpy_network
+
+    def _forward(self, sa: np.ndarray) -> np.ndarray:
+        """Q values of a (n, state_dim + action_dim) batch of state-action rows, in one forward pass."""
+        if self.backend == "numpy":
+            return self.numpy_network()(sa)
+        with torch.no_grad():
+            return self.q_network(torch.from_numpy(sa)).numpy()[:, 0]
+
+    def q_values(self, state: Dict, action_ids: np.ndarray) -> np.ndarray:
+        """Q values of the given action ids in one state: the state is encoded once, then stacked with every action."""
+        if self.backend == "numpy":
+            return self.numpy_network().q_values(self.encode_state(state), action_ids)
+        sa = np.empty((len(action_ids), self.state_dim + self.action_dim), dtype=np.float32)
+        sa[:, :self.state_dim] = self.encode_state(state)
+        sa[:, self.state_dim:] = ACTION_FEATURES[action_ids]
+        return self._forward(sa)
+
+    def _best_action(self, state: Dict, action_ids: np.ndarray) -> List[int]:
+        q_values = self.q_values(state, action_ids)
+        # argmax keeps the first of equal values, like the old one-by-one comparison
+        return actions.action_from_id(action_ids[int(np.argmax(q_values))])
+
+    def encode_states(self, observations: Dict) -> np.ndarray:
+        """Encode the batched observations of LiarsBarVecEnv.get_obs in one (B, state_dim) array."""
+        columns = [
+            observations["hand"],
+            observations["table_card"][:, None],
+            self.history_encoding.batch_features(observations),
+        ]
+        if self.bluff_feature:
+            columns.append(lie_probabilities(observations)[:, None])
+        return np.concatenate(columns, axis=1).astype(np.float32)
+
+    def q_values_masked(self, state_vecs: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        """
+        (B, NUM_ACTIONS) Q values of B encoded states against every action id, in one forward pass.
+        Illegal actions (False in masks) get -inf.
+        """
+        if self.backend == "numpy":
+            q_values = self.numpy_network().q_values_all(state_vecs)
+        else:
+            q_values = self._forward(self._state_action_grid(state_vecs)).reshape(len(state_vecs), actions.NUM_ACTIONS)
+        return np.where(masks, q_values, -np.inf)
+
+    def _state_action_grid(self, state_vecs: np.ndarray) -> np.ndarray:
+        """(B * NUM_ACTIONS, state_dim + action_dim) rows pairing every state with every action id."""
+        batch = len(state_vecs)
+        sa = np.empty((batch, actions.NUM_ACTIONS, self.state_dim + self.action_dim), dtype=np.float32)
+        sa[:, :, :self.state_dim] = state_vecs[:, None, :]
+        sa[:, :, self.state_dim:] = ACTION_FEATURES[None, :, :]
+        return sa.reshape(-1, self.state_dim + self.action_dim)
+
+    def act_vec(self, observations: Dict, masks: np.ndarray) -> np.ndarray:
+        """Greedy action ids for every game of a LiarsBarVecEnv (observations from get_obs, masks from legal_action_mask)."""
+        return np.argmax(self.q_values_masked(self.encode_states(observations), masks), axis=1)
+
+    def act_batch(self, states: List[Dict]) -> List[List[int]]:
+        """Greedy actions for many observation dicts, scored with a single forward pass."""
+        action_ids = [actions.state_action_ids(state) for state in states]
+        sizes = [len(ids) for ids in action_ids]
+        state_vecs = np.stack([self.encode_state(state) for state in states])
+
+        sa = np.empty((sum(sizes), self.state_dim + self.action_dim), dtype=np.float32)
+        sa[:, :self.state_dim] = np.repeat(state_vecs, sizes, axis=0)
+        sa[:, self.state_dim:] = ACTION_FEATURES[np.concatenate(action_ids)]
+        q_values = self._forward(sa)
+
+        best_actions = []
+        start = 0
+        for ids, size in zip(action_ids, sizes):
+            best_actions.append(actions.action_from_id(ids[int(np.argmax(q_values[start:start + size]))]))
+            start += size
+        return best_actions
 
     def remember(self, state, action, reward, next_state, done):
-        self.memory.store((state, action, reward, next_state, done))
+        """Store the transition already encoded, with the legal actions of next_state."""
+        self.memory.store(
+            self.encode_state(state),
+            actions.action_id(action),
+            reward,
+            self.encode_state(next_state),
+            done,
+            actions.state_action_mask(next_state)
+        )
 
     def train_step(self):
         """
@@ -130,88 +253,117 @@ class DQNAgent:
 
         batch = self.memory.sample(self.batch_size)
 
-        state_batch = []
-        action_batch = []
-        reward_batch = []
-        next_state_batch = []
-        done_batch = []
-
-        for (s, a, r, s_next, d) in batch:
-            state_batch.append(self.encode_state(s))
-            action_batch.append(self.encode_action(a))
-            reward_batch.append(r)
-            next_state_batch.append(self.encode_state(s_next))
-            done_batch.append(d)
-
-        state_batch = torch.tensor(np.array(state_batch), dtype=torch.float32)
-        action_batch = torch.tensor(np.array(action_batch), dtype=torch.float32)
-        reward_batch = torch.tensor(np.array(reward_batch), dtype=torch.float32).unsqueeze(-1)
-        next_state_batch = torch.tensor(np.array(next_state_batch), dtype=torch.float32)
-        done_batch = torch.tensor(np.array(done_batch), dtype=torch.float32).unsqueeze(-1)
+        state_batch = torch.from_numpy(batch["states"])
+        action_batch = torch.from_numpy(ACTION_FEATURES[batch["actions"]])
+        reward_batch = torch.from_numpy(batch["rewards"]).unsqueeze(-1)
+        next_state_batch = torch.from_numpy(batch["next_states"])
+        done_batch = torch.from_numpy(batch["dones"]).unsqueeze(-1)
 
         # concatenate into (s, a) pairs
         sa_input = torch.cat([state_batch, action_batch], dim=1)
         q_values = self.q_network(sa_input)
 
-        # target: r + gamma * max_{a'}Q(s', a')
-        target_vals = []
-        for i in range(self.batch_size):
-            r_i = reward_batch[i].item()
-            done_i = done_batch[i].item()
-
-            if done_i == 1.0:
-                # if it s a terminal state, q_value is the reward
-                y = r_i
-            else:
-                s_next_vec = next_state_batch[i].numpy()
-                best_q_ns = -1e9
-
-                # generate all states
-                candidate_actions = []
-                for jokers in range(4):
-                    for valets in range(4):
-                        for queens in range(4):
-                            for kings in range(4):
-                                if jokers + valets + queens + kings <= 3:
-                                    candidate_actions.append([jokers, valets, queens, kings])
-
-                # compute q_value for each state and extract maximum
-                for ca in candidate_actions:
-                    ca_vec = self.encode_action(ca)
-                    sa_next = np.concatenate([s_next_vec, ca_vec], axis=0)
-                    sa_next_t = torch.tensor(sa_next, dtype=torch.float32).unsqueeze(0)
-                    with torch.no_grad():
-                        q_val_ns = self.q_network(sa_next_t).item()
-                    if q_val_ns > best_q_ns:
-                        best_q_ns = q_val_ns
-
-                y = r_i + self.gamma * best_q_ns
-
-            target_vals.append([y])
-
-        target_vals = torch.tensor(target_vals, dtype=torch.float32)
-
-        loss = self.loss_fn(q_values, target_vals)
+        next_masks = batch["next_masks"]
+        if not self.mask_next_actions:
+            next_masks = np.ones_like(next_masks)
+
+        # target: r + gamma * max_{a'}Q(s', a'), every (s', a') pair of the batch in one forward pass
+        with torch.no_grad():
+            target_vals = reward_batch + self.gamma * (1.0 - done_batch) * self._next_state_values(next_state_batch, next_masks)
+
+        if "weights" in batch:
+            # Importance-sampling weights correct the bias of prioritized sampling
+            weights = torch.from_numpy(batch["weights"]).unsqueeze(-1)
+            loss = (weights * (q_values - target_vals) ** 2).mean()
+            self.memory.update_priorities(batch["indices"], (target_vals - q_values).detach().numpy()[:, 0])
+        else:
+            loss = self.loss_fn(q_values, target_vals)
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
 
+        self.train_steps += 1
+        self._numpy_network = None
+        self._update_target_network()
+
+    def _next_state_values(self, next_state_batch: torch.Tensor, next_masks: np.ndarray) -> torch.Tensor:
+        """(B, 1) max_{a'} Q(s', a') over the legal a' of every next state, 0 when none is legal."""
+        grid = torch.from_numpy(self._state_action_grid(next_state_batch.numpy()))
+        masks = torch.from_numpy(next_masks)
+        evaluator = self.target_network if self.target_network is not None else self.q_network
+
+        next_q = evaluator(grid).view(-1, actions.NUM_ACTIONS).masked_fill(~masks, -np.inf)
+        if self.double_dqn:
+            online_q = self.q_network(grid).view(-1, actions.NUM_ACTIONS).masked_fill(~masks, -np.inf)
+            best = next_q.gather(1, online_q.argmax(dim=1, keepdim=True))
+        else:
+            best = next_q.max(dim=1, keepdim=True).values
+
+        return torch.where(masks.any(dim=1, keepdim=True), best, torch.zeros_like(best))
+
+    def _update_target_network(self):
+        if self.target_network is None:
+            return
+
+        if self.target_update == "soft":
+            with torch.no_grad():
+                for target_param, param in zip(self.target_network.parameters(), self.q_network.parameters()):
+                    target_param.mul_(1.0 - self.tau).add_(param, alpha=self.tau)
+        elif self.train_steps % self.target_sync_every == 0:
+            self.target_network.load_state_dict(self.q_network.state_dict())
+
     def act(self, state: Dict) -> List[int]:
         """
         Choose best action
         """
-        available_actions = LiarsBarEdiEnv.get_available_actions(state)
-        state_vec = self.encode_state(state)
-        best_action = None
-        best_q = -1e9
-        for a in available_actions:
-            a_vec = self.encode_action(a)
-            sa = np.concatenate([state_vec, a_vec], axis=0)
-            sa_t = torch.tensor(sa, dtype=torch.float32).unsqueeze(0)
-            with torch.no_grad():
-                q_val = self.q_network(sa_t).item()
-            if q_val > best_q:
-                best_q = q_val
-                best_action = a
-        return best_action
+        return self._best_action(state, actions.state_action_ids(state))
+
+    def hyperparameters(self) -> Dict:
+        """Constructor arguments that rebuild this agent (with defaults for agents pickled before they existed)."""
+        memory = self.memory
+        return {
+            "gamma": self.gamma,
+            "epsilon": self.epsilon,
+            "lr": self.lr,
+            "batch_size": self.batch_size,
+            "buffer_capacity": getattr(memory, "capacity", None) or getattr(getattr(memory, "buffer", None), "maxlen", None) or 20000,
+            "use_target_network": getattr(self, "target_network", None) is not None,
+            "target_update": getattr(self, "target_update", "hard"),
+            "target_sync_every": getattr(self, "target_sync_every", 100),
+            "tau": getattr(self, "tau", 0.005),
+            "double_dqn": getattr(self, "double_dqn", False),
+            "mask_next_actions": getattr(self, "mask_next_actions", True),
+            "prioritized_replay": isinstance(memory, PrioritizedReplayBuffer),
+            "per_alpha": getattr(memory, "alpha", 0.6),
+            "per_beta": getattr(memory, "beta", 0.4),
+            "hidden_size": self.q_network.fc1.out_features,
+            "bluff_feature": self.bluff_feature,
+            "history_encoding": self.history_encoding.params(),
+        }
+
+    def save(self, path):
+        """Save the network weights and hyperparameters only, see dqn.checkpoint."""
+        save_checkpoint(path, self.q_network.state_dict(), self.hyperparameters())
 
+    @classmethod
+    def load(cls, path, env: LiarsBarEdiEnv = None, backend: str = "torch"):
+        """
+        Agent of a checkpoint written by save(), loaded with weights_only=True.
+        The replay buffer starts empty; the target network starts as a copy of the network.
+        """
+        checkpoint = load_checkpoint(path)
+        agent = cls(env, backend=backend, **checkpoint["hyperparameters"])
+        agent.q_network.load_state_dict(checkpoint["state_dict"])
+        agent._numpy_network = None
+        if agent.target_network is not None:
+            agent.target_network.load_state_dict(checkpoint["state_dict"])
+        return agent
+
+    def export_weights(self, path):
+        """
+        Inference-only copy of the network as an .npz of NumPy arrays (fc1/fc2/out weights and biases),
+        readable without torch. Rows of the input are encode_state followed by encode_action.
+        The history encoding is saved with them, as JSON.
+        """
+        weights = {name: tensor.detach().cpu().numpy() for name, tensor in self.q_network.state_dict().items()}
+        np.savez(path, history_encoding=np.array(json.dumps(self.history_encoding.params())), **weights)
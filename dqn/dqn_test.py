@@ -1,7 +1,6 @@
 from monte_carlo.mc_env import LiarsBarEdiEnv
 from dqn.dqn_train import train_n_dqn
 import numpy as np
-import torch
 import os
 
 save_dir = "saved_models"
@@ -42,6 +41,6 @@ if __name__ == "__main__":
                 scores[np.argmax(rewards)] += 1
 
         model_path = os.path.join(save_dir, f"episodes_{ep}.pt")
-        torch.save(dqn_agents[np.argmax(scores)], model_path)
+        dqn_agents[np.argmax(scores)].save(model_path)
 
         print(f"Test scores for {ep} epsiodes of training: {scores}")
@@ -5,8 +5,11 @@ import numpy as np
 def train_n_dqn(env: LiarsBarEdiEnv, no_agents: int = 4, episodes=100):
     '''
         Trains n dqn agents for a number of episodes and returns the best rated agent
+        Every agent explores with its own generator spawned from the env's, so seeding the env seeds the whole run
+        and an agent's draws do not depend on the others'
     '''
-    agents = [DQNAgent(env, gamma=0.0-i, epsilon=0.2 + i/10, lr=1e-3 * i, batch_size=32, buffer_capacity=20000) for i in range(no_agents)]
+    rngs = env.np_random.spawn(no_agents)
+    agents = [DQNAgent(env, gamma=0.0-i, epsilon=0.2 + i/10, lr=1e-3 * i, batch_size=32, buffer_capacity=20000, rng=rngs[i]) for i in range(no_agents)]
 
     for episode in range(episodes):
         state, _ = env.reset()
@@ -0,0 +1,126 @@
+"""
+QNetwork forward pass in plain NumPy, for processes that only play games.
+
+Nothing here imports torch: the weights come from a QNetwork state_dict, or from the
+.npz written by DQNAgent.export_weights. The first layer is split into its state and
+action columns, so the action half (plus the bias) is computed once for the 35 action
+ids and a decision costs one (25 x 64) product for the state and two small layers.
+
+Networks trained with the bluff feature take a 26th state input, the probability that
+the previous play was a lie (solver.bluff_oracle); it is read from the first layer width.
+Networks trained with another history encoding (monte_carlo.history_encoding) have it
+saved next to the weights by DQNAgent.export_weights.
+"""
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
+
+HISTORY_LENGTH = 20
+STATE_DIM = 25
+
+# Network input of every action id, see monte_carlo.actions
+ACTION_FEATURES = actions.ACTIONS.astype(np.float32)
+
+
+def state_dim(history_encoding: HistoryEncoding = HistoryEncoding(), bluff_feature: bool = False) -> int:
+    return 5 + history_encoding.feature_dim + bluff_feature
+
+
+def encode_state(state: Dict, bluff_feature: bool = False, history_encoding: HistoryEncoding = HistoryEncoding()) -> np.ndarray:
+    """
+    hand (4), table card (1) and history padded with 0 to 20 plays, as float32 (25,).
+    With bluff_feature, the probability that the last play was a lie is appended (26,).
+    Another history_encoding replaces the history with its features().
+    """
+    dim = state_dim(history_encoding)
+    state_vec = np.zeros(dim + bluff_feature, dtype=np.float32)
+    state_vec[:4] = state["hand"]
+    state_vec[4] = state["table_card"]
+    if history_encoding.is_full:
+        history = state["history"]
+        state_vec[5:5 + len(history)] = history
+    else:
+        state_vec[5:dim] = history_encoding.features(state)
+    if bluff_feature:
+        # Only networks trained with the feature need the solver package
+        from solver.bluff_oracle import lie_probability
+
+        state_vec[dim] = lie_probability(state)
+    return state_vec
+
+
+class NumpyQNetwork:
+    def __init__(self, weights: Dict[str, np.ndarray], state_dim: Optional[int] = None):
+        w1 = np.asarray(weights["fc1.weight"], dtype=np.float32)
+        if state_dim is None:
+            state_dim = w1.shape[1] - ACTION_FEATURES.shape[1]
+        self.state_dim = state_dim
+        self.w1_state = np.ascontiguousarray(w1[:, :state_dim].T)
+        self.w1_action = np.ascontiguousarray(w1[:, state_dim:].T)
+        self.b1 = np.asarray(weights["fc1.bias"], dtype=np.float32)
+        self.w2 = np.ascontiguousarray(np.asarray(weights["fc2.weight"], dtype=np.float32).T)
+        self.b2 = np.asarray(weights["fc2.bias"], dtype=np.float32)
+        self.w3 = np.ascontiguousarray(np.asarray(weights["out.weight"], dtype=np.float32)[0])
+        self.b3 = np.float32(weights["out.bias"][0])
+
+        # First layer contribution of every action id, bias included
+        self.action_hidden = ACTION_FEATURES @ self.w1_action + self.b1
+
+    @classmethod
+    def from_state_dict(cls, state_dict) -> "NumpyQNetwork":
+        return cls({name: tensor.detach().cpu().numpy() for name, tensor in state_dict.items()})
+
+    @classmethod
+    def load(cls, path) -> "NumpyQNetwork":
+        """Network of an .npz written by DQNAgent.export_weights."""
+        with np.load(path) as weights:
+            return cls(dict(weights))
+
+    def _head(self, hidden: np.ndarray) -> np.ndarray:
+        np.maximum(hidden, 0, out=hidden)
+        hidden = hidden @ self.w2
+        hidden += self.b2
+        np.maximum(hidden, 0, out=hidden)
+        return hidden @ self.w3 + self.b3
+
+    def __call__(self, state_action: np.ndarray) -> np.ndarray:
+        """(n,) Q values of (n, state_dim + action_dim) rows, like QNetwork(...)[:, 0]."""
+        hidden = state_action[:, :self.state_dim] @ self.w1_state
+        hidden += state_action[:, self.state_dim:] @ self.w1_action
+        hidden += self.b1
+        return self._head(hidden)
+
+    def q_values(self, state_vec: np.ndarray, action_ids: np.ndarray) -> np.ndarray:
+        """Q values of the given action ids in one encoded state."""
+        return self._head(state_vec @ self.w1_state + self.action_hidden[action_ids])
+
+    def q_values_all(self, state_vecs: np.ndarray) -> np.ndarray:
+        """(B, NUM_ACTIONS) Q values of B encoded states against every action id."""
+        hidden = (state_vecs @ self.w1_state)[:, None, :] + self.action_hidden[None, :, :]
+        return self._head(hidden.reshape(-1, hidden.shape[-1])).reshape(len(state_vecs), actions.NUM_ACTIONS)
+
+
+class NumpyDQNPolicy:
+    """Greedy DQN player evaluated with NumpyQNetwork, for arena and tournament workers."""
+
+    def __init__(self, network: NumpyQNetwork, history_encoding: Optional[HistoryEncoding] = None):
+        self.name = "DQN Agent"
+        self.network = network
+        self.history_encoding = as_history_encoding(history_encoding)
+        self.bluff_feature = network.state_dim == state_dim(self.history_encoding) + 1
+
+    @classmethod
+    def load(cls, path) -> "NumpyDQNPolicy":
+        with np.load(path) as weights:
+            weights = dict(weights)
+        history_encoding = json.loads(str(weights["history_encoding"])) if "history_encoding" in weights else None
+        return cls(NumpyQNetwork(weights), history_encoding)
+
+    def act(self, state: Dict) -> List[int]:
+        action_ids = actions.state_action_ids(state)
+        q_values = self.network.q_values(encode_state(state, self.bluff_feature, self.history_encoding), action_ids)
+        return actions.action_from_id(action_ids[int(np.argmax(q_values))])
@@ -0,0 +1,192 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from monte_carlo.actions import NUM_ACTIONS
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of encoded transitions kept in preallocated NumPy arrays:
+    state / next state vectors, action ids, rewards, done flags and the
+    legal-action mask of the next state.
+    """
+
+    def __init__(self, capacity=20000, state_dim=25, n_actions=NUM_ACTIONS, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.n_actions = n_actions
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.next_masks = np.zeros((capacity, n_actions), dtype=bool)
+
+        self.position = 0
+        self.size = 0
+
+    def store(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray, done: bool, next_mask: np.ndarray) -> int:
+        """Add one transition, overwriting the oldest one when full. Returns its slot."""
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.dones[index] = done
+        self.next_masks[index] = next_mask
+
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return index
+
+    def sample(self, batch_size) -> Dict[str, np.ndarray]:
+        indices = self.rng.choice(self.size, size=batch_size, replace=False)
+        return self._gather(indices)
+
+    def _gather(self, indices: np.ndarray) -> Dict[str, np.ndarray]:
+        return {
+            "indices": indices,
+            "states": self.states[indices],
+            "actions": self.actions[indices],
+            "rewards": self.rewards[indices],
+            "next_states": self.next_states[indices],
+            "dones": self.dones[indices],
+            "next_masks": self.next_masks[indices],
+        }
+
+    def __len__(self):
+        return self.size
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "states": self.states,
+            "actions": self.actions,
+            "rewards": self.rewards,
+            "next_states": self.next_states,
+            "dones": self.dones,
+            "next_masks": self.next_masks,
+        }
+
+    def save(self, path):
+        """Write the buffer to an .npz file (only the filled part of the arrays)."""
+        arrays = {name: array[:self.size] for name, array in self._arrays().items()}
+        np.savez_compressed(
+            path,
+            capacity=self.capacity,
+            position=self.position,
+            **arrays,
+            **self._extra_arrays()
+        )
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as data:
+            states = data["states"]
+            buffer = cls(capacity=int(data["capacity"]), state_dim=states.shape[1], n_actions=data["next_masks"].shape[1], **kwargs)
+            size = len(states)
+            for name, array in buffer._arrays().items():
+                array[:size] = data[name]
+            buffer.size = size
+            buffer.position = int(data["position"])
+            buffer._load_extra_arrays(data)
+        return buffer
+
+    def _load_extra_arrays(self, data):
+        pass
+
+
+class SumTree:
+    """Binary tree over `capacity` priorities where every node holds the sum of its children, stored in one array."""
+
+    def __init__(self, capacity):
+        self.leaves = 2
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    @property
+    def priorities(self) -> np.ndarray:
+        return self.tree[self.leaves:]
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray):
+        nodes = np.asarray(indices) + self.leaves
+        if len(nodes) == 0:
+            return
+        self.tree[nodes] = priorities
+        # All leaves are at the same depth, so every level is recomputed at once
+        nodes = np.unique(nodes // 2)
+        while True:
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Leaf index of every value of the prefix sum, all walked down the tree together."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaves:
+            left = self.tree[2 * nodes]
+            go_right = values > left
+            values = np.where(go_right, values - left, values)
+            nodes = 2 * nodes + go_right
+        return nodes - self.leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Proportional prioritized replay: transitions are drawn with probability p_i^alpha / sum_k p_k^alpha
+    and sample() also returns importance-sampling weights (N * P(i))^-beta normalised by their max.
+    """
+
+    def __init__(self, capacity=20000, state_dim=25, n_actions=NUM_ACTIONS, seed: Optional[int] = None, alpha=0.6, beta=0.4, epsilon=1e-3):
+        super().__init__(capacity, state_dim, n_actions, seed)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0
+
+    def store(self, state, action, reward, next_state, done, next_mask) -> int:
+        index = super().store(state, action, reward, next_state, done, next_mask)
+        self.tree.update(np.array([index]), np.array([self.max_priority ** self.alpha]))
+        return index
+
+    def sample(self, batch_size) -> Dict[str, np.ndarray]:
+        # One value per equal slice of the total priority (stratified sampling)
+        bounds = np.linspace(0.0, self.tree.total, batch_size + 1)
+        values = self.rng.uniform(bounds[:-1], bounds[1:])
+        # A draw of exactly 0 would walk down to the first leaf even with a zero priority, where P(i) = 0
+        values = np.clip(values, np.nextafter(0.0, 1.0), self.tree.total)
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        batch = self._gather(indices)
+        probabilities = self.tree.priorities[indices] / self.tree.total
+        weights = (self.size * probabilities) ** -self.beta
+        batch["weights"] = (weights / weights.max()).astype(np.float32)
+        return batch
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def _extra_arrays(self) -> Dict[str, np.ndarray]:
+        return {"priorities": self.tree.priorities[:self.size], "max_priority": self.max_priority}
+
+    def _load_extra_arrays(self, data):
+        if "priorities" in data:
+            self.tree.update(np.arange(self.size), data["priorities"])
+            self.max_priority = float(data["max_priority"])
+        else:
+            self.tree.update(np.arange(self.size), np.full(self.size, self.max_priority ** self.alpha))
@@ -0,0 +1,130 @@
+"""
+Fixed action-id space of the Liar's Bar round and legal-action masks precomputed per hand.
+
+Action 0 is the challenge ([0, 0, 0, 0]); the other ids are every play of 1-3 cards
+in the order the nested loops of LiarsBarEdiEnv used to generate them
+(jokers, then queens, kings and aces), so picking the first best id among the legal
+ones gives the same action as the old lists did.
+
+A hand [jokers, Q, K, A] is encoded as jokers + 6 * Q + 36 * K + 216 * A.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+NUMBER_OF_RANKS = 4
+MAX_CARDS_PER_TURN = 3
+HAND_BASE = 6
+NUM_HANDS = HAND_BASE ** NUMBER_OF_RANKS
+
+CHALLENGE = 0
+CHALLENGE_ACTION = [0, 0, 0, 0]
+
+
+def _build_actions() -> np.ndarray:
+    actions = [CHALLENGE_ACTION]
+    for jokers in range(MAX_CARDS_PER_TURN + 1):
+        for queens in range(MAX_CARDS_PER_TURN + 1):
+            for kings in range(MAX_CARDS_PER_TURN + 1):
+                for aces in range(MAX_CARDS_PER_TURN + 1):
+                    if 1 <= jokers + queens + kings + aces <= MAX_CARDS_PER_TURN:
+                        actions.append([jokers, queens, kings, aces])
+    return np.array(actions, dtype=np.int8)
+
+
+ACTIONS = _build_actions()
+ACTIONS.setflags(write=False)
+NUM_ACTIONS = len(ACTIONS)
+ACTION_SIZES = ACTIONS.sum(axis=1)
+ACTION_SIZES.setflags(write=False)
+_ACTION_LISTS = [tuple(int(c) for c in a) for a in ACTIONS]
+_ACTION_IDS: Dict[tuple, int] = {a: i for i, a in enumerate(_ACTION_LISTS)}
+
+
+def _build_legal_masks() -> np.ndarray:
+    """LEGAL_MASKS[can_challenge, can_play, hand_code] -> bool mask over action ids."""
+    codes = np.arange(NUM_HANDS)
+    hands = np.stack([(codes // HAND_BASE ** r) % HAND_BASE for r in range(NUMBER_OF_RANKS)], axis=1)
+    playable = np.all(ACTIONS[None, :, :] <= hands[:, None, :], axis=2)
+    playable[:, CHALLENGE] = False
+
+    masks = np.zeros((2, 2, NUM_HANDS, NUM_ACTIONS), dtype=bool)
+    for can_challenge in (0, 1):
+        for can_play in (0, 1):
+            if can_play:
+                masks[can_challenge, can_play] = playable
+            masks[can_challenge, can_play, :, CHALLENGE] = bool(can_challenge)
+    return masks
+
+
+LEGAL_MASKS = _build_legal_masks()
+LEGAL_MASKS.setflags(write=False)
+_LEGAL_IDS = [[[np.flatnonzero(LEGAL_MASKS[c, p, h]) for h in range(NUM_HANDS)] for p in (0, 1)] for c in (0, 1)]
+_LEGAL_LISTS = [[[[_ACTION_LISTS[i] for i in ids] for ids in per_hand] for per_hand in per_play] for per_play in _LEGAL_IDS]
+
+
+def encode_hand(hand: Sequence[int]) -> int:
+    return hand[0] + HAND_BASE * hand[1] + HAND_BASE ** 2 * hand[2] + HAND_BASE ** 3 * hand[3]
+
+
+def encode_hands(hands: np.ndarray) -> np.ndarray:
+    """Vectorized encode_hand over the last axis."""
+    return hands[..., 0] + HAND_BASE * hands[..., 1] + HAND_BASE ** 2 * hands[..., 2] + HAND_BASE ** 3 * hands[..., 3]
+
+
+def action_id(action: Sequence[int]) -> int:
+    return _ACTION_IDS[tuple(action)]
+
+
+def action_from_id(action: int) -> List[int]:
+    """The action as a fresh list, the format LiarsBarEdiEnv.step expects."""
+    return list(_ACTION_LISTS[action])
+
+
+def can_challenge(state: Dict) -> bool:
+    return len(state["history"]) > 0
+
+
+def can_play(state: Dict) -> bool:
+    """False when every other player has already emptied their hand."""
+    return state["num_players"] * 5 - sum(state["history"]) != sum(state["hand"])
+
+
+def legal_action_mask(hand: Sequence[int], challenge: bool, play: bool) -> np.ndarray:
+    """Read-only mask of the legal action ids; no allocation, it is a row of LEGAL_MASKS."""
+    return LEGAL_MASKS[int(challenge), int(play), encode_hand(hand)]
+
+
+def legal_action_ids(hand: Sequence[int], challenge: bool, play: bool) -> np.ndarray:
+    """Precomputed, ascending array of the legal action ids. Do not modify it."""
+    return _LEGAL_IDS[int(challenge)][int(play)][encode_hand(hand)]
+
+
+def legal_action_lists(hand: Sequence[int], challenge: bool, play: bool) -> List[List[int]]:
+    """The legal actions in the list format used by the agents and LiarsBarEdiEnv.step."""
+    return [list(a) for a in _LEGAL_LISTS[int(challenge)][int(play)][encode_hand(hand)]]
+
+
+def _legal_index(state: Dict) -> Tuple[int, int, int]:
+    """(can_challenge, can_play, hand code) of an observation dict or state_index.Observation, reading every field once."""
+    if isinstance(state, dict):
+        hand, history, num_players = state["hand"], state["history"], state["num_players"]
+    else:
+        # The attributes of an Observation are cheaper than its items
+        hand, history, num_players = state.hand, state.history, state.num_players
+    return int(len(history) > 0), int(num_players * 5 - sum(history) != sum(hand)), encode_hand(hand)
+
+
+def state_action_mask(state: Dict) -> np.ndarray:
+    challenge, play, hand_code = _legal_index(state)
+    return LEGAL_MASKS[challenge, play, hand_code]
+
+
+def state_action_ids(state: Dict) -> np.ndarray:
+    challenge, play, hand_code = _legal_index(state)
+    return _LEGAL_IDS[challenge][play][hand_code]
+
+
+def random_action_id(action_ids: Sequence[int], rng: np.random.Generator) -> int:
+    """Uniformly random element of action_ids; cheaper than rng.choice on these short arrays."""
+    return int(action_ids[int(rng.random() * len(action_ids))])
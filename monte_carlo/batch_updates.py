@@ -0,0 +1,96 @@
+"""
+Vectorized building blocks of the batch learners (MonteCarloAgent.learn_batch, SarsaAgent.learn_batch).
+
+Trajectories are given as flat arrays of steps plus "segments", the offsets where
+each trajectory starts (from 0) and the total length at the end, as produced by
+monte_carlo.parallel.collect_episodes and monte_carlo.trajectory_store.
+
+The updates of the tabular agents are sequential: an update reads values that
+earlier updates may have written. dependency_levels groups the updates in levels
+that only depend on earlier levels, so each level is applied with one NumPy
+operation, and the results are the same, bit for bit, as applying them one by one.
+"""
+from typing import List, Optional
+
+import numpy as np
+
+
+def segment_lengths(segments: np.ndarray) -> np.ndarray:
+    return np.diff(np.asarray(segments, dtype=np.int64))
+
+
+def discounted_returns(rewards: np.ndarray, segments: np.ndarray, gamma: float) -> np.ndarray:
+    """G_t = r_t + gamma * G_(t+1) within every trajectory, computed backwards like the episode loops do."""
+    rewards = np.asarray(rewards, dtype=np.float64)
+    returns = rewards.copy()
+    lengths = segment_lengths(segments)
+    if len(returns) == 0:
+        return returns
+    # Steps left after every step in its trajectory, 0 for the last one
+    steps_left = np.repeat(np.asarray(segments[1:], dtype=np.int64), lengths) - 1 - np.arange(len(returns))
+    for left in range(1, int(lengths.max())):
+        rows = np.flatnonzero(steps_left == left)
+        returns[rows] = rewards[rows] + gamma * returns[rows + 1]
+    return returns
+
+
+def reversed_within_segments(segments: np.ndarray) -> np.ndarray:
+    """Row order that keeps the trajectories in order and walks every trajectory backwards."""
+    segments = np.asarray(segments, dtype=np.int64)
+    return np.repeat(segments[:-1] + segments[1:] - 1, segment_lengths(segments)) - np.arange(segments[-1])
+
+
+def dependency_levels(writes: np.ndarray, reads: Optional[np.ndarray] = None) -> List[np.ndarray]:
+    """
+    Rows of sequential updates grouped in levels. Update i reads and writes the value writes[i],
+    and also reads reads[i] (-1 for nothing). A row waits for the earlier rows writing a value
+    it reads, and for the earlier rows reading the value it writes, so applying the levels in
+    order, every level at once from the values before it, equals applying the rows in order.
+    """
+    writes = np.asarray(writes, dtype=np.int64)
+    if len(writes) == 0:
+        return []
+    end_of_rows = len(writes)
+
+    # The rows writing every value, in row order, and the next one still to apply
+    order = np.argsort(writes, kind="stable")
+    sorted_writes = writes[order]
+    pointer = np.flatnonzero(np.concatenate(([True], sorted_writes[1:] != sorted_writes[:-1])))
+    ends = np.append(pointer[1:], end_of_rows)
+    unique = sorted_writes[pointer]
+    num_groups = len(unique)
+    groups = np.empty(end_of_rows, dtype=np.int64)
+    groups[order] = np.repeat(np.arange(num_groups), ends - pointer)
+    next_writer = np.append(order[pointer], end_of_rows)  # the extra entry stands for values nobody writes
+
+    read_groups = np.full(len(writes), num_groups, dtype=np.int64)
+    if reads is not None:
+        reads = np.asarray(reads, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(unique, reads), num_groups - 1)
+        written = (reads >= 0) & (unique[positions] == reads)
+        read_groups[written] = positions[written]
+    pending_reads = np.flatnonzero(read_groups < num_groups)
+    done = np.zeros(len(writes), dtype=bool)
+
+    levels = []
+    active = np.arange(num_groups)
+    first_reader = np.full(num_groups + 1, end_of_rows)
+    while len(active):
+        rows = next_writer[active]
+        ready = next_writer[read_groups[rows]] >= rows
+        if len(pending_reads):
+            first_reader.fill(end_of_rows)
+            np.minimum.at(first_reader, read_groups[pending_reads], pending_reads)
+            ready &= first_reader[groups[rows]] >= rows
+        level = rows[ready]
+        levels.append(level)
+
+        done[level] = True
+        pending_reads = pending_reads[~done[pending_reads]]
+        advanced = active[ready]
+        pointer[advanced] += 1
+        more = pointer[advanced] < ends[advanced]
+        next_writer[advanced] = end_of_rows
+        next_writer[advanced[more]] = order[pointer[advanced[more]]]
+        active = active[next_writer[active] < end_of_rows]
+    return levels
@@ -0,0 +1,81 @@
+"""
+Checkpoints of the tabular agents.
+
+A checkpoint is a directory of plain .npy columns plus a meta.json:
+
+    keys.npy     int64 (n_states,)           state keys, sorted
+    values.npy   float32 (n_states, n_actions) action values, row i belongs to keys[i]
+    mask.npy     bool (n_states, n_actions)    actions the state has an entry for
+    counts.npy   int32 (n_states, n_actions)   visit counts, only for tables that track them
+    meta.json    format, version, agent class and constructor parameters
+
+Since the keys are sorted, a checkpoint can be opened with mmap: the arrays stay
+on disk and are shared by every process that maps them, and states are found by
+binary search. Such a table is read-only, which is all act() needs.
+"""
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from monte_carlo.q_table import QTable
+
+FORMAT = "liars-bar-q-table"
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def save_q_table(table: QTable, path, agent: Optional[str] = None, params: Optional[Dict] = None):
+    os.makedirs(path, exist_ok=True)
+    order = np.argsort(table.indexer.keys, kind="stable")
+
+    np.save(os.path.join(path, "keys.npy"), table.indexer.keys[order])
+    np.save(os.path.join(path, "values.npy"), table.values[order])
+    np.save(os.path.join(path, "mask.npy"), table.mask[order])
+    if table.counts is not None:
+        np.save(os.path.join(path, "counts.npy"), table.counts[order])
+
+    meta = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "agent": agent,
+        "params": params or {},
+        "n_states": len(table),
+        "n_actions": table.n_actions,
+    }
+    with open(os.path.join(path, META_FILE), "w") as file:
+        json.dump(meta, file, indent=2)
+
+
+def read_meta(path) -> Dict:
+    with open(os.path.join(path, META_FILE)) as file:
+        meta = json.load(file)
+    if meta.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a Q-table checkpoint.")
+    if meta["version"] not in _LOADERS:
+        raise ValueError(f"Unsupported Q-table checkpoint version {meta['version']}, this code reads versions {sorted(_LOADERS)}.")
+    return meta
+
+
+def load_q_table(path, mmap: bool = False) -> Tuple[QTable, Dict]:
+    """The table and the meta data of a checkpoint; with mmap the table is memory-mapped and read-only."""
+    meta = read_meta(path)
+    return _LOADERS[meta["version"]](path, meta, mmap), meta
+
+
+def _load_v1(path, meta: Dict, mmap: bool) -> QTable:
+    mode = "r" if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+        for name in ("keys", "values", "mask")
+    }
+    counts_path = os.path.join(path, "counts.npy")
+    counts = np.load(counts_path, mmap_mode=mode) if os.path.exists(counts_path) else None
+    return QTable.from_arrays(arrays["keys"], arrays["values"], arrays["mask"], counts, read_only=mmap)
+
+
+# One loader per format version, new versions add a loader instead of changing the old ones
+_LOADERS = {
+    1: _load_v1,
+}
@@ -0,0 +1,162 @@
+"""
+How the history of plays enters the state keys of the tabular agents and the input of the DQN.
+
+With the full history every sequence of plays is a different state, so the number
+of states grows with every play and the tables barely generalize. A HistoryEncoding
+keeps only what it is configured to:
+
+    last_plays    the last k plays (None: all of them)
+    cards_played  the number of cards on the table
+    cards_left    the number of cards the other players still hold
+
+Observations do not say who played what, so the cards left are counted for all the
+other players together; they are 0 exactly when playing is no longer legal.
+
+The default encoding is the full history alone, whose keys are
+monte_carlo.state_index.state_key and whose DQN input is the history padded to 20
+plays. Other encodings pack their features in the history code of the key:
+
+    history_code = (window_code * CARD_COUNTS + cards_played) * CARD_COUNTS + cards_left
+    key = (history_code * 4 + table_card) * NUM_HANDS + hand_code
+
+where window_code is the bijective base-3 code of the kept plays and a feature that is
+off takes no room. With last_plays = k there are at most num_history_codes * 4 * NUM_HANDS
+keys, whatever the length of the game.
+"""
+from typing import Dict, NamedTuple, Optional, Union
+
+import numpy as np
+
+from monte_carlo.actions import NUM_HANDS, encode_hand
+from monte_carlo.state_index import HISTORY_BASE, NUMBER_OF_TABLE_CARDS, Observation, encode_histories, encode_history, state_key
+
+HAND_SIZE = 5
+MAX_HISTORY = 20   # every play is at least one card of a 20-card deck
+CARD_COUNTS = 21   # 0 to 20 cards
+
+
+class HistoryEncoding(NamedTuple):
+    last_plays: Optional[int] = None
+    cards_played: bool = False
+    cards_left: bool = False
+
+    @property
+    def is_full(self) -> bool:
+        """True for the default encoding, the full history and nothing else."""
+        return self.last_plays is None and not self.cards_played and not self.cards_left
+
+    @property
+    def num_history_codes(self) -> Optional[int]:
+        """Number of different history codes, None when the full history is kept."""
+        if self.last_plays is None:
+            return None
+        # Bijective base 3: 3 ** n codes of n plays, for n = 0 ... last_plays
+        codes = (HISTORY_BASE ** (self.last_plays + 1) - 1) // (HISTORY_BASE - 1)
+        return codes * CARD_COUNTS ** (self.cards_played + self.cards_left)
+
+    @property
+    def feature_dim(self) -> int:
+        """Length of features(): the kept plays, padded with 0, then the counts that are on."""
+        return (MAX_HISTORY if self.last_plays is None else self.last_plays) + self.cards_played + self.cards_left
+
+    def params(self) -> Dict:
+        """Constructor arguments, as saved in checkpoints."""
+        return self._asdict()
+
+    def history_code(self, state: Dict) -> int:
+        if type(state) is Observation:
+            hand, history, num_players = state.hand, state.history, state.num_players
+        else:
+            hand, history, num_players = state["hand"], state["history"], state["num_players"]
+        return self._history_code(hand, history, num_players)
+
+    def _history_code(self, hand, history, num_players) -> int:
+        code = encode_history(history if self.last_plays is None else history[-self.last_plays:])
+        if self.cards_played or self.cards_left:
+            played = sum(history)
+            if self.cards_played:
+                code = code * CARD_COUNTS + played
+            if self.cards_left:
+                code = code * CARD_COUNTS + num_players * HAND_SIZE - played - sum(hand)
+        return code
+
+    def state_key(self, state: Dict) -> int:
+        """Integer key of an observation; state_index.state_key for the default encoding."""
+        if type(state) is Observation:
+            if self.is_full:
+                return state.key
+            hand, table_card = state.hand, state.table_card
+            code = self._history_code(hand, state.history, state.num_players)
+        else:
+            if self.is_full:
+                return state_key(state)
+            hand, table_card = state["hand"], state["table_card"]
+            code = self._history_code(hand, state["history"], state["num_players"])
+        return (code * NUMBER_OF_TABLE_CARDS + table_card) * NUM_HANDS + encode_hand(hand)
+
+    def features(self, state: Dict) -> np.ndarray:
+        """float32 (feature_dim,) history part of the DQN input."""
+        history = state["history"]
+        if self.last_plays is not None:
+            history = history[-self.last_plays:]
+        features = np.zeros(self.feature_dim, dtype=np.float32)
+        features[:len(history)] = history
+        if self.cards_played or self.cards_left:
+            played = sum(state["history"])
+            counts = [played] * self.cards_played + [state["num_players"] * HAND_SIZE - played - sum(state["hand"])] * self.cards_left
+            features[self.feature_dim - len(counts):] = counts
+        return features
+
+    def _columns(self, histories: np.ndarray, lengths: np.ndarray, num_players, hand_sizes: np.ndarray):
+        """Kept plays (left-aligned, padded with 0), their number and the counts that are on, one row per observation."""
+        histories = np.asarray(histories, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if self.last_plays is None:
+            window, window_lengths = histories, lengths
+        else:
+            start = np.maximum(lengths - self.last_plays, 0)
+            positions = start[:, None] + np.arange(self.last_plays)
+            kept = positions < lengths[:, None]
+            window = np.where(kept, np.take_along_axis(histories, np.minimum(positions, histories.shape[1] - 1), axis=1), 0)
+            window_lengths = lengths - start
+        counts = []
+        if self.cards_played or self.cards_left:
+            played = histories.sum(axis=1)
+            if self.cards_played:
+                counts.append(played)
+            if self.cards_left:
+                counts.append(np.asarray(num_players, dtype=np.int64) * HAND_SIZE - played - hand_sizes)
+        return window, window_lengths, counts
+
+    def history_codes(self, histories: np.ndarray, lengths: np.ndarray, num_players, hand_sizes: np.ndarray) -> np.ndarray:
+        """Vectorized history_code of (N, 20) histories padded after their lengths."""
+        window, window_lengths, counts = self._columns(histories, lengths, num_players, hand_sizes)
+        codes = encode_histories(window, window_lengths)
+        for count in counts:
+            codes = codes * CARD_COUNTS + count
+        return codes
+
+    def state_keys(self, hand_codes: np.ndarray, table_cards: np.ndarray, histories: np.ndarray, lengths: np.ndarray,
+                   num_players, hand_sizes: np.ndarray) -> np.ndarray:
+        """Vectorized state_key, from hand codes (monte_carlo.actions.encode_hand) and padded histories."""
+        codes = self.history_codes(histories, lengths, num_players, hand_sizes)
+        return (codes * NUMBER_OF_TABLE_CARDS + np.asarray(table_cards, dtype=np.int64)) * NUM_HANDS + np.asarray(hand_codes, dtype=np.int64)
+
+    def batch_features(self, observations: Dict) -> np.ndarray:
+        """(B, feature_dim) features of the batched observations of LiarsBarVecEnv.get_obs."""
+        hands = np.asarray(observations["hand"])
+        window, _, counts = self._columns(observations["history"], observations["history_length"],
+                                          observations["num_players"], hands.sum(axis=1))
+        return np.concatenate([window] + [count[:, None] for count in counts], axis=1).astype(np.float32)
+
+
+def as_history_encoding(encoding: Union[None, Dict, HistoryEncoding] = None) -> HistoryEncoding:
+    """The encoding given, its params() or None for the default one; checks that its keys stay well defined."""
+    if encoding is None:
+        return HistoryEncoding()
+    if not isinstance(encoding, HistoryEncoding):
+        encoding = HistoryEncoding(**encoding)
+    if encoding.last_plays is not None and encoding.last_plays < 1:
+        # With no play kept, the key would not tell whether there is a play to challenge
+        raise ValueError(f"last_plays must be at least 1, got {encoding.last_plays}")
+    return encoding
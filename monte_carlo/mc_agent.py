@@ -1,76 +1,242 @@
-import random
-from typing import Dict
-from xmlrpc.client import MININT
+from typing import TYPE_CHECKING, Dict, Optional
 
 import numpy as np
 
-from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo import actions
+from monte_carlo.batch_updates import dependency_levels, discounted_returns, reversed_within_segments
+from monte_carlo.checkpoint import load_q_table, save_q_table
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
+from monte_carlo.q_table import QTable, UNKNOWN_ACTION_VALUE
+from monte_carlo.state_index import pack_state
+from monte_carlo.symmetry import action_from_canonical_id, canonical_episode, canonicalize, from_canonical_probabilities
+
+if TYPE_CHECKING:
+    # Only the trainers need the environment (and gymnasium)
+    from monte_carlo.mc_env import LiarsBarEdiEnv
 
 
 class MonteCarloAgent:
-    def __init__(self, env: LiarsBarEdiEnv, epsilon: float = 0.1, gamma: float = 0.9):
+    """
+    averaging selects how returns are turned into Q values:
+    - "incremental": running mean, only (count, mean) is kept per state-action
+    - "constant": Q <- Q + alpha * (G - Q), for non-stationary opponents
+    - "returns": keeps every return in self.returns and averages the list (old behaviour)
+    first_visit only uses the first occurrence of a state-action in an episode.
+    history_encoding (monte_carlo.history_encoding, or its params) selects what of the
+    history goes in the state keys; the default keeps all of it.
+    canonical_ranks stores the observations with their ranks relabeled so that the table card
+    is always the same (monte_carlo.symmetry), a third of the states.
+    """
+    AVERAGING_MODES = ("incremental", "constant", "returns")
+
+    def __init__(
+            self,
+            env: "LiarsBarEdiEnv",
+            epsilon: float = 0.1,
+            gamma: float = 0.9,
+            averaging: str = "incremental",
+            first_visit: bool = False,
+            alpha: float = 0.1,
+            rng: Optional[np.random.Generator] = None,
+            history_encoding: Optional[HistoryEncoding] = None,
+            canonical_ranks: bool = False
+    ):
+        if averaging not in self.AVERAGING_MODES:
+            raise ValueError(f"Unknown averaging mode: {averaging}")
+
         self.name = "MonteCarloAgent"
         self.env = env
         self.epsilon = epsilon  # Exploration rate
         self.gamma = gamma      # Discount factor
-        self.Q = {}  # State-action value table
-        self.returns = {}  # State-action returns (to calculate average reward)
+        self.averaging = averaging
+        self.first_visit = first_visit
+        self.alpha = alpha      # Step size of the "constant" mode
+        self.rng = np.random.default_rng(rng)  # Exploration and unseen states
+        self.history_encoding = as_history_encoding(history_encoding)
+        self.canonical_ranks = canonical_ranks
+        self.Q = QTable(track_counts=True)  # State-action value table
+        self.returns = {}  # (state id, action id) -> returns, only in "returns" mode
 
     def _get_state_key(self, state):
         """Generates a key for state-action pair."""
-        return tuple(state["hand"]), state["table_card"], tuple(state["history"])
+        return self.history_encoding.state_key(state)
 
     def choose_action(self, state):
         """Select action using epsilon-greedy strategy."""
-        available_actions = self.env._get_available_actions()
-        state_key = tuple(state["hand"]), state["table_card"], tuple(state["history"])
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        available_actions = self.env.get_action_mask() if table_card is None else actions.state_action_mask(state)
 
-        # If no actions have been taken from this state, explore randomly
-        if state_key not in self.Q:
-            self.Q[state_key] = {tuple(a): 0.0 for a in available_actions}
-            self.returns[state_key] = {tuple(a): [] for a in available_actions}
+        # Unseen states start with every available action valued at 0
+        state_id = self.Q.add(self._get_state_key(state), available_actions)
 
-        if random.random() < self.epsilon:
+        if self.rng.random() < self.epsilon:
             # Exploration: randomly choose an action
-            action = random.choice(available_actions)
+            action = actions.random_action_id(np.flatnonzero(available_actions), self.rng)
         else:
             # Exploitation: choose the action with the highest Q value
-            action = max(available_actions, key=lambda a: self.Q[state_key].get(tuple(a), 0.0))
+            action = self.Q.best_action(state_id, available_actions)
 
-        return action
+        return action_from_canonical_id(action, table_card)
 
     def learn(self, episode):
+        states, action_ids = canonical_episode(episode, self.canonical_ranks)
+        self.learn_steps(
+            [self._get_state_key(state) for state in states],
+            action_ids,
+            [step["reward"] for step in episode],
+            [actions.state_action_mask(state) for state in states]
+        )
+
+    def learn_steps(self, state_keys, action_ids, rewards, legal_masks=None):
+        """
+        The same update as learn, on one player's episode given as state keys, action ids and rewards.
+        A state seen for the first time knows the actions of its legal mask, valued at 0, as if
+        choose_action had met it; without legal_masks it only knows the actions taken.
+        """
+        if legal_masks is None:
+            legal_masks = [None] * len(state_keys)
         G = 0
-        for step_state in reversed(episode):
-            reward = step_state["reward"]
-            state = step_state["state"]
-            action = step_state["action"]
+        visits = []
+        for key, action_id, reward, mask in zip(reversed(state_keys), reversed(action_ids), reversed(rewards), reversed(legal_masks)):
             G = reward + self.gamma * G  # Discounted reward
-            state_key = self._get_state_key(state)
-            action_key = tuple(action)
-
-            # Update the state-action value
-            if state_key not in self.returns:
-                self.returns[state_key] = {}
-            if state_key not in self.Q:
-                self.Q[state_key] = {}
-            if action_key not in self.returns[state_key]:
-                self.returns[state_key][action_key] = []
-            if action_key not in self.Q[state_key]:
-                self.Q[state_key][action_key] = 0
-            self.returns[state_key][action_key].append(G)
+            state_id = self.Q.add(key, mask)
+            visits.append((state_id, action_id, G))
+
+        if self.first_visit:
+            # Going backwards in time, the last write is the first visit
+            first_returns = {}
+            for state_id, action_id, G in visits:
+                first_returns[(state_id, action_id)] = G
+            visits = [(state_id, action_id, G) for (state_id, action_id), G in first_returns.items()]
+
+        for state_id, action_id, G in visits:
+            self._update(state_id, action_id, G)
+
+    def learn_batch(self, state_keys, action_ids, rewards, segments, legal_masks=None):
+        """
+        learn_steps on every trajectory of a batch, with vectorized updates: the steps are flat
+        arrays and segments the offsets where the trajectories start, plus the total length
+        (see monte_carlo.parallel.collect_episodes). The Q-table ends up the same as with the loop.
+        """
+        segments = np.asarray(segments, dtype=np.int64)
+        if self.averaging == "returns":
+            for start, end in zip(segments[:-1].tolist(), segments[1:].tolist()):
+                self.learn_steps(list(state_keys[start:end]), list(action_ids[start:end]), list(rewards[start:end]),
+                                 None if legal_masks is None else legal_masks[start:end])
+            return
+        if len(segments) < 2 or segments[-1] == 0:
+            return
+
+        # learn_steps walks every trajectory backwards, so states get their ids and updates in that order
+        visits = reversed_within_segments(segments)
+        returns = discounted_returns(rewards, segments, self.gamma)[visits]
+        state_ids = self.Q.add_many(np.asarray(state_keys)[visits], None if legal_masks is None else np.asarray(legal_masks)[visits])
+        pairs = state_ids * self.Q.n_actions + np.asarray(action_ids, dtype=np.int64)[visits]
+
+        if self.first_visit:
+            # The first visit in time is the last one going backwards
+            trajectories = np.repeat(np.arange(len(segments) - 1), np.diff(segments))
+            visit_keys = (trajectories * (int(pairs.max()) + 1) + pairs)[::-1]
+            _, last = np.unique(visit_keys, return_index=True)
+            kept = np.sort(len(pairs) - 1 - last)
+            pairs, returns = pairs[kept], returns[kept]
+
+        values = self.Q.values.reshape(-1)
+        counts = self.Q.counts.reshape(-1)
+        for rows in dependency_levels(pairs):
+            pair = pairs[rows]
+            G = returns[rows]
+            mean = values[pair].astype(np.float64)
+            if self.averaging == "incremental":
+                count = counts[pair] + 1
+                counts[pair] = count
+                values[pair] = mean + (G - mean) / count
+            else:
+                values[pair] = mean + self.alpha * (G - mean)
+                counts[pair] += 1
+        self.Q.mask.reshape(-1)[pairs] = True
+
+    def _update(self, state_id: int, action_id: int, G: float):
+        if self.averaging == "incremental":
+            self.Q.update_mean(state_id, action_id, G)
+        elif self.averaging == "constant":
+            q = self.Q.get(state_id, action_id)
+            self.Q.set(state_id, action_id, q + self.alpha * (G - q))
+            self.Q.counts[state_id, action_id] += 1
+        else:
+            returns = self.returns.setdefault((state_id, action_id), [])
+            returns.append(G)
 
             # Average out all rewards for the state-action pair
-            self.Q[state_key][action_key] = np.mean(self.returns[state_key][action_key])
+            self.Q.set(state_id, action_id, np.mean(returns))
+            self.Q.counts[state_id, action_id] = len(returns)
+
+    def compact_returns(self, returns: Dict = None):
+        """
+        Convert a table of stored returns into (count, mean) entries and switch to "incremental" mode.
+
+        returns defaults to self.returns; tables of older agents keyed by
+        (tuple(hand), table_card, tuple(history)) with {tuple(action): [G, ...]} values are accepted too.
+        """
+        returns = self.returns if returns is None else returns
+
+        for key, value in returns.items():
+            if isinstance(value, dict):
+                hand, table_card, history = key
+                state_id = self.Q.add(pack_state(hand, table_card, history))
+                entries = [(state_id, actions.action_id(action), action_returns) for action, action_returns in value.items()]
+            else:
+                state_id, action_id = key
+                entries = [(state_id, action_id, value)]
+
+            for state_id, action_id, action_returns in entries:
+                if len(action_returns) == 0:
+                    self.Q.touch(state_id, action_id)
+                    continue
+                self.Q.set(state_id, action_id, np.mean(action_returns))
+                self.Q.counts[state_id, action_id] = len(action_returns)
+
+        self.returns = {}
+        self.averaging = "incremental"
 
     def act(self, state):
         """Choose the best action for the given state using the learned policy."""
-        state_key = self._get_state_key(state)
-
-        available_actions = LiarsBarEdiEnv.get_available_actions(state)
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        state_id = self.Q.lookup(self._get_state_key(state))
 
-        if state_key not in self.Q:
-            return random.choice(available_actions)
+        if state_id < 0:
+            return action_from_canonical_id(actions.random_action_id(actions.state_action_ids(state), self.rng), table_card)
 
         # Exploit learned policy (choose action with highest Q value)
-        return max(available_actions, key=lambda a: self.Q[state_key].get(tuple(a), MININT))
+        return action_from_canonical_id(self.Q.best_action(state_id, actions.state_action_mask(state), UNKNOWN_ACTION_VALUE), table_card)
+
+    def action_probabilities(self, state) -> np.ndarray:
+        """Probability of every action id under act(): uniform over the legal actions of an unseen state."""
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        mask = actions.state_action_mask(state)
+        state_id = self.Q.lookup(self._get_state_key(state))
+        if state_id < 0:
+            return from_canonical_probabilities(mask / mask.sum(), table_card)
+        probabilities = np.zeros(actions.NUM_ACTIONS)
+        probabilities[self.Q.best_action(state_id, mask, UNKNOWN_ACTION_VALUE)] = 1
+        return from_canonical_probabilities(probabilities, table_card)
+
+    def save(self, path):
+        """Write a checkpoint (see monte_carlo.checkpoint); "returns" mode is saved as its means and counts."""
+        save_q_table(self.Q, path, type(self).__name__, {
+            "epsilon": self.epsilon,
+            "gamma": self.gamma,
+            "averaging": "incremental" if self.averaging == "returns" else self.averaging,
+            "first_visit": self.first_visit,
+            "alpha": self.alpha,
+            "history_encoding": self.history_encoding.params(),
+            "canonical_ranks": self.canonical_ranks,
+        })
+
+    @classmethod
+    def load(cls, path, env: "LiarsBarEdiEnv" = None, mmap: bool = False):
+        """Agent of a checkpoint; with mmap its Q-table stays on disk and is read-only."""
+        table, meta = load_q_table(path, mmap)
+        agent = cls(env, **meta["params"])
+        agent.Q = table
+        return agent
@@ -1,9 +1,10 @@
-from copy import copy
-
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-from typing import Dict, Tuple, List
+from typing import Tuple, List, Optional
+
+from monte_carlo import actions
+from monte_carlo.state_index import Observation
 
 
 class LiarsBarEdiEnv(gym.Env):
@@ -12,8 +13,11 @@ class LiarsBarEdiEnv(gym.Env):
     CARD_PLACED_REWARD = 10
     CORRECT_CHALLENGE_REWARD = 50
 
-    def __init__(self, num_players: int = 4):
+    def __init__(self, num_players: int = 4, rng: Optional[np.random.Generator] = None):
+        """rng deals the rounds; without one, np_random is created and seeded by reset(seed) like in any gymnasium env."""
         super(LiarsBarEdiEnv, self).__init__()
+        if rng is not None:
+            self.np_random = rng
 
         self._num_players = num_players
         self._players = []
@@ -21,7 +25,8 @@ class LiarsBarEdiEnv(gym.Env):
         self._current_player_index = None
         self._previous_action = None
         self._table_card = None
-        self._history = []
+        self._history = ()
+        self._observation = None
         self._player_reward_history = []
         self._number_of_finished_players = 0
 
@@ -34,33 +39,32 @@ class LiarsBarEdiEnv(gym.Env):
         self.action_space = spaces.MultiDiscrete([4] * 4)
 
     def reset(self, seed=None, options=None):
-        super(LiarsBarEdiEnv, self).reset()
+        super(LiarsBarEdiEnv, self).reset(seed=seed)
 
-        self._current_player_index = np.random.randint(0, self._num_players)
+        self._current_player_index = int(self.np_random.integers(self._num_players))
         self._previous_player_index = None
         self._number_of_finished_players = 0
-        self._table_card = int(np.random.choice([1, 2, 3]))
-        self._history = []
-        deck = [0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3]
-        np.random.shuffle(deck)
+        self._table_card = int(self.np_random.integers(1, 4))
+        self._history = ()
+        self._observation = None
+        deck = self.np_random.permutation([0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3]).tolist()
         self._players = [{} for _ in range(self._num_players)]
         self._player_reward_history = [[] for _ in range(self._num_players)]
         for i in range(self._num_players):
-            self._players[i]["hand"] = [0 for _ in range(4)]
+            hand = [0 for _ in range(4)]
             for _ in range(5):
-                self._players[i]["hand"][deck.pop()] += 1
+                hand[deck.pop()] += 1
+            self._players[i]["hand"] = tuple(hand)
 
         return self._get_obs(), {}
 
-    def _get_obs(self) -> Dict:
-        hand = self._players[self._current_player_index]["hand"]
-
-        return {
-            "hand": copy(hand),
-            "table_card": copy(self._table_card),
-            "history": copy(self._history),
-            "num_players": self._num_players
-        }
+    def _get_obs(self) -> Observation:
+        # Hands and history are replaced, never changed, so the observation shares them
+        # and is kept until the next step
+        if self._observation is None:
+            self._observation = Observation(self._players[self._current_player_index]["hand"], self._table_card,
+                                            self._history, self._num_players)
+        return self._observation
 
 
     def get_obs(self):
@@ -70,13 +74,13 @@ class LiarsBarEdiEnv(gym.Env):
         return self._player_reward_history
 
     def step(self, action: Tuple[int, int, int, int]):
+        obs = self._get_obs()
         self._player_reward_history[self._current_player_index].append({
             "players": self._num_players,
-            "state": self._get_obs(),
+            "state": obs,
             "action": action,
             "reward": 0,
         })
-        obs = self._get_obs()
         #Challenge
         if action == [0, 0, 0, 0]:
             self._challenge()
@@ -94,6 +98,7 @@ class LiarsBarEdiEnv(gym.Env):
             self._current_player_index = (self._current_player_index + 1) % self._num_players
 
         self._previous_action = action
+        self._observation = None
         return obs, reward, done, {}
 
     def _challenge(self):
@@ -130,10 +135,9 @@ class LiarsBarEdiEnv(gym.Env):
 
         self._player_reward_history[self._current_player_index][-1]["reward"] += sum(action) * LiarsBarEdiEnv.CARD_PLACED_REWARD
 
-        self._history.append(sum(action))
+        self._history += (sum(action),)
 
-        for i in range(4):
-            current_player["hand"][i] -= action[i]
+        current_player["hand"] = tuple(current_player["hand"][i] - action[i] for i in range(4))
         if sum(current_player["hand"]) == 0:
             self._number_of_finished_players += 1
 
@@ -141,52 +145,20 @@ class LiarsBarEdiEnv(gym.Env):
         return action == [0, 0, 0, 0]
 
     def _get_available_actions(self) -> List[List[int]]:
-        current_player = self._players[self._current_player_index]
-        hand = current_player["hand"]
-        available_actions = []
+        hand = self._players[self._current_player_index]["hand"]
+        can_challenge = self._previous_player_index is not None
+        can_play = self._number_of_finished_players != self._num_players - 1
 
-        # Challenge
-        if self._previous_player_index is not None:
-            available_actions.append([0, 0, 0, 0])
+        return actions.legal_action_lists(hand, can_challenge, can_play)
 
-        if self._number_of_finished_players == self._num_players - 1:
-            return available_actions
-        
-        for jokers in range(hand[0] + 1):
-            for valets in range(hand[1] + 1):
-                for queens in range(hand[2] + 1):
-                    for kings in range(hand[3] + 1):
-                        if 1 <= jokers + valets + queens + kings <= 3:
-                            available_actions.append([jokers, valets, queens, kings])
+    def get_action_mask(self) -> np.ndarray:
+        """Legal-action mask over the ids of monte_carlo.actions for the current player."""
+        hand = self._players[self._current_player_index]["hand"]
+        can_challenge = self._previous_player_index is not None
+        can_play = self._number_of_finished_players != self._num_players - 1
 
-        return available_actions
+        return actions.legal_action_mask(hand, can_challenge, can_play)
 
     @classmethod
     def get_available_actions(cls, state):
-        available_actions = []
-        hand = state["hand"]
-        history = state["history"]
-        num_players = state["num_players"]
-
-        if len(history) > 0:
-            available_actions.append([0, 0, 0, 0])
-
-        if num_players * 5 - sum(history) == sum(hand):
-            return available_actions
-
-        for jokers in range(hand[0] + 1):
-            for valets in range(hand[1] + 1):
-                for queens in range(hand[2] + 1):
-                    for kings in range(hand[3] + 1):
-                        if 1 <= jokers + valets + queens + kings <= 3:
-                            available_actions.append([jokers, valets, queens, kings])
-
-        return available_actions
-
-
-
-
-
-
-
-
+        return actions.legal_action_lists(state["hand"], actions.can_challenge(state), actions.can_play(state))
@@ -1,6 +1,8 @@
 from monte_carlo.mc_env import LiarsBarEdiEnv
 from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.parallel import train_parallel
 from monte_carlo.random_agent import RandomAgent
+from monte_carlo.trajectory_store import TrajectoryStore, learn_from_store
 
 
 class MonteCarloTrainer:
@@ -8,7 +10,8 @@ class MonteCarloTrainer:
         self.env = env
         self.agent = agent
 
-    def train(self, episodes = 100):
+    def train(self, episodes = 100, recorder = None):
+        """recorder, a monte_carlo.trajectory_store.TrajectoryWriter, also stores every episode."""
         for episode_number in range(episodes):
             self.env.reset()
 
@@ -23,9 +26,19 @@ class MonteCarloTrainer:
             episode = self.env.get_player_reward_history()
             for i in range(4):
                 self.agent.learn(episode[i])
+            if recorder is not None:
+                recorder.add_episode(episode)
 
             print(f"Finished episode {episode_number}")
 
+    def train_parallel(self, episodes = 100, workers = 4, sync_every = 1000, seed = None):
+        """Collect the episodes in `workers` processes, see monte_carlo.parallel.train_parallel."""
+        train_parallel(self.agent, episodes, self.env._num_players, workers, sync_every, seed)
+
+    def train_from_store(self, path, batch_size = 65536):
+        """Learn from the episodes of a trajectory store instead of playing them."""
+        learn_from_store(self.agent, TrajectoryStore(path), batch_size)
+
 
 
 
@@ -0,0 +1,133 @@
+"""
+Parallel self-play for the tabular trainers.
+
+Worker processes play LiarsBarEdiEnv episodes with a snapshot of the agent,
+and send back every player's get_player_reward_history() as flat arrays.
+The learner merges them into its Q-table in task order, so a run only depends on
+the seed, the number of workers and the sync interval.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.symmetry import canonical_episode
+
+
+def collect_episodes(agent, num_players: int, episodes: int, seed) -> Dict[str, np.ndarray]:
+    """
+    Play episodes with agent.choose_action for every seat.
+
+    Returns the steps of every (episode, player) trajectory one after the other:
+    "state_keys", "actions" (ids), "rewards", "legal_masks", and "segments",
+    the offsets where each trajectory starts (plus the total length at the end).
+    seed (an int or a SeedSequence) seeds the one generator used by the environment and the agent.
+    """
+    rng = np.random.default_rng(seed)
+    env = LiarsBarEdiEnv(num_players=num_players, rng=rng)
+    agent.env = env
+    agent.rng = rng
+
+    state_keys: List[int] = []
+    action_ids: List[int] = []
+    rewards: List[float] = []
+    legal_masks: List[np.ndarray] = []
+    segments = [0]
+
+    for _ in range(episodes):
+        env.reset()
+        done = False
+        while not done:
+            state = env.get_obs()
+            _, _, done, _ = env.step(agent.choose_action(state))
+
+        for trajectory in env.get_player_reward_history():
+            if len(trajectory) == 0:
+                continue
+            # Keys, actions and masks of the observations the agent learns on
+            states, trajectory_actions = canonical_episode(trajectory, getattr(agent, "canonical_ranks", False))
+            for step, state, action_id in zip(trajectory, states, trajectory_actions):
+                state_keys.append(agent._get_state_key(state))
+                action_ids.append(action_id)
+                rewards.append(step["reward"])
+                legal_masks.append(actions.state_action_mask(state))
+            segments.append(len(state_keys))
+
+    return {
+        "state_keys": np.array(state_keys, dtype=np.int64),
+        "actions": np.array(action_ids, dtype=np.int8),
+        "rewards": np.array(rewards, dtype=np.float32),
+        "legal_masks": np.array(legal_masks, dtype=bool).reshape(-1, actions.NUM_ACTIONS),
+        "segments": np.array(segments, dtype=np.int64),
+    }
+
+
+def _collect_task(task):
+    return collect_episodes(*task)
+
+
+def merge_trajectories(agent, trajectories: Dict[str, np.ndarray]):
+    """Feed every collected trajectory to agent.learn_batch, or one by one to agent.learn_steps."""
+    segments = trajectories["segments"]
+    if hasattr(agent, "learn_batch"):
+        agent.learn_batch(trajectories["state_keys"], trajectories["actions"], trajectories["rewards"],
+                          segments, trajectories["legal_masks"])
+        return
+    for start, end in zip(segments[:-1], segments[1:]):
+        agent.learn_steps(
+            trajectories["state_keys"][start:end].tolist(),
+            trajectories["actions"][start:end].tolist(),
+            trajectories["rewards"][start:end].tolist(),
+            trajectories["legal_masks"][start:end]
+        )
+
+
+def _policy_snapshot(agent):
+    """Copy of the agent that can be pickled to the workers, without its environment."""
+    env = agent.env
+    agent.env = None
+    try:
+        return copy.deepcopy(agent)
+    finally:
+        agent.env = env
+
+
+def train_parallel(
+        agent,
+        episodes: int,
+        num_players: int = 4,
+        workers: int = 4,
+        sync_every: int = 1000,
+        seed: Optional[int] = None,
+        verbose: bool = True
+):
+    """
+    Train agent on `episodes` self-play episodes collected by `workers` processes.
+
+    Every `sync_every` episodes the workers receive a fresh snapshot of the agent;
+    within one sync interval they all play with the same, frozen policy.
+    """
+    seed_sequence = np.random.SeedSequence(seed)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    try:
+        done_episodes = 0
+        while done_episodes < episodes:
+            interval = min(sync_every, episodes - done_episodes)
+            counts = [interval // workers + (1 if i < interval % workers else 0) for i in range(workers)]
+            snapshot = _policy_snapshot(agent)
+            tasks = [(snapshot, num_players, count, child) for count, child in zip(counts, seed_sequence.spawn(workers)) if count > 0]
+
+            results = executor.map(_collect_task, tasks) if executor is not None else map(_collect_task, tasks)
+            for trajectories in results:
+                merge_trajectories(agent, trajectories)
+
+            done_episodes += interval
+            if verbose:
+                print(f"Finished episode {done_episodes - 1}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,142 @@
+from typing import Optional
+
+import numpy as np
+
+from monte_carlo.actions import NUM_ACTIONS
+from monte_carlo.state_index import SortedStateIndex, StateIndexer
+
+# Value given to actions never tried in a state, below any reachable return
+UNKNOWN_ACTION_VALUE = float(np.finfo(np.float32).min)
+
+
+class QTable:
+    """
+    Action values of the tabular agents: a growable float32 array of shape (n_states, n_actions)
+    indexed by the dense state ids of a StateIndexer and by the action ids of monte_carlo.actions.
+
+    mask marks the actions a state has entries for, the way the inner dicts
+    of the old tables only held some of the actions. With track_counts the table
+    also keeps a visit count per state-action, for running averages.
+    """
+
+    def __init__(self, n_actions: int = NUM_ACTIONS, capacity: int = 1024, track_counts: bool = False):
+        self.n_actions = n_actions
+        self.indexer = StateIndexer(capacity)
+        self._values = np.zeros((capacity, n_actions), dtype=np.float32)
+        self._mask = np.zeros((capacity, n_actions), dtype=bool)
+        self._counts = np.zeros((capacity, n_actions), dtype=np.int32) if track_counts else None
+
+    @classmethod
+    def from_arrays(cls, keys: np.ndarray, values: np.ndarray, mask: np.ndarray, counts: Optional[np.ndarray] = None, read_only: bool = False) -> "QTable":
+        """
+        Table whose state i has key keys[i]. With read_only the arrays are used as they are
+        (keys must be sorted, lookups are binary searches), otherwise they are copied and the table can grow.
+        """
+        table = cls.__new__(cls)
+        table.n_actions = values.shape[1]
+        if read_only:
+            table.indexer = SortedStateIndex(keys)
+            table._values, table._mask, table._counts = values, mask, counts
+            return table
+
+        table.indexer = StateIndexer.from_keys(keys)
+        capacity = len(table.indexer._keys)
+        table._values = np.zeros((capacity, table.n_actions), dtype=np.float32)
+        table._mask = np.zeros((capacity, table.n_actions), dtype=bool)
+        table._values[:len(keys)] = values
+        table._mask[:len(keys)] = mask
+        table._counts = None
+        if counts is not None:
+            table._counts = np.zeros((capacity, table.n_actions), dtype=np.int32)
+            table._counts[:len(keys)] = counts
+        return table
+
+    def __len__(self):
+        return len(self.indexer)
+
+    def __contains__(self, key: int):
+        return key in self.indexer
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:len(self.indexer)]
+
+    @property
+    def mask(self) -> np.ndarray:
+        return self._mask[:len(self.indexer)]
+
+    @property
+    def counts(self) -> Optional[np.ndarray]:
+        return None if self._counts is None else self._counts[:len(self.indexer)]
+
+    def lookup(self, key: int) -> int:
+        return self.indexer.lookup(key)
+
+    def add(self, key: int, legal_mask: Optional[np.ndarray] = None) -> int:
+        """Id of the state, creating it (with legal_mask as its known actions) if needed."""
+        state_id = self.indexer.lookup(key)
+        if state_id >= 0:
+            return state_id
+
+        state_id = self.indexer.add(key)
+        if state_id == len(self._values):
+            self._grow()
+        if legal_mask is not None:
+            self._mask[state_id] = legal_mask
+        return state_id
+
+    def add_many(self, keys: np.ndarray, legal_masks: Optional[np.ndarray] = None) -> np.ndarray:
+        """Vectorized add: ids of the keys, a new state taking the legal mask of its first row."""
+        known = len(self.indexer)
+        state_ids = self.indexer.add_many(keys)
+        while len(self.indexer) > len(self._values):
+            self._grow()
+        if legal_masks is not None:
+            new_rows = np.flatnonzero(state_ids >= known)
+            _, first = np.unique(state_ids[new_rows], return_index=True)
+            self._mask[state_ids[new_rows[first]]] = np.asarray(legal_masks)[new_rows[first]]
+        return state_ids
+
+    def _grow(self):
+        self._values = np.concatenate([self._values, np.zeros_like(self._values)])
+        self._mask = np.concatenate([self._mask, np.zeros_like(self._mask)])
+        if self._counts is not None:
+            self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+
+    def get(self, state_id: int, action: int) -> float:
+        return float(self._values[state_id, action])
+
+    def set(self, state_id: int, action: int, value: float):
+        self._values[state_id, action] = value
+        self._mask[state_id, action] = True
+
+    def update_mean(self, state_id: int, action: int, value: float):
+        """Add one sample to the running mean of the state-action (needs track_counts)."""
+        count = int(self._counts[state_id, action]) + 1
+        mean = float(self._values[state_id, action])
+        self._counts[state_id, action] = count
+        self._values[state_id, action] = mean + (value - mean) / count
+        self._mask[state_id, action] = True
+
+    def touch(self, state_id: int, action: int):
+        """Give the action an entry if it has none; values of actions without one are always 0."""
+        self._mask[state_id, action] = True
+
+    def known_actions(self, state_id: int) -> np.ndarray:
+        return np.flatnonzero(self._mask[state_id])
+
+    def best_action(self, state_id: int, legal_mask: Optional[np.ndarray] = None, unknown_value: float = 0.0) -> int:
+        """
+        First legal action with the highest value; actions without an entry count as unknown_value.
+        Without legal_mask only the known actions are considered.
+        """
+        row = np.where(self._mask[state_id], self._values[state_id], np.float32(unknown_value))
+        candidates = np.flatnonzero(self._mask[state_id] if legal_mask is None else legal_mask)
+        return int(candidates[np.argmax(row[candidates])])
+
+    def max_value(self, state_id: int, default: float = 0.0) -> float:
+        """Highest value among the known actions of the state, default when it has none."""
+        known = self._mask[state_id]
+        if not known.any():
+            return default
+        return float(self._values[state_id][known].max())
@@ -1,12 +1,15 @@
-import random
+from typing import Optional
+
+import numpy as np
 
 from monte_carlo.mc_env import LiarsBarEdiEnv
 
 
 class RandomAgent:
-    def __init__(self, env: LiarsBarEdiEnv):
+    def __init__(self, env: LiarsBarEdiEnv, rng: Optional[np.random.Generator] = None):
         self.env = env
+        self.rng = np.random.default_rng(rng)
 
     def __act__(self):
         actions = self.env._get_available_actions()
-        return random.choice(actions)
\ No newline at end of file
+        return actions[int(self.rng.integers(len(actions)))]
\ No newline at end of file
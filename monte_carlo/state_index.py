@@ -0,0 +1,217 @@
+"""
+Perfect hashing of observations into integers and a dense index over the states seen so far.
+
+A state key packs the same information the tabular agents used as tuple keys
+(hand, table card and history) into one int:
+
+    key = (history_code * 4 + table_card) * NUM_HANDS + hand_code
+
+hand_code is monte_carlo.actions.encode_hand and history_code is the bijective
+base-3 number of the history (every play is 1, 2 or 3 cards), so different
+histories, including ones of different lengths, never share a code.
+
+The envs and rounds hand out observations as Observation objects, which carry
+their key once it has been computed and read like the dicts they replace.
+"""
+from collections.abc import Mapping
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from monte_carlo.actions import NUM_HANDS, encode_hand, HAND_BASE, NUMBER_OF_RANKS
+
+NUMBER_OF_TABLE_CARDS = 4
+HISTORY_BASE = 3
+
+
+def encode_history(history: Sequence[int]) -> int:
+    code = 0
+    for cards in history:
+        code = code * HISTORY_BASE + cards
+    return code
+
+
+def encode_histories(histories: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Vectorized encode_history of the rows of histories, each padded after its first lengths[i] plays."""
+    codes = np.zeros(len(histories), dtype=np.int64)
+    for position in range(histories.shape[1]):
+        played = position < lengths
+        codes[played] = codes[played] * HISTORY_BASE + histories[played, position]
+    return codes
+
+
+def decode_history(code: int) -> List[int]:
+    history = []
+    while code > 0:
+        cards = code % HISTORY_BASE or HISTORY_BASE
+        history.append(cards)
+        code = (code - cards) // HISTORY_BASE
+    history.reverse()
+    return history
+
+
+def pack_state(hand: Sequence[int], table_card: int, history: Sequence[int]) -> int:
+    return (encode_history(history) * NUMBER_OF_TABLE_CARDS + table_card) * NUM_HANDS + encode_hand(hand)
+
+
+def state_key(state: Dict) -> int:
+    """Integer key of an observation of LiarsBarEdiEnv, equivalent to (tuple(hand), table_card, tuple(history))."""
+    if type(state) is Observation:
+        return state.key
+    return pack_state(state["hand"], state["table_card"], state["history"])
+
+
+OBSERVATION_FIELDS = ("hand", "table_card", "history", "num_players")
+_FIELD_SET = frozenset(OBSERVATION_FIELDS)
+
+
+class Observation(Mapping):
+    """
+    What the player to act sees: hand and history are tuples shared with the env, so an
+    observation is never copied, and the state key is computed once. Reads like the
+    observation dicts (state["hand"], get, keys, items, dict(state)), without item assignment.
+    Item access costs a Python call, so hot paths read the attributes (state.hand) instead.
+    """
+    __slots__ = OBSERVATION_FIELDS + ("_key",)
+
+    def __init__(self, hand: Tuple[int, ...], table_card: int, history: Tuple[int, ...], num_players: int,
+                 key: Optional[int] = None):
+        self.hand = hand
+        self.table_card = table_card
+        self.history = history
+        self.num_players = num_players
+        self._key = key
+
+    @property
+    def key(self) -> int:
+        if self._key is None:
+            self._key = pack_state(self.hand, self.table_card, self.history)
+        return self._key
+
+    def __getitem__(self, name: str):
+        if name in _FIELD_SET:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    # Mapping.get and Mapping.__contains__ go through __getitem__ and a try/except
+    def get(self, name: str, default=None):
+        return getattr(self, name) if name in _FIELD_SET else default
+
+    def __contains__(self, name) -> bool:
+        return name in _FIELD_SET
+
+    def __iter__(self):
+        return iter(OBSERVATION_FIELDS)
+
+    def __len__(self):
+        return len(OBSERVATION_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return Observation, (self.hand, self.table_card, self.history, self.num_players, self._key)
+
+
+def unpack_state_key(key: int) -> Tuple[List[int], int, List[int]]:
+    """Inverse of pack_state: returns (hand, table_card, history)."""
+    hand_code = key % NUM_HANDS
+    rest = key // NUM_HANDS
+    hand = [(hand_code // HAND_BASE ** r) % HAND_BASE for r in range(NUMBER_OF_RANKS)]
+    return hand, rest % NUMBER_OF_TABLE_CARDS, decode_history(rest // NUMBER_OF_TABLE_CARDS)
+
+
+class StateIndexer:
+    """Gives every new state key the next dense id (0, 1, 2, ...)."""
+
+    def __init__(self, capacity: int = 1024):
+        self._ids: Dict[int, int] = {}
+        self._keys = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key: int):
+        return key in self._ids
+
+    @property
+    def keys(self) -> np.ndarray:
+        """State keys ordered by id."""
+        return self._keys[:len(self._ids)]
+
+    def lookup(self, key: int) -> int:
+        """Id of the key, -1 if it was never added."""
+        return self._ids.get(key, -1)
+
+    def add(self, key: int) -> int:
+        state_id = self._ids.get(key)
+        if state_id is None:
+            state_id = len(self._ids)
+            if state_id == len(self._keys):
+                self._keys = np.concatenate([self._keys, np.zeros_like(self._keys)])
+            self._keys[state_id] = key
+            self._ids[key] = state_id
+        return state_id
+
+    def add_many(self, keys: np.ndarray) -> np.ndarray:
+        """Ids of the keys; new keys get the next ids in the order they first appear, as with add."""
+        unique, first, inverse = np.unique(np.asarray(keys, dtype=np.int64), return_index=True, return_inverse=True)
+        ids = np.fromiter(map(self._ids.get, unique.tolist(), repeat(-1)), dtype=np.int64, count=len(unique))
+
+        new = np.flatnonzero(ids < 0)
+        new = new[np.argsort(first[new], kind="stable")]
+        start = len(self._ids)
+        ids[new] = np.arange(start, start + len(new))
+        while start + len(new) > len(self._keys):
+            self._keys = np.concatenate([self._keys, np.zeros_like(self._keys)])
+        self._keys[start:start + len(new)] = unique[new]
+        self._ids.update(zip(unique[new].tolist(), range(start, start + len(new))))
+        return ids[inverse]
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray) -> "StateIndexer":
+        """Indexer giving keys[i] the id i."""
+        indexer = cls(max(len(keys), 1))
+        indexer._keys[:len(keys)] = keys
+        indexer._ids = dict(zip(np.asarray(keys).tolist(), range(len(keys))))
+        return indexer
+
+
+class SortedStateIndex:
+    """
+    Read-only index over a sorted key array (e.g. memory-mapped from a checkpoint):
+    the id of a key is its position, found by binary search.
+    """
+
+    def __init__(self, keys: np.ndarray):
+        self._keys = keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key: int):
+        return self.lookup(key) >= 0
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._keys
+
+    def lookup(self, key: int) -> int:
+        position = int(np.searchsorted(self._keys, key))
+        if position < len(self._keys) and self._keys[position] == key:
+            return position
+        return -1
+
+    def add(self, key: int) -> int:
+        state_id = self.lookup(key)
+        if state_id < 0:
+            raise ValueError("Cannot add states to a read-only Q-table, load the checkpoint without mmap to train it.")
+        return state_id
+
+    def add_many(self, keys: np.ndarray) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self._keys, keys), max(len(self._keys) - 1, 0))
+        if len(keys) and (len(self._keys) == 0 or np.any(self._keys[positions] != keys)):
+            raise ValueError("Cannot add states to a read-only Q-table, load the checkpoint without mmap to train it.")
+        return positions.astype(np.int64)
@@ -0,0 +1,115 @@
+"""
+Table-card symmetry of the round.
+
+Queens, kings and aces only differ by which of them is the table card, so relabeling
+the ranks maps every observation to one whose table card is a queen. The tabular
+agents built with canonical_ranks=True store and learn the canonical observations
+only, a third of the states, and every episode teaches all three table cards.
+
+The relabeling keeps the jokers at rank 0, puts the table card at rank 1 and the two
+other ranks after it in their order. Actions are card counts per rank, so they are
+relabeled the same way: an agent picks a canonical action id and plays
+from_canonical_action of it. History and hand sizes do not depend on the ranks, so
+keys of canonical observations are the state keys of any history encoding.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.state_index import NUMBER_OF_TABLE_CARDS, Observation
+
+CANONICAL_TABLE_CARD = 1
+
+# RANK_ORDER[table_card, r]: rank of the observation shown as rank r of the canonical one
+RANK_ORDER = np.array([[0, 1, 2, 3], [0, 1, 2, 3], [0, 2, 1, 3], [0, 3, 1, 2]])
+RANK_ORDER.setflags(write=False)
+_RANK_ORDER = RANK_ORDER.tolist()
+
+
+def _build_tables() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    codes = np.arange(actions.NUM_HANDS)
+    hands = np.stack([(codes // actions.HAND_BASE ** r) % actions.HAND_BASE for r in range(actions.NUMBER_OF_RANKS)], axis=1)
+    action_ids = {tuple(action): i for i, action in enumerate(actions.ACTIONS.tolist())}
+
+    canonical_hands = np.zeros((NUMBER_OF_TABLE_CARDS, actions.NUM_HANDS), dtype=np.int64)
+    to_canonical = np.zeros((NUMBER_OF_TABLE_CARDS, actions.NUM_ACTIONS), dtype=np.int64)
+    for table_card, order in enumerate(RANK_ORDER):
+        canonical_hands[table_card] = actions.encode_hands(hands[:, order])
+        to_canonical[table_card] = [action_ids[tuple(action)] for action in actions.ACTIONS[:, order].tolist()]
+    from_canonical = np.argsort(to_canonical, axis=1)
+    return canonical_hands, to_canonical, from_canonical
+
+
+# CANONICAL_HANDS[table_card, hand_code], TO_CANONICAL[table_card, action_id], FROM_CANONICAL its inverse
+CANONICAL_HANDS, TO_CANONICAL, FROM_CANONICAL = _build_tables()
+for _table in (CANONICAL_HANDS, TO_CANONICAL, FROM_CANONICAL):
+    _table.setflags(write=False)
+_TO_CANONICAL = TO_CANONICAL.tolist()
+_FROM_CANONICAL = FROM_CANONICAL.tolist()
+
+
+def canonical_state(state: Dict) -> Observation:
+    """The observation with its ranks relabeled so that the table card is CANONICAL_TABLE_CARD."""
+    hand = state["hand"]
+    order = _RANK_ORDER[state["table_card"]]
+    return Observation((hand[0], hand[order[1]], hand[order[2]], hand[order[3]]), CANONICAL_TABLE_CARD,
+                       state["history"], state["num_players"])
+
+
+def canonicalize(state: Dict, enabled: bool = True) -> Tuple[Dict, Optional[int]]:
+    """(canonical observation, table card), or (state, None) when the symmetry is not used."""
+    if not enabled:
+        return state, None
+    return canonical_state(state), state["table_card"]
+
+
+def to_canonical_action(action_id: int, table_card: Optional[int]) -> int:
+    """Canonical id of an action played with the given table card (the same id for None)."""
+    return action_id if table_card is None else _TO_CANONICAL[table_card][action_id]
+
+
+def from_canonical_action(action_id: int, table_card: Optional[int]) -> int:
+    """Action id to play for a canonical action id, inverse of to_canonical_action."""
+    return action_id if table_card is None else _FROM_CANONICAL[table_card][action_id]
+
+
+def canonical_episode(episode: List[Dict], enabled: bool = True) -> Tuple[List[Dict], List[int]]:
+    """Observations and action ids of the steps of one player's episode, canonical when enabled."""
+    states, action_ids = [], []
+    for step in episode:
+        state, table_card = canonicalize(step["state"], enabled)
+        states.append(state)
+        action_ids.append(to_canonical_action(actions.action_id(step["action"]), table_card))
+    return states, action_ids
+
+
+def action_from_canonical_id(action_id: int, table_card: Optional[int]) -> List[int]:
+    """The action to give to LiarsBarEdiEnv.step for a canonical action id."""
+    return actions.action_from_id(from_canonical_action(action_id, table_card))
+
+
+def from_canonical_probabilities(probabilities: np.ndarray, table_card: Optional[int]) -> np.ndarray:
+    """Probabilities over the action ids of the observation, from probabilities over canonical ids."""
+    if table_card is None:
+        return probabilities
+    return probabilities[TO_CANONICAL[table_card]]
+
+
+def canonical_keys(keys: np.ndarray) -> np.ndarray:
+    """Vectorized: keys of the canonical observations, from state keys of any history encoding."""
+    keys = np.asarray(keys, dtype=np.int64)
+    hand_codes = keys % actions.NUM_HANDS
+    rest = keys // actions.NUM_HANDS
+    table_cards = rest % NUMBER_OF_TABLE_CARDS
+    history_codes = rest // NUMBER_OF_TABLE_CARDS
+    return (history_codes * NUMBER_OF_TABLE_CARDS + CANONICAL_TABLE_CARD) * actions.NUM_HANDS + CANONICAL_HANDS[table_cards, hand_codes]
+
+
+def canonical_steps(table_cards: np.ndarray, action_ids: np.ndarray, legal_masks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized: canonical action ids and legal masks of steps played with the given table cards."""
+    table_cards = np.asarray(table_cards, dtype=np.intp)
+    canonical_ids = TO_CANONICAL[table_cards, np.asarray(action_ids, dtype=np.intp)]
+    # Canonical action c is legal when the action it stands for is
+    canonical_masks = np.take_along_axis(np.asarray(legal_masks), FROM_CANONICAL[table_cards], axis=1)
+    return canonical_ids, canonical_masks
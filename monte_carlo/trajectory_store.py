@@ -0,0 +1,310 @@
+"""
+Append-only, columnar store of self-play trajectories.
+
+A store is a directory with one raw file per column plus a meta.json, every row
+being one step of one player:
+
+    hand.bin            uint16              monte_carlo.actions.encode_hand of the hand
+    table_card.bin      uint8
+    num_players.bin     uint8
+    history_length.bin  uint8               number of plays on the table
+    history.bin         uint8 (MAX_HISTORY) the plays, padded with zeros
+    action.bin          uint8               action id
+    reward.bin          float32
+    player.bin          uint8               seat of the player in the round
+    episode.bin         int64
+    meta.json           format, version, columns, rows and episodes
+
+Rows are grouped by episode, then by player, in the order of the steps, so every
+(episode, player) run of rows is one trajectory as learn_steps expects it.
+
+TrajectoryWriter buffers whole episodes in fixed-size chunks and appends them to the
+column files; meta.json is rewritten after the columns, so a reader never sees a
+partial chunk. TrajectoryStore memory-maps the rows committed when it is opened and
+iterates them in batches of whole trajectories, in the format of
+monte_carlo.parallel.collect_episodes, so the tabular agents learn from a dataset
+without playing the episodes again:
+
+    python -m monte_carlo.trajectory_store data/selfplay --episodes 100000 --seed 0
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
+from monte_carlo.symmetry import canonical_keys, canonical_steps
+
+FORMAT = "liars-bar-trajectories"
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+HAND_SIZE = 5
+MAX_HISTORY = 20  # every play is at least one card of a 20-card deck
+MAX_EPISODE_STEPS = MAX_HISTORY + 1
+
+# name -> (dtype, width); width 1 columns are stored as 1-d arrays
+COLUMNS = {
+    "hand": (np.uint16, 1),
+    "table_card": (np.uint8, 1),
+    "num_players": (np.uint8, 1),
+    "history_length": (np.uint8, 1),
+    "history": (np.uint8, MAX_HISTORY),
+    "action": (np.uint8, 1),
+    "reward": (np.float32, 1),
+    "player": (np.uint8, 1),
+    "episode": (np.int64, 1),
+}
+
+_HAND_SIZES = sum((np.arange(actions.NUM_HANDS) // actions.HAND_BASE ** rank) % actions.HAND_BASE
+                  for rank in range(actions.NUMBER_OF_RANKS))
+
+
+def _column_shape(name: str, rows: int):
+    width = COLUMNS[name][1]
+    return (rows,) if width == 1 else (rows, width)
+
+
+def _column_path(path, name: str) -> str:
+    return os.path.join(path, f"{name}.bin")
+
+
+def read_meta(path) -> Dict:
+    with open(os.path.join(path, META_FILE)) as file:
+        meta = json.load(file)
+    if meta.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a trajectory store.")
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported trajectory store version {meta['version']}, this code reads version {FORMAT_VERSION}.")
+    return meta
+
+
+def _write_meta(path, rows: int, episodes: int):
+    meta = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "columns": {name: [np.dtype(dtype).str, width] for name, (dtype, width) in COLUMNS.items()},
+        "rows": rows,
+        "episodes": episodes,
+    }
+    # Replaced in one step, so readers see either the old or the new row count
+    temporary = os.path.join(path, META_FILE + ".tmp")
+    with open(temporary, "w") as file:
+        json.dump(meta, file, indent=2)
+    os.replace(temporary, os.path.join(path, META_FILE))
+
+
+class TrajectoryWriter:
+    """
+    Appends episodes to the store at path, creating it if needed. Episodes are
+    buffered in chunks of up to chunk_size steps; use it as a context manager, or
+    call close(), to write the last chunk.
+    """
+
+    def __init__(self, path, chunk_size: int = 65536):
+        if chunk_size < MAX_EPISODE_STEPS:
+            raise ValueError(f"chunk_size must hold an episode of {MAX_EPISODE_STEPS} steps.")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, META_FILE)):
+            meta = read_meta(path)
+            self.rows, self.episodes = meta["rows"], meta["episodes"]
+            # Rows past the committed count come from an interrupted write
+            for name in COLUMNS:
+                dtype, width = COLUMNS[name]
+                with open(_column_path(path, name), "r+b") as file:
+                    file.truncate(self.rows * width * np.dtype(dtype).itemsize)
+        else:
+            self.rows, self.episodes = 0, 0
+            for name in COLUMNS:
+                open(_column_path(path, name), "wb").close()
+            _write_meta(path, 0, 0)
+
+        self._chunk = {name: np.zeros(_column_shape(name, chunk_size), dtype=dtype) for name, (dtype, _) in COLUMNS.items()}
+        self._chunk_size = chunk_size
+        self._size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_episode(self, player_reward_history: List[List[Dict]]) -> int:
+        """Buffer an episode given as LiarsBarEdiEnv.get_player_reward_history(); returns its episode id."""
+        steps = sum(len(trajectory) for trajectory in player_reward_history)
+        if self._size + steps > self._chunk_size:
+            self.flush()
+
+        episode = self.episodes
+        chunk = self._chunk
+        row = self._size
+        for player, trajectory in enumerate(player_reward_history):
+            for step in trajectory:
+                state = step["state"]
+                history = state["history"]
+                chunk["hand"][row] = actions.encode_hand(state["hand"])
+                chunk["table_card"][row] = state["table_card"]
+                chunk["num_players"][row] = state["num_players"]
+                chunk["history_length"][row] = len(history)
+                chunk["history"][row, :len(history)] = history
+                chunk["history"][row, len(history):] = 0
+                chunk["action"][row] = actions.action_id(step["action"])
+                chunk["reward"][row] = step["reward"]
+                chunk["player"][row] = player
+                chunk["episode"][row] = episode
+                row += 1
+
+        self._size = row
+        self.episodes += 1
+        return episode
+
+    def flush(self):
+        """Append the buffered episodes to the column files, then commit them in meta.json."""
+        if self._size == 0:
+            return
+        for name, column in self._chunk.items():
+            with open(_column_path(self.path, name), "ab") as file:
+                file.write(column[:self._size].tobytes())
+        self.rows += self._size
+        self._size = 0
+        _write_meta(self.path, self.rows, self.episodes)
+
+    def close(self):
+        self.flush()
+
+
+class TrajectoryStore:
+    """Read-only view of the rows a store had when it was opened; with mmap they stay on disk."""
+
+    def __init__(self, path, mmap: bool = True):
+        meta = read_meta(path)
+        self.path = path
+        self.num_episodes = meta["episodes"]
+        self._rows = meta["rows"]
+        self.columns = {name: self._load_column(name, mmap) for name in COLUMNS}
+
+    def _load_column(self, name: str, mmap: bool) -> np.ndarray:
+        dtype = COLUMNS[name][0]
+        shape = _column_shape(name, self._rows)
+        if self._rows == 0:
+            return np.zeros(shape, dtype=dtype)
+        if mmap:
+            return np.memmap(_column_path(self.path, name), dtype=dtype, mode="r", shape=shape)
+        return np.fromfile(_column_path(self.path, name), dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def state_keys(self, start: int = 0, end: Optional[int] = None,
+                   history_encoding: Optional[HistoryEncoding] = None) -> np.ndarray:
+        """
+        State keys of the observations of rows start:end, under the history encoding of the agent
+        (monte_carlo.state_index.state_key with the default one).
+        """
+        rows = slice(start, end)
+        hands = self.columns["hand"][rows]
+        return as_history_encoding(history_encoding).state_keys(
+            hands, self.columns["table_card"][rows], self.columns["history"][rows], self.columns["history_length"][rows],
+            self.columns["num_players"][rows], _HAND_SIZES[hands])
+
+    def legal_masks(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """monte_carlo.actions.state_action_mask of the observations of rows start:end."""
+        rows = slice(start, end)
+        hands = self.columns["hand"][rows].astype(np.int64)
+        cards_played = self.columns["history"][rows].sum(axis=1, dtype=np.int64)
+        can_challenge = self.columns["history_length"][rows] > 0
+        can_play = self.columns["num_players"][rows].astype(np.int64) * HAND_SIZE - cards_played != _HAND_SIZES[hands]
+        return actions.LEGAL_MASKS[can_challenge.astype(np.intp), can_play.astype(np.intp), hands]
+
+    def segments(self) -> np.ndarray:
+        """Offsets where every (episode, player) trajectory starts, plus the number of rows at the end."""
+        episode = self.columns["episode"]
+        player = self.columns["player"]
+        starts = np.flatnonzero((episode[1:] != episode[:-1]) | (player[1:] != player[:-1])) + 1
+        return np.concatenate(([0], starts, [self._rows])) if self._rows else np.zeros(1, dtype=np.int64)
+
+    def batches(self, batch_size: int = 65536, history_encoding: Optional[HistoryEncoding] = None,
+                canonical_ranks: bool = False) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Whole trajectories of about batch_size steps at a time (at least one), in the format of
+        monte_carlo.parallel.collect_episodes, keyed with history_encoding. With canonical_ranks the
+        keys, actions and masks are those of the canonical observations (monte_carlo.symmetry).
+        """
+        segments = self.segments()
+        first = 0
+        while first < len(segments) - 1:
+            start = segments[first]
+            last = max(int(np.searchsorted(segments, start + batch_size, side="right")) - 1, first + 1)
+            end = segments[last]
+            state_keys = self.state_keys(start, end, history_encoding)
+            action_ids = np.asarray(self.columns["action"][start:end])
+            legal_masks = self.legal_masks(start, end)
+            if canonical_ranks:
+                state_keys = canonical_keys(state_keys)
+                action_ids, legal_masks = canonical_steps(self.columns["table_card"][start:end], action_ids, legal_masks)
+            yield {
+                "state_keys": state_keys,
+                "actions": action_ids,
+                "rewards": np.asarray(self.columns["reward"][start:end]),
+                "legal_masks": legal_masks,
+                "segments": segments[first:last + 1] - start,
+            }
+            first = last
+
+
+def learn_from_store(agent, store: TrajectoryStore, batch_size: int = 65536):
+    """Feed every trajectory of the store to agent.learn_steps, in the order they were recorded."""
+    from monte_carlo.parallel import merge_trajectories
+
+    for batch in store.batches(batch_size, getattr(agent, "history_encoding", None), getattr(agent, "canonical_ranks", False)):
+        merge_trajectories(agent, batch)
+
+
+def record_episodes(agent, path, episodes: int, num_players: int = 4, rng: Optional[np.random.Generator] = None,
+                    chunk_size: int = 65536) -> int:
+    """Append `episodes` episodes played with agent.choose_action for every seat; returns the rows of the store."""
+    from monte_carlo.mc_env import LiarsBarEdiEnv
+
+    env = LiarsBarEdiEnv(num_players=num_players, rng=rng)
+    agent.env = env
+    with TrajectoryWriter(path, chunk_size) as writer:
+        for _ in range(episodes):
+            env.reset()
+            done = False
+            while not done:
+                _, _, done, _ = env.step(agent.choose_action(env.get_obs()))
+            writer.add_episode(env.get_player_reward_history())
+    return writer.rows
+
+
+def main(argv=None):
+    from agent_registry import load_agent
+    from monte_carlo.mc_agent import MonteCarloAgent
+
+    parser = argparse.ArgumentParser(description="Record self-play episodes in a trajectory store")
+    parser.add_argument("path", help="directory of the store, appended to if it exists")
+    parser.add_argument("--episodes", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--agent", default=None, help="checkpoint of the agent playing every seat (default: random play)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    agent = MonteCarloAgent(None, epsilon=1.0, rng=rng) if args.agent is None else load_agent(args.agent)
+    agent.rng = rng
+
+    start = time.perf_counter()
+    rows = record_episodes(agent, args.path, args.episodes, args.players, rng)
+    print(f"{args.episodes} episodes in {time.perf_counter() - start:.1f}s, the store has {rows} steps")
+
+
+if __name__ == "__main__":
+    main()
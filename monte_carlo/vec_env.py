@@ -0,0 +1,181 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from monte_carlo import actions as action_catalogue
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.state_index import Observation
+
+
+class LiarsBarVecEnv:
+    """
+    B independent LiarsBarEdiEnv rounds stored as NumPy arrays and stepped in lockstep.
+
+    Rules and rewards are the same as LiarsBarEdiEnv._challenge / _play_turn.
+    Finished games are reset automatically, so after step() every game is waiting
+    for the action of its current player.
+    """
+    HAND_SIZE = 5
+    MAX_HISTORY = 20
+    NUMBER_OF_RANKS = 4
+    DECK = np.array([0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3], dtype=np.int8)
+
+    def __init__(self, num_envs: int, num_players: int = 4, seed: Optional[int] = None):
+        if num_players * self.HAND_SIZE > len(self.DECK):
+            raise ValueError("Not enough cards for that many players")
+
+        self.num_envs = num_envs
+        self.num_players = num_players
+        self._rng = np.random.default_rng(seed)
+        self._env_index = np.arange(num_envs)
+
+        self.hands = np.zeros((num_envs, num_players, self.NUMBER_OF_RANKS), dtype=np.int8)
+        self.history = np.zeros((num_envs, self.MAX_HISTORY), dtype=np.int8)
+        self.history_length = np.zeros(num_envs, dtype=np.int8)
+        self.table_card = np.zeros(num_envs, dtype=np.int8)
+        self.current_player = np.zeros(num_envs, dtype=np.int8)
+        # -1 means nobody has played yet in this round
+        self.previous_player = np.full(num_envs, -1, dtype=np.int8)
+        self.previous_action = np.zeros((num_envs, self.NUMBER_OF_RANKS), dtype=np.int8)
+        self.finished_players = np.zeros(num_envs, dtype=np.int8)
+
+    def reset(self, seed: Optional[int] = None) -> Dict:
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        self._reset_games(self._env_index)
+        return self.get_obs()
+
+    def _reset_games(self, games: np.ndarray):
+        n = len(games)
+        if n == 0:
+            return
+
+        self.current_player[games] = self._rng.integers(0, self.num_players, size=n)
+        self.previous_player[games] = -1
+        self.previous_action[games] = 0
+        self.finished_players[games] = 0
+        self.table_card[games] = self._rng.integers(1, 4, size=n)
+        self.history[games] = 0
+        self.history_length[games] = 0
+
+        decks = self._rng.permuted(np.tile(self.DECK, (n, 1)), axis=1)
+        dealt = decks[:, :self.num_players * self.HAND_SIZE].reshape(n, self.num_players, self.HAND_SIZE)
+        ranks = np.arange(self.NUMBER_OF_RANKS, dtype=np.int8)
+        self.hands[games] = (dealt[..., None] == ranks).sum(axis=2)
+
+    def get_obs(self) -> Dict:
+        """Observations of the players to act, one row per game."""
+        return {
+            "hand": self.hands[self._env_index, self.current_player].copy(),
+            "table_card": self.table_card.copy(),
+            "history": self.history.copy(),
+            "history_length": self.history_length.copy(),
+            "num_players": self.num_players,
+        }
+
+    def get_obs_dicts(self) -> List[Observation]:
+        """The same observations as the Observations of LiarsBarEdiEnv.get_obs, for the existing agents."""
+        hands = list(map(tuple, self.hands[self._env_index, self.current_player].tolist()))
+        table_cards = self.table_card.tolist()
+        lengths = self.history_length.tolist()
+        history = self.history.tolist()
+
+        return [Observation(hands[i], table_cards[i], tuple(history[i][:lengths[i]]), self.num_players)
+                for i in range(self.num_envs)]
+
+    def legal_action_mask(self) -> np.ndarray:
+        """(B, NUM_ACTIONS) legal-action masks of the players to act, see monte_carlo.actions."""
+        hands = self.hands[self._env_index, self.current_player]
+        can_challenge = (self.previous_player >= 0).astype(np.intp)
+        can_play = (self.finished_players != self.num_players - 1).astype(np.intp)
+        return action_catalogue.LEGAL_MASKS[can_challenge, can_play, action_catalogue.encode_hands(hands.astype(np.intp))]
+
+    def step(self, actions: np.ndarray) -> Tuple[Dict, np.ndarray, np.ndarray, Dict]:
+        """
+        Play one action in every game.
+
+        actions is either an array of B action ids (see monte_carlo.actions) or has
+        shape (B, 4) with the same meaning as in LiarsBarEdiEnv.step, [0, 0, 0, 0]
+        being a challenge.
+
+        Returns the observations after the step (games that ended are already reset),
+        the reward of each acting player, the done flags and an info dict with
+        "player_rewards" of shape (B, P): every reward given in this step, including
+        the punishment of a previous player that was caught lying.
+        """
+        actions = np.asarray(actions)
+        if actions.ndim == 1:
+            actions = action_catalogue.ACTIONS[actions]
+        actions = actions.astype(np.int8, copy=False).reshape(self.num_envs, self.NUMBER_OF_RANKS)
+        games = self._env_index
+        current = self.current_player.astype(np.intp)
+        hands = self.hands[games, current]
+        cards_played = actions.sum(axis=1)
+        challenge = cards_played == 0
+        play = ~challenge
+
+        if np.any(challenge & (self.previous_player < 0)):
+            raise ValueError("No previous player to challenge")
+        if np.any(play & (self.finished_players == self.num_players - 1)):
+            raise ValueError("You are the last player, you have to challenge")
+        if np.any(actions < 0) or np.any(play[:, None] & (hands < actions)):
+            raise ValueError("Player doesn't have all those cards")
+        if np.any(cards_played > 3):
+            raise ValueError("Too many cards played")
+
+        player_rewards = np.zeros((self.num_envs, self.num_players), dtype=np.float32)
+
+        # Challenge: a lie is any played card that is neither a joker nor the table card
+        ranks = np.arange(1, self.NUMBER_OF_RANKS)
+        not_table_card = ranks[None, :] != self.table_card[:, None]
+        lied = np.any((self.previous_action[:, 1:] > 0) & not_table_card, axis=1)
+        caught = challenge & lied
+        wrong = challenge & ~lied
+        previous = self.previous_player.astype(np.intp)
+        player_rewards[games[caught], previous[caught]] += LiarsBarEdiEnv.LOSS_REWARD
+        player_rewards[games[caught], current[caught]] += LiarsBarEdiEnv.CORRECT_CHALLENGE_REWARD
+        player_rewards[games[wrong], current[wrong]] += LiarsBarEdiEnv.LOSS_REWARD
+
+        # Play
+        played = games[play]
+        player_rewards[played, current[play]] += cards_played[play] * LiarsBarEdiEnv.CARD_PLACED_REWARD
+        self.history[played, self.history_length[play]] = cards_played[play]
+        self.history_length[play] += 1
+        self.hands[played, current[play]] -= actions[play]
+        emptied = play & (self.hands[games, current].sum(axis=1) == 0)
+        self.finished_players[emptied] += 1
+
+        rewards = player_rewards[games, current]
+
+        self.previous_player[:] = current
+        self.previous_action[:] = actions
+        self.current_player[:] = self._next_players(current)
+
+        self._reset_games(games[challenge])
+
+        return self.get_obs(), rewards, challenge, {"player_rewards": player_rewards}
+
+    def _next_players(self, current: np.ndarray) -> np.ndarray:
+        """Next player with cards in hand, going around the table like LiarsBarEdiEnv.step."""
+        order = (current[:, None] + np.arange(1, self.num_players + 1)) % self.num_players
+        has_cards = self.hands.sum(axis=2)[self._env_index[:, None], order] > 0
+        return order[self._env_index, np.argmax(has_cards, axis=1)]
+
+    def load_state(self, index: int, env: LiarsBarEdiEnv):
+        """Copy the round currently played in a LiarsBarEdiEnv into game `index`."""
+        if env._num_players != self.num_players:
+            raise ValueError("The env has a different number of players")
+
+        self.hands[index] = [player["hand"] for player in env._players]
+        self.history[index] = 0
+        self.history[index, :len(env._history)] = env._history
+        self.history_length[index] = len(env._history)
+        self.table_card[index] = env._table_card
+        self.current_player[index] = env._current_player_index
+        if env._previous_player_index is None:
+            self.previous_player[index] = -1
+            self.previous_action[index] = 0
+        else:
+            self.previous_player[index] = env._previous_player_index
+            self.previous_action[index] = env._previous_action
+        self.finished_players[index] = env._number_of_finished_players
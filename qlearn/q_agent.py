@@ -1,62 +1,102 @@
-from xmlrpc.client import MININT
 import numpy as np
-import random
-from collections import defaultdict
-import gymnasium as gym
+from typing import TYPE_CHECKING, Optional
+
+from monte_carlo import actions
+from monte_carlo.checkpoint import load_q_table, save_q_table
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
+from monte_carlo.q_table import QTable, UNKNOWN_ACTION_VALUE
+from monte_carlo.symmetry import action_from_canonical_id, canonicalize, from_canonical_probabilities, to_canonical_action
+
+if TYPE_CHECKING:
+    import gymnasium as gym
 
 class QLearningAgent:
-    def __init__(self, env: gym.Env, learning_rate: float = 0.1, discount_factor: float = 0.9, exploration_rate: float = 1.0, exploration_decay: float = 0.99):
+    def __init__(self, env: "gym.Env", learning_rate: float = 0.1, discount_factor: float = 0.9, exploration_rate: float = 1.0, exploration_decay: float = 0.99, rng: Optional[np.random.Generator] = None,
+                 history_encoding: Optional[HistoryEncoding] = None, canonical_ranks: bool = False):
         self.env = env
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
         self.exploration_decay = exploration_decay
+        self.rng = np.random.default_rng(rng)
+        self.history_encoding = as_history_encoding(history_encoding)
+        # Learn on observations relabeled to one table card, see monte_carlo.symmetry
+        self.canonical_ranks = canonical_ranks
 
         # Initialize Q-table
-        self.q_table = defaultdict(lambda: {})
+        self.q_table = QTable()
 
     def choose_action(self, state):
-        available_actions = self.env._get_available_actions()
-        if random.random() < self.exploration_rate:
-            return random.choice(available_actions)
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        available_actions = self.env.get_action_mask() if table_card is None else actions.state_action_mask(state)
+        if self.rng.random() < self.exploration_rate:
+            return action_from_canonical_id(actions.random_action_id(np.flatnonzero(available_actions), self.rng), table_card)
         else:
-            state_key = self._state_to_key(state)
-            return max(available_actions, key=lambda action: self.q_table[state_key].get(tuple(action), 0.0))
+            state_id = self.q_table.add(self._state_to_key(state))
+            return action_from_canonical_id(self.q_table.best_action(state_id, available_actions), table_card)
 
 
     def learn(self, state, action, reward, next_state, done):
         """Update Q-table based on the action taken and reward received."""
-        state_key = self._state_to_key(state)
-        next_state_key = self._state_to_key(next_state)
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        next_state, _ = canonicalize(next_state, self.canonical_ranks)
+        state_id = self.q_table.add(self._state_to_key(state))
+        next_state_id = self.q_table.add(self._state_to_key(next_state))
+
+        action_id = to_canonical_action(actions.action_id(action), table_card)
 
-        action_key = tuple(action)
-        
         # Initialize Q-values for the state-action pair if not already done
-        if action_key not in self.q_table[state_key]:
-            self.q_table[state_key][action_key] = 0.0
+        self.q_table.touch(state_id, action_id)
 
         # Compute TD target and update rule
-        best_next_action = max(self.q_table[next_state_key], key=self.q_table[next_state_key].get, default=None)
-        td_target = reward + (self.discount_factor * self.q_table[next_state_key].get(best_next_action, 0.0) * (not done))
-        self.q_table[state_key][action_key] += self.learning_rate * (td_target - self.q_table[state_key][action_key])
+        best_next_value = self.q_table.max_value(next_state_id, default=0.0)
+        td_target = reward + (self.discount_factor * best_next_value * (not done))
+        current = self.q_table.get(state_id, action_id)
+        self.q_table.set(state_id, action_id, current + self.learning_rate * (td_target - current))
 
         if done:
             self.exploration_rate *= self.exploration_decay
 
     def _state_to_key(self, state):
-        """Convert state dictionary to a tuple key for Q-table."""
-        hand_key = tuple(state["hand"])
-        table_card_key = state["table_card"]
-        history_key = tuple(state["history"])
-        return (hand_key, table_card_key, history_key)
+        """Convert state dictionary to an integer key for the Q-table."""
+        return self.history_encoding.state_key(state)
 
     def act(self, state):
-        state_key = self._state_to_key(state)
-
-        available_actions = self.env.get_available_actions(state)
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        state_id = self.q_table.lookup(self._state_to_key(state))
 
-        if state_key not in self.q_table:
-            return random.choice(available_actions)
+        if state_id < 0:
+            return action_from_canonical_id(actions.random_action_id(actions.state_action_ids(state), self.rng), table_card)
 
         # Exploit learned policy (choose action with highest Q value)
-        return max(available_actions, key=lambda a: self.q_table[state_key].get(tuple(a), MININT))
\ No newline at end of file
+        return action_from_canonical_id(self.q_table.best_action(state_id, actions.state_action_mask(state), UNKNOWN_ACTION_VALUE), table_card)
+
+    def action_probabilities(self, state) -> np.ndarray:
+        """Probability of every action id under act(): uniform over the legal actions of an unseen state."""
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        mask = actions.state_action_mask(state)
+        state_id = self.q_table.lookup(self._state_to_key(state))
+        if state_id < 0:
+            return from_canonical_probabilities(mask / mask.sum(), table_card)
+        probabilities = np.zeros(actions.NUM_ACTIONS)
+        probabilities[self.q_table.best_action(state_id, mask, UNKNOWN_ACTION_VALUE)] = 1
+        return from_canonical_probabilities(probabilities, table_card)
+
+    def save(self, path):
+        """Write a checkpoint, see monte_carlo.checkpoint."""
+        save_q_table(self.q_table, path, type(self).__name__, {
+            "learning_rate": self.learning_rate,
+            "discount_factor": self.discount_factor,
+            "exploration_rate": self.exploration_rate,
+            "exploration_decay": self.exploration_decay,
+            "history_encoding": self.history_encoding.params(),
+            "canonical_ranks": self.canonical_ranks,
+        })
+
+    @classmethod
+    def load(cls, path, env: "gym.Env" = None, mmap: bool = False):
+        """Agent of a checkpoint; with mmap its Q-table stays on disk and is read-only."""
+        table, meta = load_q_table(path, mmap)
+        agent = cls(env, **meta["params"])
+        agent.q_table = table
+        return agent
@@ -1,8 +1,9 @@
+from collections.abc import Mapping
 from enum import Enum
 import gymnasium as gym
 from gymnasium import spaces
-from typing import List, Tuple, Dict
-import random
+from typing import List, Tuple, Optional
+import numpy as np
 from itertools import combinations
 
 class Card(Enum):
@@ -11,6 +12,31 @@ class Card(Enum):
     K = 2
     A = 3
 
+class QLearningObservation(Mapping):
+    """Hand, table card and cards last played, read like the observation dicts it replaces."""
+    __slots__ = ("hand", "table_card", "last_played")
+    FIELDS = ("hand", "table_card", "last_played")
+
+    def __init__(self, hand: Tuple[int, ...], table_card: Card, last_played: int):
+        self.hand = hand
+        self.table_card = table_card
+        self.last_played = last_played
+
+    def __getitem__(self, name: str):
+        if name in self.FIELDS:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 class QLearningEnv(gym.Env):
     metadata = {"render.modes": ["human"]}
 
@@ -22,8 +48,10 @@ class QLearningEnv(gym.Env):
     NUMBER_OF_DISTINCT_RANKS = 4
     EMPTY_HAND = [0, 0, 0, 0]
 
-    def __init__(self, num_players: int = 2):
+    def __init__(self, num_players: int = 2, rng: Optional[np.random.Generator] = None):
         super(QLearningEnv, self).__init__()
+        if rng is not None:
+            self.np_random = rng
 
         self.num_players = num_players
         self.players = []
@@ -55,7 +83,7 @@ class QLearningEnv(gym.Env):
         return self._get_observation(), {}
     
     def reset_round(self):
-        self.table_card = random.choice(self.TABLE_CARDS)
+        self.table_card = self.TABLE_CARDS[int(self.np_random.integers(len(self.TABLE_CARDS)))]
         self.last_played_cards = []
         self.player_turn = self.previous_player_index if self.previous_player_index is not None else 0
         if self.alive_players[self.player_turn] == False:
@@ -71,18 +99,14 @@ class QLearningEnv(gym.Env):
     def _deal_cards(self):
         for i, player in enumerate(self.players):
             if self.alive_players[i]:
-                self._players[i]["hand"] = [0 for _ in range(4)]
+                self.players[i]["hand"] = [0 for _ in range(4)]
                 for _ in range(5):
-                    self._players[i]["hand"][self.deck.pop()] += 1
-
-    def _get_observation(self) -> Dict:
-        current_player_hand = self.players[self.player_turn]["hand"]
+                    self.players[i]["hand"][self.deck.pop().value] += 1
 
-        return {
-            "hand": current_player_hand,
-            "table_card": self.table_card,
-            "last_played": sum(self.last_played_cards)
-        }
+    def _get_observation(self) -> QLearningObservation:
+        # The hand is a snapshot, the player's list changes with the next play
+        return QLearningObservation(tuple(self.players[self.player_turn]["hand"]), self.table_card,
+                                    sum(self.last_played_cards))
 
     def step(self, action: int):
         current_player = self.players[self.player_turn]
@@ -143,7 +167,7 @@ class QLearningEnv(gym.Env):
         for i, player in enumerate(self.players):
             if not self.alive_players[i]:
                 continue
-            print(f"Player {player["id"]} {player['bullets_shot']}/{player['death_bullet']}", end=" ")
+            print(f"Player {player['id']} {player['bullets_shot']}/{player['death_bullet']}", end=" ")
             for j in range(self.INITIAL_HAND_SIZE):
                 print(player["hand"][j], end= " ")
             print()
@@ -152,13 +176,13 @@ class QLearningEnv(gym.Env):
         return {
             "id": player_id,
             "hand": [],
-            "death_bullet": random.randint(self.MIN_DEATH_BULLET, self.MAX_DEATH_BULLET),
+            "death_bullet": int(self.np_random.integers(self.MIN_DEATH_BULLET, self.MAX_DEATH_BULLET + 1)),
             "bullets_shot": 0
         }
 
     def _initialize_deck(self):
         cards = [Card.Q] * 6 + [Card.K] * 6 + [Card.A] * 6 + [Card.Joker] * 2
-        random.shuffle(cards)
+        self.np_random.shuffle(cards)
         return cards
 
     
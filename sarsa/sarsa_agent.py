@@ -1,56 +1,72 @@
-import random
-from typing import Dict
+from typing import TYPE_CHECKING, Optional
 
-from monte_carlo.mc_env import LiarsBarEdiEnv
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.batch_updates import dependency_levels
+from monte_carlo.checkpoint import load_q_table, save_q_table
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
+from monte_carlo.q_table import QTable
+from monte_carlo.symmetry import action_from_canonical_id, canonical_episode, canonicalize
+
+if TYPE_CHECKING:
+    # Only the trainer needs the environment (and gymnasium)
+    from monte_carlo.mc_env import LiarsBarEdiEnv
 
 
 class SarsaAgent:
     def __init__(
             self,
-            env: LiarsBarEdiEnv,
+            env: "LiarsBarEdiEnv",
             epsilon: float = 0.1,
             gamma: float = 0.9,
-            alpha: float = 0.1
+            alpha: float = 0.1,
+            rng: Optional[np.random.Generator] = None,
+            history_encoding: Optional[HistoryEncoding] = None,
+            canonical_ranks: bool = False
     ):
         """
         SARSA Agent:
         - epsilon: rata de explorare
         - gamma: factor de discount
         - alpha: rata de învățare
+        - rng: generatorul folosit pentru explorare
+        - history_encoding: ce parte din istoric intră în cheia stării (monte_carlo.history_encoding)
+        - canonical_ranks: stările sunt reetichetate astfel încât cartea de pe masă e mereu aceeași (monte_carlo.symmetry)
         """
         self.name = "SARSAAgent"
         self.env = env
         self.epsilon = epsilon
         self.gamma = gamma
         self.alpha = alpha
+        self.rng = np.random.default_rng(rng)
+        self.history_encoding = as_history_encoding(history_encoding)
+        self.canonical_ranks = canonical_ranks
 
-        self.Q: Dict = {}
+        self.Q = QTable()
 
     def _get_state_key(self, state):
         """Generates a key for the state."""
-        return (
-            tuple(state["hand"]),
-            state["table_card"],
-            tuple(state["history"])
-        )
+        return self.history_encoding.state_key(state)
 
-    def _init_state_if_needed(self, state_key, state):
-        if state_key not in self.Q:
-            available_actions = LiarsBarEdiEnv.get_available_actions(state)
-            self.Q[state_key] = {tuple(a): 0.0 for a in available_actions}
+    def _init_state_if_needed(self, state_key, state) -> int:
+        state_id = self.Q.lookup(state_key)
+        if state_id < 0:
+            state_id = self.Q.add(state_key, actions.state_action_mask(state))
+        return state_id
 
     def choose_action(self, state):
-        state_key = self._get_state_key(state)
-        self._init_state_if_needed(state_key, state)
-
-        if random.random() < self.epsilon:
-            action = random.choice(list(self.Q[state_key].keys()))
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        state_id = self._init_state_if_needed(self._get_state_key(state), state)
+        # With a lossy history encoding the key may have been created by a state with other legal actions
+        legal_mask = actions.state_action_mask(state)
+
+        if self.rng.random() < self.epsilon:
+            candidates = np.flatnonzero(self.Q.mask[state_id] & legal_mask)
+            action = actions.random_action_id(candidates if len(candidates) else np.flatnonzero(legal_mask), self.rng)
         else:
-            action = max(
-                self.Q[state_key],
-                key=lambda a: self.Q[state_key][a]
-            )
-        return list(action)
+            action = self.Q.best_action(state_id, legal_mask)
+        return action_from_canonical_id(action, table_card)
 
     def learn(self, episode):
         """
@@ -61,58 +77,96 @@ class SarsaAgent:
         unde a' e acțiunea real aleasă în starea s' (nu cea optimă).
         """
 
-        if len(episode) == 0:
-            return
-
-        for i in range(len(episode) - 1):
-            current_step = episode[i]
-            next_step = episode[i + 1]
+        states, action_ids = canonical_episode(episode, self.canonical_ranks)
+        self.learn_steps(
+            [self._get_state_key(state) for state in states],
+            action_ids,
+            [step["reward"] for step in episode],
+            [actions.state_action_mask(state) for state in states]
+        )
 
-            s = current_step["state"]
-            a = tuple(current_step["action"])
-            r = current_step["reward"]
+    def learn_steps(self, state_keys, action_ids, rewards, legal_masks):
+        """The same update as learn, on one player's episode given as state keys, action ids, rewards and legal masks."""
+        if len(state_keys) == 0:
+            return
 
-            s_next = next_step["state"]
-            a_next = tuple(next_step["action"])
+        state_ids = [self.Q.add(key, mask) for key, mask in zip(state_keys, legal_masks)]
 
-            s_key = self._get_state_key(s)
-            s_next_key = self._get_state_key(s_next)
+        for i in range(len(state_ids) - 1):
+            s_id = state_ids[i]
+            a = action_ids[i]
+            r = rewards[i]
 
-            self._init_state_if_needed(s_key, s)
-            self._init_state_if_needed(s_next_key, s)
+            s_next_id = state_ids[i + 1]
+            a_next = action_ids[i + 1]
 
             # SARSA update
-            td_target = r + self.gamma * self.Q[s_next_key][a_next]
-            td_error = td_target - self.Q[s_key][a]
-            self.Q[s_key][a] += self.alpha * td_error
+            td_target = r + self.gamma * self.Q.get(s_next_id, a_next)
+            td_error = td_target - self.Q.get(s_id, a)
+            self.Q.set(s_id, a, self.Q.get(s_id, a) + self.alpha * td_error)
 
         # Ultimul pas din episod (dacă e terminal, nu mai are s'+a')
-        last_step = episode[-1]
-        s = last_step["state"]
-        a = tuple(last_step["action"])
-        r = last_step["reward"]
-        s_key = self._get_state_key(s)
+        s_id = state_ids[-1]
+        a = action_ids[-1]
+        r = rewards[-1]
+        self.Q.set(s_id, a, self.Q.get(s_id, a) + self.alpha * (r - self.Q.get(s_id, a)))
 
-        self._init_state_if_needed(s_key, s)
-        self.Q[s_key][a] += self.alpha * (r - self.Q[s_key][a])
+    def learn_batch(self, state_keys, action_ids, rewards, segments, legal_masks):
+        """
+        learn_steps on every trajectory of a batch, with vectorized updates: the steps are flat
+        arrays and segments the offsets where the trajectories start, plus the total length
+        (see monte_carlo.parallel.collect_episodes). The Q-table ends up the same as with the loop.
+        """
+        segments = np.asarray(segments, dtype=np.int64)
+        if len(segments) < 2 or segments[-1] == 0:
+            return
 
-    def act(self, state):
-        state_key = self._get_state_key(state)
-        self._init_state_if_needed(state_key, state)
+        state_ids = self.Q.add_many(state_keys, legal_masks)
+        pairs = state_ids * self.Q.n_actions + np.asarray(action_ids, dtype=np.int64)
+        # Q(s', a') of the next step, none after the last step of a trajectory
+        next_pairs = np.append(pairs[1:], -1)
+        next_pairs[segments[1:] - 1] = -1
+        rewards = np.asarray(rewards, dtype=np.float64)
+
+        values = self.Q.values.reshape(-1)
+        for rows in dependency_levels(pairs, next_pairs):
+            pair = pairs[rows]
+            following = next_pairs[rows]
+            next_values = np.where(following >= 0, values[np.maximum(following, 0)], 0).astype(np.float64)
+            q = values[pair].astype(np.float64)
+            values[pair] = q + self.alpha * (rewards[rows] + self.gamma * next_values - q)
+        self.Q.mask.reshape(-1)[pairs] = True
 
-        best_action = max(
-            self.Q[state_key],
-            key=lambda a: self.Q[state_key][a]
-        )
-        return list(best_action)
+    def act(self, state):
+        state, table_card = canonicalize(state, self.canonical_ranks)
+        state_id = self.Q.lookup(self._get_state_key(state))
+        if state_id < 0:
+            # An unseen state would start with every legal action at 0, so the first one is the best
+            return action_from_canonical_id(actions.state_action_ids(state)[0], table_card)
+        return action_from_canonical_id(self.Q.best_action(state_id, actions.state_action_mask(state)), table_card)
+
+    def save(self, path):
+        """Write a checkpoint, see monte_carlo.checkpoint."""
+        save_q_table(self.Q, path, type(self).__name__, {"epsilon": self.epsilon, "gamma": self.gamma, "alpha": self.alpha,
+                                                           "history_encoding": self.history_encoding.params(),
+                                                           "canonical_ranks": self.canonical_ranks})
+
+    @classmethod
+    def load(cls, path, env: "LiarsBarEdiEnv" = None, mmap: bool = False):
+        """Agent of a checkpoint; with mmap its Q-table stays on disk and is read-only."""
+        table, meta = load_q_table(path, mmap)
+        agent = cls(env, **meta["params"])
+        agent.Q = table
+        return agent
 
 
 class SarsaTrainer:
-    def __init__(self, env: LiarsBarEdiEnv, agent: SarsaAgent):
+    def __init__(self, env: "LiarsBarEdiEnv", agent: SarsaAgent):
         self.env = env
         self.agent = agent
 
-    def train(self, episodes = 100):
+    def train(self, episodes = 100, recorder = None):
+        """recorder, a monte_carlo.trajectory_store.TrajectoryWriter, also stores every episode."""
         for episode_number in range(episodes):
             self.env.reset()
 
@@ -127,5 +181,17 @@ class SarsaTrainer:
             episode = self.env.get_player_reward_history()
             for i in range(4):
                 self.agent.learn(episode[i])
+            if recorder is not None:
+                recorder.add_episode(episode)
 
             print(f"Finished episode {episode_number}")
+
+    def train_parallel(self, episodes = 100, workers = 4, sync_every = 1000, seed = None):
+        """Collect the episodes in `workers` processes, see monte_carlo.parallel.train_parallel."""
+        from monte_carlo.parallel import train_parallel
+        train_parallel(self.agent, episodes, self.env._num_players, workers, sync_every, seed)
+
+    def train_from_store(self, path, batch_size = 65536):
+        """Learn from the episodes of a trajectory store instead of playing them."""
+        from monte_carlo.trajectory_store import TrajectoryStore, learn_from_store
+        learn_from_store(self.agent, TrajectoryStore(path), batch_size)
@@ -0,0 +1,129 @@
+"""
+Probability that the previous play of a LiarsBarEdiEnv round was a lie, from one observation.
+
+The observation only shows the current hand, the table card and the sizes of the plays,
+so every card outside the hand (dealt to the others, played face down or never dealt)
+is unseen. Two models of the previous player are supported:
+
+- "uniform": the cards they played are a uniformly random subset of their hand,
+  which makes them a uniform sample of the unseen cards:
+  P(honest) = C(good, k) / C(unseen, k)
+- "honest": they play table cards and jokers whenever they have k of them, and only lie
+  when forced; with their hand a uniform sample of m unseen cards:
+  P(lie) = P(Hypergeometric(unseen, good, m) < k)
+
+where k is the size of the previous play, good the unseen jokers and table cards, and m the
+size of the previous player's hand before the play, found by replaying the turn order
+(players without cards are skipped) over the history. Both are exact under their model.
+Results are cached in an LRU cache keyed by the integer state key (monte_carlo.state_index).
+"""
+from functools import lru_cache
+from math import comb
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.state_index import pack_state, state_key, unpack_state_key
+
+DECK_COUNTS = (2, 6, 6, 6)
+HAND_SIZE = 5
+MODELS = ("uniform", "honest")
+
+
+def play_seats(history: Sequence[int], num_players: int) -> Tuple[List[int], List[int]]:
+    """Seat (0 = first to play) of every play in history, and the cards every seat has left."""
+    cards_left = [HAND_SIZE] * num_players
+    seats = []
+    seat = 0
+    for cards in history:
+        seats.append(seat)
+        cards_left[seat] -= cards
+        if sum(cards_left) == 0:
+            break
+        seat = (seat + 1) % num_players
+        while cards_left[seat] == 0:
+            seat = (seat + 1) % num_players
+    return seats, cards_left
+
+
+def previous_hand_size(history: Sequence[int], num_players: int) -> int:
+    """Cards the previous player held before their last play."""
+    seats, cards_left = play_seats(history, num_players)
+    return cards_left[seats[-1]] + history[-1]
+
+
+@lru_cache(maxsize=None)
+def _lie_probability(unseen: int, good: int, cards: int, hand_size: int, model: str) -> float:
+    if model == "uniform":
+        return 1.0 - comb(good, cards) / comb(unseen, cards)
+    # Hypergeometric probability that fewer than `cards` of the hand are good
+    total = comb(unseen, hand_size)
+    return sum(comb(good, g) * comb(unseen - good, hand_size - g) for g in range(cards)) / total
+
+
+def unseen_counts(hand: Sequence[int]) -> Tuple[int, ...]:
+    return tuple(DECK_COUNTS[rank] - hand[rank] for rank in range(actions.NUMBER_OF_RANKS))
+
+
+@lru_cache(maxsize=65536)
+def _cached_lie_probability(key: int, num_players: int, model: str) -> float:
+    hand, table_card, history = unpack_state_key(key)
+    if not history:
+        return 0.0
+    unseen = unseen_counts(hand)
+    good = unseen[0] + unseen[table_card]
+    return _lie_probability(sum(unseen), good, history[-1], previous_hand_size(history, num_players), model)
+
+
+def lie_probability(state: Dict, model: str = "uniform") -> float:
+    """Probability that the last play of the observation was a lie, 0 when nothing was played yet."""
+    if model not in MODELS:
+        raise ValueError(f"Unknown model: {model}")
+    return _cached_lie_probability(state_key(state), state.get("num_players", 4), model)
+
+
+def lie_probabilities(observations: Dict, model: str = "uniform") -> np.ndarray:
+    """(B,) lie_probability of the batched observations of LiarsBarVecEnv.get_obs."""
+    if model not in MODELS:
+        raise ValueError(f"Unknown model: {model}")
+    num_players = observations["num_players"]
+    rows = zip(observations["hand"].tolist(), observations["table_card"].tolist(),
+               observations["history"].tolist(), observations["history_length"].tolist())
+    return np.array([
+        _cached_lie_probability(pack_state(hand, table_card, history[:length]), num_players, model)
+        for hand, table_card, history, length in rows
+    ], dtype=np.float32)
+
+
+def honest_play(hand: Sequence[int], table_card: int) -> List[int]:
+    """Up to 3 table cards, then jokers; a single card of another rank when there is none (the smallest lie)."""
+    action = [0, 0, 0, 0]
+    action[table_card] = min(hand[table_card], actions.MAX_CARDS_PER_TURN)
+    action[0] = min(hand[0], actions.MAX_CARDS_PER_TURN - action[table_card])
+    if sum(action) == 0:
+        action[next(rank for rank in range(1, actions.NUMBER_OF_RANKS) if hand[rank] > 0)] = 1
+    return action
+
+
+class BluffOracleAgent:
+    """
+    Baseline agent: challenges when the previous play is a lie with probability above
+    threshold (under the given model), otherwise plays honest_play.
+    """
+
+    def __init__(self, threshold: float = 0.5, model: str = "uniform"):
+        if model not in MODELS:
+            raise ValueError(f"Unknown model: {model}")
+        self.name = "BluffOracleAgent"
+        self.threshold = threshold
+        self.model = model
+
+    def act(self, state: Dict) -> List[int]:
+        challenge = actions.can_challenge(state)
+        if not actions.can_play(state) or (challenge and lie_probability(state, self.model) > self.threshold):
+            return list(actions.CHALLENGE_ACTION)
+        return honest_play(state["hand"], state["table_card"])
+
+    def choose_action(self, state: Dict) -> List[int]:
+        return self.act(state)
@@ -0,0 +1,318 @@
+"""
+Equilibrium of a 2-player round (the endgame of a LiarsBarGame), solved on the enumerated game.
+
+The round is enumerated as a DAG instead of a tree: a node is the actor's hand, the
+opponent's hand, the table card, the history of play sizes and whether the last play
+was a lie, packed into one int. Every deal and line of play reaching the same node
+shares its subtree, which leaves about 82k nodes and 6k information sets.
+
+Information sets are the observations an agent gets (hand, table card and history,
+keyed by monte_carlo.state_index.state_key), so the solved policy is a plain lookup
+table for act(state). An observation does not say which ranks the player played before,
+so these are imperfect-recall information sets: CFR has no convergence guarantee on them,
+but converges well in practice.
+
+The round is zero-sum, +1 for the player that does not lose the challenge and -1 for
+the one that does; the per-card rewards of LiarsBarEdiEnv are ignored. It is solved with
+CFR+ (regret matching+, linearly weighted average policy) on the levels of the DAG:
+reach probabilities go forward from the deals, values are computed by retrograde
+analysis from the deepest level back to the deals, every step vectorized over a level.
+
+    python -m solver.endgame checkpoints/endgame --iterations 1000
+"""
+import argparse
+import itertools
+import time
+from math import comb
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.q_table import QTable
+from monte_carlo.state_index import NUMBER_OF_TABLE_CARDS
+from solver.bluff_oracle import DECK_COUNTS, HAND_SIZE
+from solver.policy import PolicyAgent
+
+NUM_PLAYERS = 2
+TABLE_CARDS = (1, 2, 3)
+
+# Hand code removed by every action id, and whether the action is a lie for every table card
+ACTION_CODES = actions.encode_hands(actions.ACTIONS.astype(np.int64))
+LIES = np.zeros((NUMBER_OF_TABLE_CARDS, actions.NUM_ACTIONS), dtype=np.int64)
+for _table_card in TABLE_CARDS:
+    LIES[_table_card] = actions.ACTION_SIZES > actions.ACTIONS[:, 0] + actions.ACTIONS[:, _table_card]
+
+
+def deal_probabilities() -> Dict[tuple, float]:
+    """Probability of every (first player's hand, second player's hand) of a 2-player deal."""
+    hands = [hand for hand in itertools.product(*(range(min(count, HAND_SIZE) + 1) for count in DECK_COUNTS)) if sum(hand) == HAND_SIZE]
+    deck_size = sum(DECK_COUNTS)
+    deals = comb(deck_size, HAND_SIZE) * comb(deck_size - HAND_SIZE, HAND_SIZE)
+    probabilities = {}
+    for first, second in itertools.product(hands, hands):
+        ways = 1
+        for count, a, b in zip(DECK_COUNTS, first, second):
+            ways *= comb(count, a) * comb(count - a, b)
+        if ways:
+            probabilities[first, second] = ways / deals
+    return probabilities
+
+
+def _node_keys(hand, opponent, table_card, history, lie):
+    return (((history * NUMBER_OF_TABLE_CARDS + table_card) * actions.NUM_HANDS + hand) * actions.NUM_HANDS + opponent) * 2 + lie
+
+
+class EndgameTree:
+    """
+    The enumerated round: nodes ordered level by level (level = number of plays), the
+    edges leaving them in the same order, the information set of every node and the
+    chance probability of the deals (the nodes of level 0).
+
+    Edges are parallel arrays: parent and child node (-1 for a challenge), action id,
+    value of a challenge for the challenger (0 for plays) and flat index
+    infoset * NUM_ACTIONS + action into (num_infosets, NUM_ACTIONS) policy arrays.
+    """
+
+    def __init__(self):
+        deals = deal_probabilities()
+        hand_codes = {hand: actions.encode_hand(hand) for deal in deals for hand in deal}
+        roots = [(hand_codes[first], hand_codes[second], table_card, probability / len(TABLE_CARDS))
+                 for (first, second), probability in deals.items() for table_card in TABLE_CARDS]
+        hand, opponent, table_card, self.deal_probability = (np.array(column) for column in zip(*roots))
+        history = np.zeros(len(hand), dtype=np.int64)
+        lie = np.zeros(len(hand), dtype=np.int64)
+
+        # Slices of the nodes and of the edges of every level
+        self.levels: List[Tuple[slice, slice]] = []
+        node_infosets, edges = [], []
+        start = edge_start = 0
+        while len(hand):
+            node_infosets.append((history * NUMBER_OF_TABLE_CARDS + table_card) * actions.NUM_HANDS + hand)
+            next_start = start + len(hand)
+            nodes = np.arange(start, next_start)
+            challenge = start > 0
+            legal = actions.LEGAL_MASKS[int(challenge), (opponent > 0).astype(np.intp), hand]
+
+            level_edges, children = [], []
+            if challenge:
+                level_edges.append((nodes, np.zeros(len(nodes), dtype=np.int64), np.full(len(nodes), -1), np.where(lie, 1.0, -1.0)))
+            for action in range(1, actions.NUM_ACTIONS):
+                playing = np.flatnonzero(legal[:, action])
+                level_edges.append((nodes[playing], np.full(len(playing), action), None, np.zeros(len(playing))))
+                children.append(_node_keys(
+                    opponent[playing], hand[playing] - ACTION_CODES[action], table_card[playing],
+                    history[playing] * 3 + actions.ACTION_SIZES[action], LIES[table_card[playing], action]))
+            child_keys, child_index = np.unique(np.concatenate(children), return_inverse=True)
+            child_index = iter(np.split(child_index + next_start, np.cumsum([len(keys) for keys in children])[:-1]))
+            level_edges = [(parent, action, next(child_index) if child is None else child, terminal)
+                           for parent, action, child, terminal in level_edges]
+            edges.extend(level_edges)
+
+            edge_stop = edge_start + sum(len(parent) for parent, _, _, _ in level_edges)
+            self.levels.append((slice(start, next_start), slice(edge_start, edge_stop)))
+
+            rest, lie = np.divmod(child_keys, 2)
+            rest, opponent = np.divmod(rest, actions.NUM_HANDS)
+            rest, hand = np.divmod(rest, actions.NUM_HANDS)
+            history, table_card = np.divmod(rest, NUMBER_OF_TABLE_CARDS)
+            start, edge_start = next_start, edge_stop
+
+        self.num_nodes = start
+        self.parent, self.action, self.child, self.terminal = (np.concatenate(column) for column in zip(*edges))
+        self.infoset_keys, self.node_infoset = np.unique(np.concatenate(node_infosets), return_inverse=True)
+        self.flat = self.node_infoset[self.parent] * actions.NUM_ACTIONS + self.action
+        self.legal_mask = np.zeros((len(self.infoset_keys), actions.NUM_ACTIONS), dtype=bool)
+        self.legal_mask.ravel()[self.flat] = True
+
+    def __len__(self):
+        return self.num_nodes
+
+    @property
+    def num_infosets(self) -> int:
+        return len(self.infoset_keys)
+
+    def edge_probabilities(self, policy: np.ndarray) -> np.ndarray:
+        return policy.ravel()[self.flat]
+
+    def reach(self, policy: np.ndarray):
+        """
+        Probability of reaching every node times the chance of its deal, split into
+        the part of the player to act (their own actions) and the part of their opponent.
+        """
+        probability = self.edge_probabilities(policy)
+        own = np.zeros(self.num_nodes)
+        opponent = np.zeros(self.num_nodes)
+        own[:len(self.deal_probability)] = self.deal_probability
+        opponent[:len(self.deal_probability)] = self.deal_probability
+        for (nodes, edges), (children, _) in zip(self.levels, self.levels[1:]):
+            played = self.child[edges] >= 0
+            parent, child = self.parent[edges][played], self.child[edges][played] - children.start
+            size = children.stop - children.start
+            # The players alternate, so the actor of the child is the opponent of the parent's actor
+            own[children] = np.bincount(child, weights=opponent[parent], minlength=size)
+            opponent[children] = np.bincount(child, weights=own[parent] * probability[edges][played], minlength=size)
+        return own, opponent
+
+    def backward(self, probability: np.ndarray):
+        """
+        Retrograde pass: value of every node for the player to act and of every edge for the player
+        taking it, from the challenges back to the deals, when actions are taken with the edge probabilities.
+        """
+        values = np.zeros(self.num_nodes)
+        edge_values = self.terminal.copy()
+        for nodes, edges in reversed(self.levels):
+            child = self.child[edges]
+            played = child >= 0
+            level_values = edge_values[edges]
+            level_values[played] = -values[child[played]]
+            edge_values[edges] = level_values
+            values[nodes] = np.bincount(self.parent[edges] - nodes.start, weights=probability[edges] * level_values,
+                                        minlength=nodes.stop - nodes.start)
+        return values, edge_values
+
+    def values(self, policy: np.ndarray) -> np.ndarray:
+        """Value of every node for the player to act when both players follow policy."""
+        return self.backward(self.edge_probabilities(policy))[0]
+
+    def game_value(self, policy: np.ndarray) -> float:
+        """Expected value of the first player to act when both follow policy."""
+        return float(self.deal_probability @ self.values(policy)[:len(self.deal_probability)])
+
+    def first_player_infosets(self) -> np.ndarray:
+        """(num_infosets,) True for the infosets of the player that starts: the players alternate, so even levels."""
+        first = np.zeros(self.num_nodes, dtype=bool)
+        for nodes, _ in self.levels[::2]:
+            first[nodes] = True
+        return np.bincount(self.node_infoset, weights=first, minlength=self.num_infosets) > 0
+
+    def best_response(self, policy: np.ndarray, first: bool) -> Tuple[np.ndarray, float]:
+        """
+        Best response of the first (or second) player to an opponent following policy, and its value.
+
+        Going back from the challenges, every infoset of the responder takes the action with the
+        highest value summed over its nodes, weighted by the chance and opponent reach of each node.
+        The infosets are observations, which forget the ranks the responder played, so
+        this is exact among the policies of the observation that ignore their own earlier actions;
+        the value returned is the exact value of the response, a lower bound otherwise.
+        """
+        probability = self.edge_probabilities(policy)
+        _, opponent = self.reach(policy)
+        response = np.array(policy, dtype=float)
+        values = np.zeros(self.num_nodes)
+        edge_values = self.terminal.copy()
+        for depth, (nodes, edges) in reversed(list(enumerate(self.levels))):
+            child = self.child[edges]
+            played = child >= 0
+            level_values = edge_values[edges]
+            level_values[played] = -values[child[played]]
+            edge_values[edges] = level_values
+
+            parent = self.parent[edges]
+            level_probability = probability[edges]
+            if (depth % 2 == 0) == first:
+                totals = np.bincount(self.flat[edges], weights=opponent[parent] * level_values, minlength=policy.size)
+                totals = np.where(self.legal_mask.ravel(), totals, -np.inf).reshape(policy.shape)
+                infosets = np.unique(self.node_infoset[nodes])
+                response[infosets] = 0
+                response[infosets, np.argmax(totals[infosets], axis=1)] = 1
+                level_probability = response.ravel()[self.flat[edges]]
+            values[nodes] = np.bincount(parent - nodes.start, weights=level_probability * level_values,
+                                        minlength=nodes.stop - nodes.start)
+
+        value = float(self.deal_probability @ values[:len(self.deal_probability)])
+        return response, value if first else -value
+
+    def exploitability(self, policy: np.ndarray) -> float:
+        """
+        Average over the two seats of what a best response wins against policy: 0 for an
+        equilibrium, at most 1 (the game value cancels out since the seats are swapped).
+        """
+        return (self.best_response(policy, True)[1] + self.best_response(policy, False)[1]) / 2
+
+    def policy_from_table(self, table: QTable) -> np.ndarray:
+        """
+        Policy array of a table of action probabilities keyed by state_key (as saved by
+        the solvers); infosets without an entry play uniformly among their legal actions.
+        """
+        policy = self.legal_mask / self.legal_mask.sum(axis=1, keepdims=True)
+        ids = np.array([table.lookup(int(key)) for key in self.infoset_keys])
+        found = ids >= 0
+        rows = np.where(self.legal_mask[found], table.values[ids[found]], 0)
+        totals = rows.sum(axis=1, keepdims=True)
+        policy[found] = np.where(totals > 0, rows / np.where(totals > 0, totals, 1), policy[found])
+        return policy
+
+
+class EndgameSolver:
+    """CFR+ on an EndgameTree; policies are (num_infosets, NUM_ACTIONS) arrays of action probabilities."""
+
+    def __init__(self, tree: Optional[EndgameTree] = None):
+        self.tree = EndgameTree() if tree is None else tree
+        self.iterations = 0
+        self.regrets = np.zeros(self.tree.legal_mask.shape)
+        self.policy_sum = np.zeros(self.tree.legal_mask.shape)
+        self._uniform = self.tree.legal_mask / self.tree.legal_mask.sum(axis=1, keepdims=True)
+
+    def current_policy(self) -> np.ndarray:
+        """Regret matching: probabilities proportional to the positive regrets, uniform when there are none."""
+        totals = self.regrets.sum(axis=1, keepdims=True)
+        return np.where(totals > 0, self.regrets / np.where(totals > 0, totals, 1), self._uniform)
+
+    def average_policy(self) -> np.ndarray:
+        totals = self.policy_sum.sum(axis=1, keepdims=True)
+        return np.where(totals > 0, self.policy_sum / np.where(totals > 0, totals, 1), self._uniform)
+
+    def iterate(self, iterations: int = 1):
+        tree = self.tree
+        for _ in range(iterations):
+            self.iterations += 1
+            policy = self.current_policy()
+            probability = tree.edge_probabilities(policy)
+            own, opponent = tree.reach(policy)
+            values, edge_values = tree.backward(probability)
+
+            # Counterfactual regrets weigh by the opponent's reach, the average policy by the player's own
+            regrets = np.bincount(tree.flat, weights=opponent[tree.parent] * (edge_values - values[tree.parent]), minlength=self.regrets.size)
+            policy_sum = np.bincount(tree.flat, weights=own[tree.parent] * probability, minlength=self.policy_sum.size)
+
+            # CFR+: regrets are kept non-negative (they only exist for legal actions), later iterations weigh more
+            np.maximum(self.regrets + regrets.reshape(self.regrets.shape), 0, out=self.regrets)
+            self.policy_sum += self.iterations * policy_sum.reshape(self.policy_sum.shape)
+
+    def policy_table(self) -> QTable:
+        """The average policy as a QTable: row of state_key(observation), action probabilities as values."""
+        return QTable.from_arrays(self.tree.infoset_keys, self.average_policy().astype(np.float32), self.tree.legal_mask)
+
+
+class EndgameAgent(PolicyAgent):
+    """PolicyAgent of the solved 2-player round."""
+
+    def __init__(self, policy: QTable, num_players: int = NUM_PLAYERS, fallback=None):
+        super().__init__(policy, num_players, fallback)
+
+
+def solve(iterations: int = 1000, tree: Optional[EndgameTree] = None) -> EndgameAgent:
+    solver = EndgameSolver(tree)
+    solver.iterate(iterations)
+    return EndgameAgent(solver.policy_table())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the 2-player round with CFR+ and save the policy")
+    parser.add_argument("path", help="checkpoint directory of the policy")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    tree = EndgameTree()
+    print(f"{len(tree)} nodes, {tree.num_infosets} information sets ({time.perf_counter() - start:.1f}s)")
+    solver = EndgameSolver(tree)
+    solver.iterate(args.iterations)
+    print(f"{args.iterations} iterations ({time.perf_counter() - start:.1f}s), "
+          f"value of the first player: {tree.game_value(solver.average_policy()):+.4f}")
+    EndgameAgent(solver.policy_table()).save(args.path)
+
+
+if __name__ == "__main__":
+    main()
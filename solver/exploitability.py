@@ -0,0 +1,88 @@
+"""
+Exploitability of trained agents, computed on the enumerated 2-player round (solver.endgame).
+
+An agent's policy is read off once per observation of the round: from
+action_probabilities(state) when the agent has it (agents whose act() is random in
+some states, and the CFR policies), otherwise as the action act(state) picks.
+A best response to it is then computed with memoized values on the round's DAG, and
+the exploitability is what the best response wins on average over both seats: 0 for
+an equilibrium, up to 1 for a policy that always loses to its best response.
+
+This scores a checkpoint in about a second, without playing matches. It only covers
+2-player rounds, the endgame of every game; agents trained in 4-player games are
+evaluated with the moves they would make there.
+
+    python -m solver.exploitability checkpoints/mc1000 checkpoints/sarsa1000 checkpoints/dqn100.npz
+"""
+import argparse
+import os
+import time
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.state_index import unpack_state_key
+from solver.endgame import NUM_PLAYERS, EndgameTree
+
+
+class Exploitability(NamedTuple):
+    exploitability: float
+    first_best_response: float   # value of a best response playing first against the agent
+    second_best_response: float  # value of a best response playing second
+    self_play_value: float       # value of the first player when the agent plays both seats
+
+
+def observation(key: int) -> Dict:
+    """Observation of a 2-player round with the given state key."""
+    hand, table_card, history = unpack_state_key(key)
+    return {"hand": hand, "table_card": table_card, "history": history, "num_players": NUM_PLAYERS}
+
+
+def agent_policy(agent, tree: EndgameTree) -> np.ndarray:
+    """(num_infosets, NUM_ACTIONS) action probabilities of the agent in every observation of the round."""
+    policy = np.zeros(tree.legal_mask.shape)
+    for infoset, key in enumerate(tree.infoset_keys.tolist()):
+        state = observation(key)
+        if hasattr(agent, "action_probabilities"):
+            policy[infoset] = agent.action_probabilities(state)
+        else:
+            policy[infoset, actions.action_id(agent.act(state))] = 1
+    return policy
+
+
+def evaluate(agent, tree: Optional[EndgameTree] = None) -> Exploitability:
+    tree = EndgameTree() if tree is None else tree
+    policy = agent_policy(agent, tree)
+    first = tree.best_response(policy, first=True)[1]
+    second = tree.best_response(policy, first=False)[1]
+    return Exploitability((first + second) / 2, first, second, tree.game_value(policy))
+
+
+def report(agents: Dict[str, object], tree: Optional[EndgameTree] = None) -> str:
+    """Table of the agents' exploitability, least exploitable first."""
+    tree = EndgameTree() if tree is None else tree
+    results = {name: evaluate(agent, tree) for name, agent in agents.items()}
+    width = max([len(name) for name in results] + [5])
+    lines = [f"{'agent':<{width}}  exploitability  best response (1st / 2nd)  self-play"]
+    for name, result in sorted(results.items(), key=lambda item: item[1].exploitability):
+        lines.append(f"{name:<{width}}  {result.exploitability:>14.4f}  "
+                     f"{result.first_best_response:>+12.4f} / {result.second_best_response:<+10.4f}  {result.self_play_value:>+9.4f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    from agent_registry import load_agent
+
+    parser = argparse.ArgumentParser(description="Exploitability of saved agents in the 2-player round")
+    parser.add_argument("paths", nargs="+", help="checkpoints, as accepted by agent_registry.load_agent")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    agents = {os.path.basename(os.path.normpath(path)): load_agent(path) for path in args.paths}
+    print(report(agents))
+    print(f"{len(agents)} agents in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Monte Carlo CFR with external sampling on the rounds of LiarsBarEdiEnv, for any number of players.
+
+Every traversal deals a round and walks it for one player (the traverser): all of the
+traverser's actions are explored, the other players' actions and the deal are sampled.
+Regrets of the traverser's infosets are updated with the sampled counterfactual values,
+and the policy sums of the other players' infosets with their current policy.
+
+Infosets are observations keyed by state_key, with dense ids from a StateIndexer:
+regrets and policy sums are (n_infosets, NUM_ACTIONS) arrays, and the regrets of all the
+actions of an infoset are updated with one vector operation. A round is scored like
+the endgame solver: the loser of the challenge gets -1, the others share +1.
+
+Iterations run in worker processes, the same way as monte_carlo.parallel: every
+sync_every iterations the workers get a snapshot of the tables, run their share
+of the iterations on their copy and send back what they added, which is summed
+into the tables in task order, so a run only depends on the seed, the number of
+workers and the sync interval. For 2 players, exploitability is computed exactly
+on the enumerated round (solver.endgame).
+
+    python -m solver.mccfr checkpoints/mccfr2 --players 2 --iterations 20000 --workers 4
+"""
+import argparse
+import copy
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.q_table import QTable
+from monte_carlo.state_index import NUMBER_OF_TABLE_CARDS, StateIndexer
+from solver.bluff_oracle import DECK_COUNTS, HAND_SIZE
+from solver.endgame import ACTION_CODES, LIES, TABLE_CARDS, EndgameTree
+from solver.policy import PolicyAgent
+
+DECK = np.repeat(np.arange(actions.NUMBER_OF_RANKS), DECK_COUNTS)
+
+
+class InfosetTable:
+    """Regrets, policy sums and legal actions of the infosets met so far, rows indexed by dense infoset ids."""
+
+    def __init__(self, capacity: int = 4096):
+        self.indexer = StateIndexer(capacity)
+        self._regrets = np.zeros((capacity, actions.NUM_ACTIONS))
+        self._policy_sums = np.zeros((capacity, actions.NUM_ACTIONS))
+        self._legal = np.zeros((capacity, actions.NUM_ACTIONS), dtype=bool)
+
+    def __len__(self):
+        return len(self.indexer)
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self.indexer.keys
+
+    @property
+    def regrets(self) -> np.ndarray:
+        return self._regrets[:len(self)]
+
+    @property
+    def policy_sums(self) -> np.ndarray:
+        return self._policy_sums[:len(self)]
+
+    @property
+    def legal(self) -> np.ndarray:
+        return self._legal[:len(self)]
+
+    def add(self, key: int, legal_mask: np.ndarray) -> int:
+        infoset = self.indexer.lookup(key)
+        if infoset >= 0:
+            return infoset
+
+        infoset = self.indexer.add(key)
+        if infoset == len(self._regrets):
+            self._regrets = np.concatenate([self._regrets, np.zeros_like(self._regrets)])
+            self._policy_sums = np.concatenate([self._policy_sums, np.zeros_like(self._policy_sums)])
+            self._legal = np.concatenate([self._legal, np.zeros_like(self._legal)])
+        self._legal[infoset] = legal_mask
+        return infoset
+
+    def current_policy(self, infoset: int) -> np.ndarray:
+        """Regret matching: probabilities proportional to the positive regrets, uniform when there are none."""
+        positive = np.maximum(self._regrets[infoset], 0)
+        total = positive.sum()
+        if total > 0:
+            return positive / total
+        legal = self._legal[infoset]
+        return legal / legal.sum()
+
+    def average_policy(self) -> np.ndarray:
+        sums = self.policy_sums
+        totals = sums.sum(axis=1, keepdims=True)
+        uniform = self.legal / self.legal.sum(axis=1, keepdims=True)
+        return np.where(totals > 0, sums / np.where(totals > 0, totals, 1), uniform)
+
+    def policy_table(self) -> QTable:
+        """The average policy as a QTable of action probabilities keyed by state_key (see solver.policy)."""
+        return QTable.from_arrays(self.keys, self.average_policy().astype(np.float32), self.legal)
+
+    def changes_since(self, snapshot: "InfosetTable") -> Dict[str, np.ndarray]:
+        """What was added to this table since it was copied from snapshot, as arrays keyed by infoset key."""
+        regrets = self.regrets.copy()
+        policy_sums = self.policy_sums.copy()
+        regrets[:len(snapshot)] -= snapshot.regrets
+        policy_sums[:len(snapshot)] -= snapshot.policy_sums
+        return {"keys": self.keys.copy(), "regrets": regrets, "policy_sums": policy_sums, "legal": self.legal.copy()}
+
+    def merge(self, changes: Dict[str, np.ndarray]):
+        """Add the changes of a worker (see changes_since)."""
+        ids = np.array([self.add(key, legal) for key, legal in zip(changes["keys"].tolist(), changes["legal"])], dtype=np.int64)
+        self._regrets[ids] += changes["regrets"]
+        self._policy_sums[ids] += changes["policy_sums"]
+
+
+class ExternalSampling:
+    """One traversal of a sampled round for one traverser, updating table."""
+
+    def __init__(self, table: InfosetTable, num_players: int, rng: np.random.Generator):
+        self.table = table
+        self.num_players = num_players
+        self.rng = rng
+
+    def traverse(self, traverser: int) -> float:
+        """Sampled counterfactual value of the round for traverser."""
+        deck = self.rng.permutation(DECK)
+        hands = [actions.encode_hand(np.bincount(deck[seat * HAND_SIZE:(seat + 1) * HAND_SIZE], minlength=actions.NUMBER_OF_RANKS))
+                 for seat in range(self.num_players)]
+        self.traverser = traverser
+        self.table_card = TABLE_CARDS[self.rng.integers(len(TABLE_CARDS))]
+        starting_player = int(self.rng.integers(self.num_players))
+        return self._node(hands, [HAND_SIZE] * self.num_players, starting_player, -1, False, 0)
+
+    def _utility(self, loser: int) -> float:
+        return -1.0 if loser == self.traverser else 1.0 / (self.num_players - 1)
+
+    def _node(self, hands: List[int], cards_left: List[int], player: int, previous: int, lie: bool, history: int) -> float:
+        table = self.table
+        can_play = cards_left.count(0) < self.num_players - 1
+        legal = actions.LEGAL_MASKS[int(previous >= 0), int(can_play), hands[player]]
+        infoset = table.add((history * NUMBER_OF_TABLE_CARDS + self.table_card) * actions.NUM_HANDS + hands[player], legal)
+        policy = table.current_policy(infoset)
+
+        if player != self.traverser:
+            table._policy_sums[infoset] += policy
+            cumulative = np.cumsum(policy)
+            action = min(int(np.searchsorted(cumulative, self.rng.random() * cumulative[-1], side="right")), actions.NUM_ACTIONS - 1)
+            return self._child(action, hands, cards_left, player, previous, lie, history)
+
+        legal_ids = np.flatnonzero(legal)
+        values = np.array([self._child(action, hands, cards_left, player, previous, lie, history) for action in legal_ids])
+        value = float(policy[legal_ids] @ values)
+        table._regrets[infoset, legal_ids] += values - value
+        return value
+
+    def _child(self, action: int, hands: List[int], cards_left: List[int], player: int, previous: int, lie: bool, history: int) -> float:
+        if action == actions.CHALLENGE:
+            return self._utility(previous if lie else player)
+
+        cards = int(actions.ACTION_SIZES[action])
+        hands = hands.copy()
+        hands[player] -= int(ACTION_CODES[action])
+        cards_left = cards_left.copy()
+        cards_left[player] -= cards
+
+        next_player = (player + 1) % self.num_players
+        while cards_left[next_player] == 0:
+            next_player = (next_player + 1) % self.num_players
+        return self._node(hands, cards_left, next_player, player, bool(LIES[self.table_card, action]), history * 3 + cards)
+
+
+def run_iterations(table: InfosetTable, num_players: int, iterations: int, seed) -> InfosetTable:
+    """Run iterations on table (one traversal per player each) with a generator seeded by seed."""
+    rng = np.random.default_rng(seed)
+    sampling = ExternalSampling(table, num_players, rng)
+    for _ in range(iterations):
+        for traverser in range(num_players):
+            sampling.traverse(traverser)
+    return table
+
+
+def _iterate_task(task) -> Dict[str, np.ndarray]:
+    snapshot, num_players, iterations, seed = task
+    table = run_iterations(copy.deepcopy(snapshot), num_players, iterations, seed)
+    return table.changes_since(snapshot)
+
+
+class MCCFRTrainer:
+    def __init__(self, num_players: int = 2, table: Optional[InfosetTable] = None):
+        self.num_players = num_players
+        self.table = InfosetTable() if table is None else table
+        self.iterations = 0
+        self._tree = None
+
+    def train(
+            self,
+            iterations: int,
+            workers: int = 1,
+            sync_every: int = 1000,
+            seed: Optional[int] = None,
+            evaluate_every: Optional[int] = None,
+            verbose: bool = True
+    ) -> List[Tuple[int, float]]:
+        """
+        Run `iterations` iterations on `workers` processes, merging their tables every `sync_every`.
+        With evaluate_every (2 players only), returns (iterations, exploitability) measured after
+        every sync at which at least evaluate_every iterations were done since the last measure.
+        """
+        seed_sequence = np.random.SeedSequence(seed)
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        history = []
+        last_evaluated = self.iterations
+
+        try:
+            done = 0
+            while done < iterations:
+                interval = min(sync_every, iterations - done)
+                counts = [interval // workers + (1 if i < interval % workers else 0) for i in range(workers)]
+                tasks = [(self.table, self.num_players, count, child) for count, child in zip(counts, seed_sequence.spawn(workers)) if count > 0]
+
+                results = executor.map(_iterate_task, tasks) if executor is not None else map(_iterate_task, tasks)
+                for changes in results:
+                    self.table.merge(changes)
+
+                done += interval
+                self.iterations += interval
+                if evaluate_every is not None and self.iterations - last_evaluated >= evaluate_every:
+                    last_evaluated = self.iterations
+                    history.append((self.iterations, self.exploitability()))
+                if verbose:
+                    measured = f", exploitability {history[-1][1]:.4f}" if history and history[-1][0] == self.iterations else ""
+                    print(f"Finished iteration {self.iterations - 1}, {len(self.table)} infosets{measured}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return history
+
+    def policy_table(self) -> QTable:
+        return self.table.policy_table()
+
+    def agent(self) -> PolicyAgent:
+        return PolicyAgent(self.policy_table(), self.num_players)
+
+    def exploitability(self) -> float:
+        """Exploitability of the average policy (see EndgameTree.exploitability), only for 2 players."""
+        if self.num_players != 2:
+            raise ValueError(f"Exploitability is only computed for 2-player rounds, not {self.num_players}.")
+        if self._tree is None:
+            self._tree = EndgameTree()
+        return self._tree.exploitability(self._tree.policy_from_table(self.policy_table()))
+
+
+def train_mccfr(num_players: int = 2, iterations: int = 10000, workers: int = 1, sync_every: int = 1000,
+                seed: Optional[int] = None, verbose: bool = True) -> PolicyAgent:
+    trainer = MCCFRTrainer(num_players)
+    trainer.train(iterations, workers=workers, sync_every=sync_every, seed=seed, verbose=verbose)
+    return trainer.agent()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a policy with external sampling MCCFR and save it")
+    parser.add_argument("path", help="checkpoint directory of the policy")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sync-every", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    trainer = MCCFRTrainer(args.players)
+    trainer.train(args.iterations, workers=args.workers, sync_every=args.sync_every, seed=args.seed,
+                  evaluate_every=args.sync_every if args.players == 2 else None)
+    print(f"{args.iterations} iterations in {time.perf_counter() - start:.1f}s")
+    trainer.agent().save(args.path)
+
+
+if __name__ == "__main__":
+    main()
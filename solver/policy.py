@@ -0,0 +1,62 @@
+"""
+Agents playing a table of action probabilities, as produced by the CFR solvers.
+
+The policy is a QTable whose rows are keyed by state_key(observation) and whose
+values are the probabilities of the action ids, so it is saved and memory-mapped
+like the tabular agents' checkpoints (see monte_carlo.checkpoint).
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.checkpoint import load_q_table, save_q_table
+from monte_carlo.q_table import QTable
+from monte_carlo.state_index import state_key
+from solver.bluff_oracle import BluffOracleAgent
+
+
+class PolicyAgent:
+    """
+    Samples its actions from policy in rounds of num_players players, and leaves every
+    other round (and observations the policy has no entry for) to fallback.
+    """
+
+    def __init__(self, policy: QTable, num_players: int = 2, fallback=None, rng: Optional[np.random.Generator] = None):
+        self.name = type(self).__name__
+        self.policy = policy
+        self.num_players = num_players
+        self.fallback = BluffOracleAgent() if fallback is None else fallback
+        self.rng = np.random.default_rng(rng)
+
+    def act(self, state: Dict) -> List[int]:
+        if state["num_players"] == self.num_players:
+            state_id = self.policy.lookup(state_key(state))
+            if state_id >= 0:
+                cumulative = np.cumsum(self.policy.values[state_id])
+                action = int(np.searchsorted(cumulative, self.rng.random() * cumulative[-1], side="right"))
+                return actions.action_from_id(min(action, actions.NUM_ACTIONS - 1))
+        return self.fallback.act(state)
+
+    def action_probabilities(self, state: Dict) -> np.ndarray:
+        """Probability of every action id under act()."""
+        if state["num_players"] == self.num_players:
+            state_id = self.policy.lookup(state_key(state))
+            if state_id >= 0:
+                row = self.policy.values[state_id].astype(np.float64)
+                return row / row.sum()
+        probabilities = np.zeros(actions.NUM_ACTIONS)
+        probabilities[actions.action_id(self.fallback.act(state))] = 1
+        return probabilities
+
+    def choose_action(self, state: Dict) -> List[int]:
+        return self.act(state)
+
+    def save(self, path):
+        save_q_table(self.policy, path, type(self).__name__, {"num_players": self.num_players})
+
+    @classmethod
+    def load(cls, path, env=None, mmap: bool = False):
+        """Agent of a saved policy; env is not used, it is accepted like the other agents' load."""
+        table, meta = load_q_table(path, mmap)
+        return cls(table, **meta["params"])
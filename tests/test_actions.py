@@ -0,0 +1,58 @@
+import itertools
+
+import numpy as np
+
+from monte_carlo import actions
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.vec_env import LiarsBarVecEnv
+
+
+def nested_loop_actions(hand, can_challenge, can_play):
+    available_actions = []
+    if can_challenge:
+        available_actions.append([0, 0, 0, 0])
+    if not can_play:
+        return available_actions
+    for jokers in range(hand[0] + 1):
+        for valets in range(hand[1] + 1):
+            for queens in range(hand[2] + 1):
+                for kings in range(hand[3] + 1):
+                    if 1 <= jokers + valets + queens + kings <= 3:
+                        available_actions.append([jokers, valets, queens, kings])
+    return available_actions
+
+def test_catalogue():
+    assert actions.NUM_ACTIONS == 35
+    assert actions.ACTIONS[actions.CHALLENGE].tolist() == actions.CHALLENGE_ACTION
+    for i in range(actions.NUM_ACTIONS):
+        assert actions.action_id(actions.action_from_id(i)) == i
+
+def test_same_actions_as_nested_loops():
+    for hand in itertools.product(range(3), range(6), range(6), range(6)):
+        if sum(hand) > 5:
+            continue
+        for can_challenge in (False, True):
+            for can_play in (False, True):
+                expected = nested_loop_actions(hand, can_challenge, can_play)
+                assert actions.legal_action_lists(hand, can_challenge, can_play) == expected, f"Mismatch for {hand}"
+                ids = actions.legal_action_ids(hand, can_challenge, can_play)
+                assert [actions.action_from_id(i) for i in ids] == expected
+                mask = actions.legal_action_mask(hand, can_challenge, can_play)
+                assert np.flatnonzero(mask).tolist() == ids.tolist()
+
+def test_state_rules():
+    state = {"hand": [0, 1, 0, 1], "table_card": 1, "history": [3, 3, 3, 3, 3, 3], "num_players": 4}
+    assert LiarsBarEdiEnv.get_available_actions(state) == [[0, 0, 0, 0]], "Last player must challenge."
+    state = {"hand": [1, 1, 2, 1], "table_card": 1, "history": [], "num_players": 4}
+    assert [0, 0, 0, 0] not in LiarsBarEdiEnv.get_available_actions(state)
+
+def test_vec_env_mask_matches_env():
+    vec_env = LiarsBarVecEnv(num_envs=16, num_players=4, seed=3)
+    vec_env.reset()
+    rng = np.random.default_rng(3)
+    for _ in range(50):
+        masks = vec_env.legal_action_mask()
+        for i, state in enumerate(vec_env.get_obs_dicts()):
+            assert np.flatnonzero(masks[i]).tolist() == actions.state_action_ids(state).tolist()
+        chosen = np.array([rng.choice(np.flatnonzero(m)) for m in masks])
+        vec_env.step(chosen)
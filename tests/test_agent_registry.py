@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from agent_registry import AGENT_TYPES, agent_class, build_agent, register_agent_type, trainer_class
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_backends(code):
+    """Heavy modules loaded by running code in a fresh interpreter."""
+    check = code + "; import sys; print(','.join(m for m in ('torch', 'gymnasium') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", check], cwd=REPOSITORY, check=True, capture_output=True, text=True)
+    return set(filter(None, result.stdout.strip().split(",")))
+
+@pytest.mark.parametrize("code", [
+    "import arena",
+    "import tournament",
+    "import LiarsBarArena",
+    "from agent_registry import agent_class; agent_class('MonteCarloAgent'); agent_class('SarsaAgent'); agent_class('QLearningAgent')",
+    "from agent_registry import agent_class; agent_class('NumpyDQNPolicy')",
+])
+def test_playing_does_not_import_backends(code):
+    assert imported_backends(code) == set()
+
+def test_backends_load_on_first_use():
+    assert imported_backends("from agent_registry import trainer_class; trainer_class('MonteCarloAgent')") == {"gymnasium"}
+    assert "torch" in imported_backends("from agent_registry import agent_class; agent_class('DQNAgent')")
+
+def test_registry():
+    from monte_carlo.mc_agent import MonteCarloAgent
+    from sarsa.sarsa_agent import SarsaTrainer
+    assert agent_class("MonteCarloAgent") is MonteCarloAgent
+    assert trainer_class("SarsaAgent") is SarsaTrainer
+    with pytest.raises(ValueError):
+        agent_class("AlphaZero")
+    with pytest.raises(ValueError):
+        trainer_class("HumanAgent")
+
+    register_agent_type("Silent", "HumanAgent:HumanAgent")
+    try:
+        assert agent_class("Silent").__name__ == "HumanAgent"
+    finally:
+        del AGENT_TYPES["Silent"]
+
+def test_build_agent():
+    agent = build_agent(lambda: agent_class("MonteCarloAgent")(None))
+    assert build_agent(agent) is agent
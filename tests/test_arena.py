@@ -0,0 +1,79 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from LiarsBarArena import DECK, FastLiarsBarRound, LiarsBarGame, LiarsBarRound
+from monte_carlo.actions import action_from_id, state_action_ids
+from monte_carlo.mc_agent import MonteCarloAgent
+
+
+class FirstLegalAgent:
+    """Deterministic agent that records every state it sees."""
+
+    def __init__(self, name):
+        self.name = name
+        self.states = []
+
+    def act(self, state):
+        self.states.append((list(state["hand"]), state["table_card"], list(state["history"])))
+        ids = state_action_ids(state)
+        return action_from_id(ids[len(state["history"]) % len(ids)])
+
+def test_fast_round_deals_the_deck():
+    rng = np.random.default_rng(0)
+    for num_players in (2, 3, 4):
+        game_round = FastLiarsBarRound([FirstLegalAgent(i) for i in range(num_players)], 0, rng=rng)
+        dealt = Counter()
+        for hand in game_round._hands:
+            assert sum(hand) == 5
+            dealt.update({rank: count for rank, count in enumerate(hand)})
+        deck = Counter(DECK)
+        assert all(dealt[rank] <= deck[rank] for rank in range(4))
+        assert sum(dealt.values()) == 5 * num_players
+
+@pytest.mark.parametrize("starting_player", [0, 2])
+def test_fast_round_matches_round(starting_player):
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        slow_players = [FirstLegalAgent(i) for i in range(4)]
+        fast_players = [FirstLegalAgent(i) for i in range(4)]
+        slow = LiarsBarRound(slow_players, starting_player, rng=rng)
+        fast = FastLiarsBarRound(fast_players, starting_player)
+        fast._hands = [tuple(hand) for hand in slow._hands]
+        fast._table_card = slow._table_card
+
+        assert fast.run_round() == slow.run_round()
+        assert [p.states for p in fast_players] == [p.states for p in slow_players]
+
+def test_state_cannot_be_mutated():
+    game_round = FastLiarsBarRound([FirstLegalAgent(i) for i in range(4)], 0)
+    state = game_round._get_state()
+    with pytest.raises(TypeError):
+        state["hand"][0] = 5
+    with pytest.raises((TypeError, AttributeError)):
+        state["history"].append(3)
+    with pytest.raises(TypeError):
+        state["table_card"] = 1
+
+def test_game_with_both_round_engines():
+    for round_cls in (LiarsBarRound, FastLiarsBarRound):
+        game = LiarsBarGame(round_cls=round_cls, rng=2)
+        for i in range(4):
+            game.register_agent(FirstLegalAgent(i))
+        winner = game.run_game()
+        ranking = game.get_ranking()
+        assert ranking[0] == winner
+        assert sorted(ranking) == [0, 1, 2, 3]
+
+def test_same_seed_same_game():
+    def ranking(seed):
+        # Untrained agents act at random, from the generator they share with the game
+        rng = np.random.default_rng(seed)
+        game = LiarsBarGame(rng=rng)
+        for _ in range(4):
+            game.register_agent(MonteCarloAgent(None, rng=rng))
+        game.run_game()
+        return game.get_ranking()
+    assert all(ranking(seed) == ranking(seed) for seed in range(10))
+    assert len({tuple(ranking(seed)) for seed in range(10)}) > 1
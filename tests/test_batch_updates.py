@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from monte_carlo.batch_updates import dependency_levels, discounted_returns, reversed_within_segments
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.parallel import collect_episodes
+from monte_carlo.state_index import StateIndexer
+from sarsa.sarsa_agent import SarsaAgent
+
+
+@pytest.fixture(scope="module")
+def trajectories():
+    return collect_episodes(MonteCarloAgent(None, epsilon=1.0), 4, 300, seed=0)
+
+def learn_one_by_one(agent, trajectories):
+    segments = trajectories["segments"]
+    for start, end in zip(segments[:-1], segments[1:]):
+        agent.learn_steps(trajectories["state_keys"][start:end].tolist(), trajectories["actions"][start:end].tolist(),
+                          trajectories["rewards"][start:end].tolist(), trajectories["legal_masks"][start:end])
+
+def test_discounted_returns():
+    rewards = np.array([1.0, 0.0, 2.0, -1.0, 0.0, 3.0])
+    segments = np.array([0, 3, 4, 6])
+    expected = [1 + 0.5 * (0 + 0.5 * 2), 0 + 0.5 * 2, 2, -1, 0 + 0.5 * 3, 3]
+    assert discounted_returns(rewards, segments, 0.5).tolist() == expected
+    assert reversed_within_segments(segments).tolist() == [2, 1, 0, 3, 5, 4]
+
+def test_dependency_levels_match_sequential_updates():
+    rng = np.random.default_rng(0)
+    writes = rng.integers(0, 30, size=500)
+    reads = np.where(rng.random(500) < 0.2, -1, rng.integers(0, 40, size=500))
+    sequential = np.zeros(40)
+    for row in range(500):
+        sequential[writes[row]] = sequential[writes[row]] * 0.5 + (sequential[reads[row]] if reads[row] >= 0 else 0) + row
+
+    batched = np.zeros(40)
+    levels = dependency_levels(writes, reads)
+    assert np.array_equal(np.sort(np.concatenate(levels)), np.arange(500))
+    for rows in levels:
+        # Every write of a level goes to a different value
+        assert len(np.unique(writes[rows])) == len(rows)
+        read_values = np.where(reads[rows] >= 0, batched[np.maximum(reads[rows], 0)], 0)
+        batched[writes[rows]] = batched[writes[rows]] * 0.5 + read_values + rows
+    assert np.array_equal(batched, sequential)
+    assert dependency_levels(np.array([], dtype=np.int64)) == []
+
+def test_indexer_add_many():
+    keys = np.array([7, 3, 7, 11, 3, 5])
+    one_by_one = StateIndexer()
+    one_by_one.add(2)
+    expected = [one_by_one.add(int(key)) for key in keys]
+    batched = StateIndexer()
+    batched.add(2)
+    assert batched.add_many(keys).tolist() == expected
+    assert np.array_equal(batched.keys, one_by_one.keys)
+
+@pytest.mark.parametrize("make_agent", [
+    lambda: MonteCarloAgent(None),
+    lambda: MonteCarloAgent(None, averaging="constant"),
+    lambda: MonteCarloAgent(None, first_visit=True),
+    lambda: SarsaAgent(None),
+])
+def test_learn_batch_matches_learn_steps(trajectories, make_agent):
+    loop, batch = make_agent(), make_agent()
+    learn_one_by_one(loop, trajectories)
+    # Twice, so the second batch starts from a table with values
+    for _ in range(2):
+        batch.learn_batch(trajectories["state_keys"], trajectories["actions"], trajectories["rewards"],
+                          trajectories["segments"], trajectories["legal_masks"])
+    learn_one_by_one(loop, trajectories)
+
+    assert np.array_equal(loop.Q.indexer.keys, batch.Q.indexer.keys)
+    assert np.array_equal(loop.Q.values, batch.Q.values)
+    assert np.array_equal(loop.Q.mask, batch.Q.mask)
+    if loop.Q.counts is not None:
+        assert np.array_equal(loop.Q.counts, batch.Q.counts)
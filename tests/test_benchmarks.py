@@ -0,0 +1,24 @@
+import json
+
+from benchmarks.run import compare, main, to_json
+from benchmarks.suite import Metric
+
+
+def test_compare_flags_regressions_only_beyond_threshold():
+    baseline = to_json([Metric("steps", 100.0, "steps/s"), Metric("memory", 1000, "bytes", False)], 1.0)
+    results = to_json([Metric("steps", 85.0, "steps/s"), Metric("memory", 1100, "bytes", False)], 1.0)
+    assert compare(results, baseline, threshold=0.2) == []
+
+    results = to_json([Metric("steps", 70.0, "steps/s"), Metric("memory", 1300, "bytes", False), Metric("new", 1.0, "x")], 1.0)
+    regressions = compare(results, baseline, threshold=0.2)
+    assert [r.split(":")[0] for r in regressions] == ["steps", "memory"]
+
+def test_run_writes_results_and_checks_baseline(tmp_path):
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    assert main(["round_engine", "--scale", "0.01", "--baseline", str(baseline), "--save-baseline"]) == 0
+    assert main(["round_engine", "--scale", "0.01", "--baseline", str(baseline), "--output", str(output), "--threshold", "100"]) == 0
+
+    results = json.loads(output.read_text())
+    assert set(results["results"]) == {"LiarsBarRound.run_round", "FastLiarsBarRound.run_round"}
+    assert results["results"]["FastLiarsBarRound.run_round"]["unit"] == "rounds/s"
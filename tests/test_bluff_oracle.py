@@ -0,0 +1,101 @@
+import random
+from math import comb
+
+import numpy as np
+import pytest
+import torch
+
+from dqn.dqn_agent import DQNAgent
+from dqn.numpy_qnetwork import NumpyDQNPolicy, encode_state
+from monte_carlo import actions
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.vec_env import LiarsBarVecEnv
+from solver.bluff_oracle import (BluffOracleAgent, honest_play, lie_probabilities,
+                                 lie_probability, play_seats, previous_hand_size, unseen_counts)
+
+
+def sample_lie_rate(hand, table_card, history, num_players, model, samples=40000, seed=0):
+    """Deal the unseen cards at random to check lie_probability by simulation."""
+    rng = random.Random(seed)
+    unseen = [rank for rank, count in enumerate(unseen_counts(hand)) for _ in range(count)]
+    hand_size = previous_hand_size(history, num_players)
+    cards = history[-1]
+    lies = 0
+    for _ in range(samples):
+        previous_hand = rng.sample(unseen, hand_size)
+        good = sum(rank in (0, table_card) for rank in previous_hand)
+        if model == "uniform":
+            lies += any(rank not in (0, table_card) for rank in rng.sample(previous_hand, cards))
+        else:
+            lies += good < cards
+    return lies / samples
+
+@pytest.mark.parametrize("model", ["uniform", "honest"])
+@pytest.mark.parametrize("hand, table_card, history", [
+    ([1, 2, 1, 1], 2, [2]),
+    ([0, 1, 0, 2], 1, [1, 3, 2]),
+    ([2, 0, 0, 1], 3, [3, 3, 3, 2, 1]),
+])
+def test_lie_probability_matches_simulation(model, hand, table_card, history):
+    state = {"hand": hand, "table_card": table_card, "history": history, "num_players": 4}
+    expected = sample_lie_rate(hand, table_card, history, 4, model)
+    assert lie_probability(state, model) == pytest.approx(expected, abs=0.01)
+
+def test_lie_probability_edges():
+    assert lie_probability({"hand": [1, 1, 1, 1], "table_card": 1, "history": [], "num_players": 4}) == 0
+    # Honest players only lie without 3 good cards: 8 good of 15 unseen, 5 in hand
+    state = {"hand": [0, 0, 2, 3], "table_card": 1, "history": [3], "num_players": 4}
+    assert lie_probability(state, "honest") == pytest.approx(1 - sum(comb(8, g) * comb(7, 5 - g) for g in range(3, 6)) / comb(15, 5))
+    with pytest.raises(ValueError):
+        lie_probability(state, model="paranoid")
+
+def test_play_seats_skips_empty_hands():
+    history = [3, 2, 2, 2, 1, 1, 1]
+    seats, cards_left = play_seats(history, 3)
+    assert seats == [0, 1, 2, 0, 1, 2, 1]
+    assert cards_left == [0, 1, 2]
+    assert previous_hand_size(history, 3) == 2
+
+def test_honest_play():
+    assert honest_play([1, 0, 3, 1], 2) == [0, 0, 3, 0]
+    assert honest_play([2, 2, 0, 1], 1) == [1, 2, 0, 0]
+    assert honest_play([0, 0, 2, 3], 1) == [0, 0, 1, 0]
+
+def test_agent_plays_legal_actions():
+    random.seed(0)
+    env = LiarsBarEdiEnv()
+    agent = BluffOracleAgent()
+    for _ in range(50):
+        env.reset()
+        done = False
+        while not done:
+            state = env.get_obs()
+            action = agent.act(state) if env._current_player_index == 0 else random.choice(env._get_available_actions())
+            assert actions.state_action_mask(state)[actions.action_id(action)]
+            _, _, done, _ = env.step(action)
+
+def test_batched_lie_probabilities():
+    env = LiarsBarVecEnv(num_envs=64, seed=0)
+    env.reset()
+    rng = np.random.default_rng(0)
+    for _ in range(6):
+        masks = env.legal_action_mask()
+        observations = env.get_obs()
+        expected = [lie_probability(state) for state in env.get_obs_dicts()]
+        assert np.allclose(lie_probabilities(observations), expected)
+        env.step(np.array([rng.choice(np.flatnonzero(mask)) for mask in masks]))
+
+def test_dqn_bluff_feature(tmp_path):
+    torch.manual_seed(0)
+    agent = DQNAgent(LiarsBarEdiEnv(), bluff_feature=True)
+    state = {"hand": [1, 2, 1, 1], "table_card": 2, "history": [2], "num_players": 4}
+    assert agent.state_dim == len(agent.encode_state(state)) == 26
+    assert agent.encode_state(state)[-1] == pytest.approx(lie_probability(state))
+
+    agent.save(tmp_path / "agent.pt")
+    assert DQNAgent.load(tmp_path / "agent.pt").bluff_feature
+    agent.export_weights(tmp_path / "agent.npz")
+    policy = NumpyDQNPolicy.load(tmp_path / "agent.npz")
+    assert policy.bluff_feature
+    action_ids = actions.state_action_ids(state)
+    assert np.allclose(policy.network.q_values(encode_state(state, True), action_ids), agent.q_values(state, action_ids), atol=1e-5)
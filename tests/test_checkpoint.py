@@ -0,0 +1,95 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from agent_registry import load_agent
+from monte_carlo.checkpoint import load_q_table, save_q_table
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.mc_trainer import MonteCarloTrainer
+from monte_carlo.state_index import SortedStateIndex
+from qlearn.q_agent import QLearningAgent
+from qlearn.q_trainer import QLearningTrainer
+from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
+
+
+@pytest.fixture
+def states():
+    random.seed(0)
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(0))
+    collected = []
+    for _ in range(200):
+        env.reset()
+        done = False
+        while not done:
+            collected.append(env.get_obs())
+            _, _, done, _ = env.step(random.choice(env._get_available_actions()))
+    return collected
+
+def trained(agent_cls, trainer_cls):
+    rng = np.random.default_rng(0)
+    env = LiarsBarEdiEnv(rng=rng)
+    agent = agent_cls(env, rng=rng)
+    trainer_cls(env, agent).train(episodes=300)
+    return agent
+
+@pytest.mark.parametrize("agent_cls, trainer_cls, table", [
+    (MonteCarloAgent, MonteCarloTrainer, "Q"),
+    (SarsaAgent, SarsaTrainer, "Q"),
+    (QLearningAgent, QLearningTrainer, "q_table"),
+])
+def test_saved_agent_acts_the_same(tmp_path, states, agent_cls, trainer_cls, table):
+    agent = trained(agent_cls, trainer_cls)
+    agent.save(tmp_path / "agent")
+
+    for mmap in (False, True):
+        loaded = agent_cls.load(tmp_path / "agent", mmap=mmap)
+        assert len(getattr(loaded, table)) == len(getattr(agent, table))
+        for state in states:
+            # Unseen states get a random action, seeded the same for both agents
+            agent.rng = np.random.default_rng(len(state["history"]))
+            expected = agent.act(state)
+            loaded.rng = np.random.default_rng(len(state["history"]))
+            assert loaded.act(state) == expected
+
+    mapped = agent_cls.load(tmp_path / "agent", mmap=True)
+    assert isinstance(getattr(mapped, table).indexer, SortedStateIndex)
+    assert isinstance(getattr(mapped, table).values, np.memmap)
+
+def test_round_trip_keeps_rows_and_counts(tmp_path):
+    agent = trained(MonteCarloAgent, MonteCarloTrainer)
+    save_q_table(agent.Q, tmp_path / "table")
+    keys = np.load(tmp_path / "table" / "keys.npy")
+    assert np.all(np.diff(keys) > 0), "Keys should be stored sorted."
+
+    loaded, meta = load_q_table(tmp_path / "table")
+    assert meta["version"] == 1 and meta["n_states"] == len(agent.Q)
+    for state_id, key in enumerate(agent.Q.indexer.keys):
+        loaded_id = loaded.lookup(key)
+        assert np.array_equal(loaded.values[loaded_id], agent.Q.values[state_id])
+        assert np.array_equal(loaded.mask[loaded_id], agent.Q.mask[state_id])
+        assert np.array_equal(loaded.counts[loaded_id], agent.Q.counts[state_id])
+
+    # A copied table can keep training, a memory-mapped one cannot add states
+    loaded.add(-1 + 2 ** 40)
+    mapped, _ = load_q_table(tmp_path / "table", mmap=True)
+    assert mapped.lookup(12345) == -1
+    with pytest.raises(ValueError):
+        mapped.add(12345)
+
+def test_unknown_version_is_rejected(tmp_path):
+    save_q_table(trained(SarsaAgent, SarsaTrainer).Q, tmp_path / "table")
+    meta_path = tmp_path / "table" / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    meta["version"] = 99
+    meta_path.write_text(json.dumps(meta))
+    with pytest.raises(ValueError):
+        load_q_table(tmp_path / "table")
+
+def test_tournament_loads_checkpoint_directories(tmp_path):
+    trained(QLearningAgent, QLearningTrainer).save(tmp_path / "qlearn")
+    agent = load_agent(tmp_path / "qlearn")
+    assert isinstance(agent, QLearningAgent)
+    assert isinstance(agent.q_table.values, np.memmap)
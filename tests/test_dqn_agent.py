@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+import pytest
+import torch
+
+from dqn.dqn_agent import DQNAgent
+from dqn.dqn_train import train_n_dqn
+from monte_carlo.actions import action_from_id, state_action_ids, state_action_mask
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.vec_env import LiarsBarVecEnv
+
+
+def one_by_one_act(agent, state):
+    best_action = None
+    best_q = -1e9
+    for a in LiarsBarEdiEnv.get_available_actions(state):
+        sa = np.concatenate([agent.encode_state(state), agent.encode_action(a)], axis=0)
+        with torch.no_grad():
+            q_val = agent.q_network(torch.tensor(sa, dtype=torch.float32).unsqueeze(0)).item()
+        if q_val > best_q:
+            best_q = q_val
+            best_action = a
+    return best_action
+
+@pytest.fixture
+def agent():
+    torch.manual_seed(0)
+    return DQNAgent(LiarsBarEdiEnv())
+
+@pytest.fixture
+def states():
+    random.seed(0)
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(0))
+    collected = []
+    for _ in range(30):
+        env.reset()
+        done = False
+        while not done:
+            collected.append(env.get_obs())
+            _, _, done, _ = env.step(random.choice(env._get_available_actions()))
+    return collected
+
+def test_batched_act_matches_one_by_one(agent, states):
+    for state in states:
+        assert agent.act(state) == one_by_one_act(agent, state)
+
+def test_act_batch(agent, states):
+    assert agent.act_batch(states) == [agent.act(state) for state in states]
+
+def test_act_vec(agent):
+    vec_env = LiarsBarVecEnv(num_envs=16, num_players=4, seed=0)
+    vec_env.reset()
+    for _ in range(10):
+        observations = vec_env.get_obs()
+        ids = agent.act_vec(observations, vec_env.legal_action_mask())
+        expected = [agent.act(state) for state in vec_env.get_obs_dicts()]
+        assert [action_from_id(i) for i in ids] == expected
+        vec_env.step(ids)
+
+def test_next_state_values_match_loop(agent, states):
+    next_states = states[:32]
+    next_batch = torch.tensor(np.array([agent.encode_state(s) for s in next_states]))
+    masks = np.stack([state_action_mask(s) for s in next_states])
+    with torch.no_grad():
+        values = agent._next_state_values(next_batch, masks)[:, 0].numpy()
+    for value, state in zip(values, next_states):
+        expected = agent.q_values(state, state_action_ids(state)).max()
+        assert value == pytest.approx(expected, abs=1e-5)
+
+def fill_memory(agent, states):
+    for state, next_state in zip(states, states[1:]):
+        agent.remember(state, random.choice(LiarsBarEdiEnv.get_available_actions(state)), 10, next_state, False)
+
+def test_hard_target_sync(states):
+    torch.manual_seed(0)
+    agent = DQNAgent(LiarsBarEdiEnv(), use_target_network=True, target_sync_every=3, double_dqn=True)
+    fill_memory(agent, states)
+    before = [p.clone() for p in agent.target_network.parameters()]
+    agent.train_step()
+    agent.train_step()
+    assert all(torch.equal(a, b) for a, b in zip(before, agent.target_network.parameters()))
+    agent.train_step()
+    assert all(torch.equal(a, b) for a, b in zip(agent.q_network.parameters(), agent.target_network.parameters()))
+
+def test_soft_target_update(states):
+    torch.manual_seed(0)
+    agent = DQNAgent(LiarsBarEdiEnv(), use_target_network=True, target_update="soft", tau=0.5)
+    fill_memory(agent, states)
+    before = [p.clone() for p in agent.target_network.parameters()]
+    agent.train_step()
+    for old, target, online in zip(before, agent.target_network.parameters(), agent.q_network.parameters()):
+        assert torch.allclose(target, 0.5 * old + 0.5 * online)
+
+def test_trained_agents_have_their_own_generators(capsys):
+    torch.manual_seed(0)
+    agents = train_n_dqn(LiarsBarEdiEnv(rng=np.random.default_rng(0)), no_agents=3, episodes=1)
+    assert len({id(agent.rng) for agent in agents}) == 3
+    assert all(agent.memory.rng is agent.rng for agent in agents)
+    torch.manual_seed(0)
+    again = train_n_dqn(LiarsBarEdiEnv(rng=np.random.default_rng(0)), no_agents=3, episodes=1)
+    assert [agent.rng.random() for agent in agents] == [agent.rng.random() for agent in again]
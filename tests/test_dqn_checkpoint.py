@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pytest
+import torch
+
+from agent_registry import load_agent
+from dqn.checkpoint import convert_legacy, load_checkpoint
+from dqn.dqn_agent import DQNAgent, QNetwork
+from monte_carlo.mc_env import LiarsBarEdiEnv
+
+LEGACY_MODEL = "dqn/saved_models/episodes_100.pt"
+
+
+@pytest.fixture
+def agent():
+    torch.manual_seed(0)
+    return DQNAgent(LiarsBarEdiEnv(), gamma=0.5, lr=1e-4, use_target_network=True, double_dqn=True, hidden_size=48)
+
+def test_checkpoint_round_trip(tmp_path, agent):
+    agent.save(tmp_path / "agent.pt")
+    checkpoint = torch.load(tmp_path / "agent.pt", weights_only=True)
+    assert set(checkpoint) == {"format", "version", "state_dict", "hyperparameters", "encoding"}
+
+    loaded = DQNAgent.load(tmp_path / "agent.pt")
+    assert loaded.hyperparameters() == agent.hyperparameters()
+    for name, tensor in agent.q_network.state_dict().items():
+        assert torch.equal(tensor, loaded.q_network.state_dict()[name])
+        assert torch.equal(tensor, loaded.target_network.state_dict()[name])
+
+def test_checkpoint_is_small(tmp_path, agent):
+    env = agent.env
+    state, _ = env.reset()
+    for _ in range(200):
+        action = agent.choose_action(env.get_obs())
+        next_state, reward, done, _ = env.step(action)
+        agent.remember(state, action, reward, next_state, done)
+        state = env.reset()[0] if done else env.get_obs()
+
+    agent.save(tmp_path / "agent.pt")
+    torch.save(agent, tmp_path / "pickled.pt")
+    assert (tmp_path / "agent.pt").stat().st_size * 10 < (tmp_path / "pickled.pt").stat().st_size
+
+def test_legacy_agent_conversion(tmp_path):
+    legacy = torch.load(LEGACY_MODEL, weights_only=False)
+    with pytest.raises(pickle.UnpicklingError):
+        load_checkpoint(LEGACY_MODEL)
+    # Pickled before the agents had an rng, every loaded agent gets its own
+    assert legacy.rng is not torch.load(LEGACY_MODEL, weights_only=False).rng
+
+    convert_legacy(LEGACY_MODEL, tmp_path / "converted.pt")
+    converted = DQNAgent.load(tmp_path / "converted.pt")
+    state = {"num_players": 4, "hand": [1, 2, 1, 1], "table_card": 2, "history": [1, 3]}
+    assert converted.act(state) == legacy.act(state)
+    assert isinstance(load_agent(tmp_path / "converted.pt"), DQNAgent)
+    assert isinstance(load_agent(LEGACY_MODEL), DQNAgent)
+
+def test_exported_weights(tmp_path, agent):
+    agent.export_weights(tmp_path / "weights.npz")
+    weights = np.load(tmp_path / "weights.npz")
+    rows = np.random.default_rng(0).random((5, 29), dtype=np.float32)
+    hidden = np.maximum(rows @ weights["fc1.weight"].T + weights["fc1.bias"], 0)
+    hidden = np.maximum(hidden @ weights["fc2.weight"].T + weights["fc2.bias"], 0)
+    expected = agent._forward(rows)
+    assert np.allclose(hidden @ weights["out.weight"].T[:, 0] + weights["out.bias"], expected, atol=1e-5)
+
+def test_q_network_save(tmp_path):
+    network = QNetwork(25, 4)
+    network.save(tmp_path / "network.pt")
+    restored = QNetwork(25, 4)
+    restored.load_state_dict(torch.load(tmp_path / "network.pt", weights_only=True))
+    assert all(torch.equal(a, b) for a, b in zip(network.parameters(), restored.parameters()))
@@ -0,0 +1,96 @@
+import random
+from math import comb
+
+import numpy as np
+import pytest
+
+from LiarsBarArena import FastLiarsBarRound
+from agent_registry import load_agent
+from monte_carlo import actions
+from monte_carlo.state_index import state_key, unpack_state_key
+from solver.endgame import EndgameAgent, EndgameSolver, EndgameTree, deal_probabilities
+
+
+class UniformAgent:
+    """Picks uniformly among the legal action ids, the policy EndgameSolver starts from."""
+
+    def act(self, state):
+        return actions.action_from_id(random.choice(actions.state_action_ids(state)))
+
+
+class RecordingAgent(UniformAgent):
+    def __init__(self, states):
+        self.states = states
+
+    def act(self, state):
+        self.states.append(dict(state))
+        return super().act(state)
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return EndgameTree()
+
+@pytest.fixture(scope="module")
+def solver(tree):
+    solver = EndgameSolver(tree)
+    solver.iterate(40)
+    return solver
+
+def test_deal_probabilities():
+    probabilities = deal_probabilities()
+    assert sum(probabilities.values()) == pytest.approx(1)
+    ways = comb(2, 2) * comb(6, 3) * comb(6, 1) * comb(5, 5)
+    assert probabilities[(2, 3, 0, 0), (0, 0, 0, 5)] == pytest.approx(ways / (comb(20, 5) * comb(15, 5)))
+
+def test_tree_covers_played_rounds(tree):
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    states = []
+    for _ in range(300):
+        FastLiarsBarRound([RecordingAgent(states), RecordingAgent(states)], 0, rng=rng).run_round()
+    keys = {state_key(state) for state in states}
+    assert np.all(np.isin(list(keys), tree.infoset_keys))
+
+    for key, mask in zip(tree.infoset_keys[::50], tree.legal_mask[::50]):
+        hand, table_card, history = unpack_state_key(int(key))
+        state = {"hand": hand, "table_card": table_card, "history": history, "num_players": 2}
+        assert np.array_equal(mask, actions.state_action_mask(state))
+
+def test_game_value_matches_simulation(tree):
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    rounds = 20000
+    agents = [UniformAgent(), UniformAgent()]
+    losses = sum(FastLiarsBarRound(agents, 0, rng=rng).run_round() == 0 for _ in range(rounds))
+    uniform = tree.legal_mask / tree.legal_mask.sum(axis=1, keepdims=True)
+    assert tree.game_value(uniform) == pytest.approx(1 - 2 * losses / rounds, abs=0.03)
+
+def test_solved_policy_beats_uniform(tree, solver):
+    policy = solver.average_policy()
+    assert np.allclose(policy.sum(axis=1), 1)
+    assert not np.any(policy[~tree.legal_mask])
+
+    uniform = tree.legal_mask / tree.legal_mask.sum(axis=1, keepdims=True)
+    first = tree.first_player_infosets()[:, None]
+    value = tree.game_value(policy)
+    assert tree.game_value(np.where(first, policy, uniform)) > value + 0.1
+    assert tree.game_value(np.where(first, uniform, policy)) < value - 0.1
+
+def test_agent(tmp_path, solver):
+    agent = EndgameAgent(solver.policy_table())
+    agent.save(tmp_path / "endgame")
+    loaded = load_agent(tmp_path / "endgame")
+    assert isinstance(loaded, EndgameAgent)
+    assert np.array_equal(loaded.policy.values, agent.policy.values)
+
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    loaded.rng = rng
+    for num_players in (2, 4):
+        states = []
+        for _ in range(100):
+            players = [loaded] + [RecordingAgent(states) for _ in range(num_players - 1)]
+            FastLiarsBarRound(players, 0, rng=rng).run_round()
+        for state in states:
+            assert actions.state_action_mask(state)[actions.action_id(loaded.act(state))]
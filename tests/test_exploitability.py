@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import torch
+
+from dqn.dqn_agent import DQNAgent
+from monte_carlo import actions
+from monte_carlo.mc_agent import MonteCarloAgent
+from qlearn.q_agent import QLearningAgent
+from sarsa.sarsa_agent import SarsaAgent
+from solver.bluff_oracle import BluffOracleAgent
+from solver.endgame import EndgameSolver, EndgameTree
+from solver.exploitability import agent_policy, evaluate, main, observation, report
+from solver.policy import PolicyAgent
+
+
+class AlwaysChallengeAgent:
+    """Challenges whenever it can, otherwise plays its first legal action."""
+
+    def act(self, state):
+        return actions.action_from_id(actions.state_action_ids(state)[0])
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return EndgameTree()
+
+@pytest.fixture(scope="module")
+def solver(tree):
+    solver = EndgameSolver(tree)
+    solver.iterate(40)
+    return solver
+
+def test_untrained_agents(tree):
+    uniform = tree.legal_mask / tree.legal_mask.sum(axis=1, keepdims=True)
+    # Unseen states: Monte Carlo and Q-learning act at random, SARSA takes the first legal action
+    assert np.allclose(agent_policy(MonteCarloAgent(None), tree), uniform)
+    assert np.allclose(agent_policy(QLearningAgent(None), tree), uniform)
+    first_legal = agent_policy(AlwaysChallengeAgent(), tree)
+    assert np.array_equal(agent_policy(SarsaAgent(None), tree), first_legal)
+    assert evaluate(MonteCarloAgent(None), tree).exploitability == pytest.approx(tree.exploitability(uniform))
+
+def test_dqn_agent(tree):
+    torch.manual_seed(0)
+    agent = DQNAgent(None)
+    policy = agent_policy(agent, tree)
+    assert np.all(np.count_nonzero(policy, axis=1) == 1)
+    assert not np.any(policy[~tree.legal_mask])
+    assert 0 <= evaluate(agent, tree).exploitability <= 1
+
+def test_policy_of_act(tree):
+    policy = agent_policy(BluffOracleAgent(), tree)
+    assert np.all(policy.sum(axis=1) == 1)
+    for infoset in range(0, tree.num_infosets, 100):
+        state = observation(int(tree.infoset_keys[infoset]))
+        assert policy[infoset, actions.action_id(BluffOracleAgent().act(state))] == 1
+
+def test_equilibrium_is_least_exploitable(tree, solver):
+    agent = PolicyAgent(solver.policy_table())
+    result = evaluate(agent, tree)
+    assert result.exploitability == pytest.approx(tree.exploitability(solver.average_policy()), abs=1e-4)
+    assert result.first_best_response >= result.self_play_value
+    assert result.second_best_response >= -result.self_play_value
+
+    challenger = evaluate(AlwaysChallengeAgent(), tree)
+    assert challenger.exploitability > result.exploitability + 0.5
+    assert challenger.exploitability <= 1
+
+    table = report({"cfr": agent, "challenger": AlwaysChallengeAgent()}, tree).splitlines()
+    assert table[1].startswith("cfr") and table[2].startswith("challenger")
+
+def test_main(tmp_path, capsys, solver):
+    PolicyAgent(solver.policy_table()).save(tmp_path / "cfr")
+    main([str(tmp_path / "cfr")])
+    assert "cfr" in capsys.readouterr().out
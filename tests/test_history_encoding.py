@@ -0,0 +1,156 @@
+import numpy as np
+import pytest
+import torch
+
+from dqn.dqn_agent import DQNAgent
+from dqn.numpy_qnetwork import NumpyDQNPolicy, encode_state
+from monte_carlo import actions
+from monte_carlo.history_encoding import HistoryEncoding, as_history_encoding
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.parallel import collect_episodes, merge_trajectories
+from monte_carlo.state_index import Observation, state_key
+from monte_carlo.trajectory_store import TrajectoryStore, TrajectoryWriter
+from monte_carlo.vec_env import LiarsBarVecEnv
+from qlearn.q_agent import QLearningAgent
+from sarsa.sarsa_agent import SarsaAgent
+
+ENCODINGS = [HistoryEncoding(), HistoryEncoding(last_plays=2), HistoryEncoding(last_plays=3, cards_played=True),
+             HistoryEncoding(last_plays=1, cards_left=True), HistoryEncoding(cards_played=True, cards_left=True)]
+
+
+@pytest.fixture(scope="module")
+def episodes():
+    """Player reward histories of random 2- to 4-player episodes."""
+    rng = np.random.default_rng(0)
+    recorded = []
+    for num_players in (2, 3, 4):
+        env = LiarsBarEdiEnv(num_players=num_players, rng=rng)
+        agent = MonteCarloAgent(env, epsilon=1.0, rng=rng)
+        for _ in range(40):
+            env.reset()
+            done = False
+            while not done:
+                _, _, done, _ = env.step(agent.choose_action(env.get_obs()))
+            recorded.append(env.get_player_reward_history())
+    return recorded
+
+@pytest.fixture(scope="module")
+def states(episodes):
+    return [step["state"] for episode in episodes for trajectory in episode for step in trajectory]
+
+def test_default_encoding_keeps_the_full_history(states):
+    encoding = HistoryEncoding()
+    assert encoding.is_full and encoding.num_history_codes is None
+    assert all(encoding.state_key(state) == state_key(dict(state)) for state in states)
+    assert all(np.array_equal(encode_state(state, history_encoding=encoding)[5:], encoding.features(state)) for state in states)
+
+def test_keys_are_bounded_and_keep_the_features(states):
+    encoding = HistoryEncoding(last_plays=2, cards_played=True, cards_left=True)
+    bound = encoding.num_history_codes * 4 * actions.NUM_HANDS
+    keys = {}
+    for state in states:
+        key = encoding.state_key(state)
+        assert 0 <= key < bound
+        played = sum(state["history"])
+        seen = (tuple(state["hand"]), state["table_card"], tuple(state["history"][-2:]), played,
+                state["num_players"] * 5 - played - sum(state["hand"]))
+        assert keys.setdefault(key, seen) == seen, "Different features got the same key."
+    # Observations that only differ before their last 2 plays share their key
+    last_two = HistoryEncoding(last_plays=2)
+    assert len({last_two.state_key(state) for state in states}) < len({state_key(dict(state)) for state in states})
+
+def test_legality_is_in_the_key(states):
+    # With the cards left, states sharing a key have the same legal actions
+    masks = {}
+    for encoding in (HistoryEncoding(last_plays=1, cards_left=True), HistoryEncoding(last_plays=2, cards_left=True)):
+        for state in states:
+            mask = actions.state_action_mask(state)
+            assert np.array_equal(masks.setdefault((encoding, encoding.state_key(state)), mask), mask)
+
+def test_invalid_encoding():
+    with pytest.raises(ValueError):
+        as_history_encoding({"last_plays": 0})
+    assert as_history_encoding(HistoryEncoding(last_plays=4).params()) == HistoryEncoding(last_plays=4)
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_vectorized_encodings_match(tmp_path, episodes, states, encoding):
+    with TrajectoryWriter(tmp_path / "store") as writer:
+        for episode in episodes:
+            writer.add_episode(episode)
+    store = TrajectoryStore(tmp_path / "store")
+    assert store.state_keys(history_encoding=encoding).tolist() == [encoding.state_key(state) for state in states]
+
+    vec_env = LiarsBarVecEnv(num_envs=8, num_players=3, seed=0)
+    vec_env.reset()
+    for _ in range(30):
+        features = encoding.batch_features(vec_env.get_obs())
+        assert np.array_equal(features, [encoding.features(state) for state in vec_env.get_obs_dicts()])
+        masks = vec_env.legal_action_mask()
+        vec_env.step(np.array([np.flatnonzero(mask)[-1] for mask in masks]))
+
+@pytest.mark.parametrize("agent_cls", [MonteCarloAgent, SarsaAgent, QLearningAgent])
+def test_tabular_agents(tmp_path, agent_cls):
+    encoding = HistoryEncoding(last_plays=3, cards_left=True)
+    agent = agent_cls(None, history_encoding=encoding.params())
+    assert agent.history_encoding == encoding
+    if hasattr(agent, "learn_batch"):
+        merge_trajectories(agent, collect_episodes(agent, 4, 50, seed=0))
+        assert 0 < len(agent.Q) and np.all(agent.Q.indexer.keys < encoding.num_history_codes * 4 * actions.NUM_HANDS)
+
+    agent.save(tmp_path / "agent")
+    assert type(agent).load(tmp_path / "agent").history_encoding == encoding
+    assert agent_cls(None).history_encoding == HistoryEncoding()
+
+def test_dqn_agent(tmp_path, states):
+    torch.manual_seed(0)
+    encoding = HistoryEncoding(last_plays=4, cards_played=True, cards_left=True)
+    agent = DQNAgent(None, history_encoding=encoding, bluff_feature=True)
+    assert agent.state_dim == 5 + 4 + 2 + 1
+    assert agent.encode_state(states[0]).shape == (agent.state_dim,)
+
+    agent.save(tmp_path / "agent.pt")
+    loaded = DQNAgent.load(tmp_path / "agent.pt")
+    assert loaded.history_encoding == encoding
+    agent.export_weights(tmp_path / "weights.npz")
+    policy = NumpyDQNPolicy.load(tmp_path / "weights.npz")
+    assert policy.history_encoding == encoding and policy.bluff_feature
+    assert all(policy.act(state) == loaded.act(state) == agent.act(state) for state in states[:50])
+
+@pytest.mark.parametrize("agent_cls", [MonteCarloAgent, SarsaAgent, QLearningAgent])
+def test_lossy_keys_keep_actions_legal(capsys, agent_cls):
+    # Without the cards left, states with different legal actions share their key
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(0))
+    agent = agent_cls(env, history_encoding=HistoryEncoding(last_plays=1), rng=np.random.default_rng(0))
+    for episode in range(300):
+        env.reset()
+        done = False
+        while not done:
+            state = env.get_obs()
+            # Exploring for the first half, then playing the learned policy
+            action = agent.choose_action(state) if episode < 150 else agent.act(state)
+            assert env.get_action_mask()[actions.action_id(action)]
+            next_state, reward, done, _ = env.step(action)
+            if agent_cls is QLearningAgent:
+                agent.learn(state, action, reward, next_state, done)
+        if agent_cls is not QLearningAgent:
+            for trajectory in env.get_player_reward_history():
+                if len(trajectory):
+                    agent.learn(trajectory)
+
+@pytest.mark.parametrize("agent_cls", [MonteCarloAgent, SarsaAgent, QLearningAgent])
+def test_shared_key_with_other_legal_actions(agent_cls):
+    # Same hand, table card and last play, but in the second state the other player has no cards left
+    can_play = Observation((0, 2, 1, 0), 1, (2, 3), 2)
+    must_challenge = Observation((0, 2, 1, 0), 1, (2, 2, 3), 2)
+    encoding = HistoryEncoding(last_plays=1)
+    assert encoding.state_key(can_play) == encoding.state_key(must_challenge)
+
+    agent = agent_cls(None, history_encoding=encoding, rng=np.random.default_rng(0))
+    table = agent.Q if hasattr(agent, "Q") else agent.q_table
+    table.set(table.add(encoding.state_key(can_play), actions.state_action_mask(can_play)), 4, 1.0)
+    assert agent.act(must_challenge) == [0, 0, 0, 0]
+    if agent_cls is SarsaAgent:
+        for epsilon in (0.0, 1.0):
+            agent.epsilon = epsilon
+            assert agent.choose_action(must_challenge) == [0, 0, 0, 0]
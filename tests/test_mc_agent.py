@@ -0,0 +1,86 @@
+
+import numpy as np
+import pytest
+
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.state_index import pack_state
+
+
+def play_episodes(env, agent, episodes):
+    recorded = []
+    for _ in range(episodes):
+        env.reset()
+        done = False
+        while not done:
+            _, _, done, _ = env.step(agent.choose_action(env.get_obs()))
+        recorded.extend(env.get_player_reward_history())
+    return recorded
+
+@pytest.fixture
+def episodes():
+    rng = np.random.default_rng(0)
+    env = LiarsBarEdiEnv(rng=rng)
+    return play_episodes(env, MonteCarloAgent(env, epsilon=1.0, rng=rng), 100)
+
+def learned_values(agent):
+    return {(agent.Q.indexer.keys[s], a): agent.Q.values[s, a] for s, a in zip(*np.nonzero(agent.Q.counts))}
+
+def test_incremental_mean_matches_stored_returns(episodes):
+    env = LiarsBarEdiEnv()
+    incremental = MonteCarloAgent(env, averaging="incremental")
+    stored = MonteCarloAgent(env, averaging="returns")
+    for episode in episodes:
+        incremental.learn(episode)
+        stored.learn(episode)
+
+    assert stored.returns and not incremental.returns
+    expected = learned_values(stored)
+    got = learned_values(incremental)
+    assert expected.keys() == got.keys()
+    for key in expected:
+        assert got[key] == pytest.approx(expected[key], rel=1e-4, abs=1e-3)
+    assert np.array_equal(incremental.Q.counts, stored.Q.counts)
+
+def test_compact_returns(episodes):
+    env = LiarsBarEdiEnv()
+    stored = MonteCarloAgent(env, averaging="returns")
+    for episode in episodes:
+        stored.learn(episode)
+    expected = learned_values(stored)
+
+    stored.compact_returns()
+    assert stored.averaging == "incremental"
+    assert stored.returns == {}
+    assert learned_values(stored) == expected
+
+def test_compact_old_tuple_returns():
+    agent = MonteCarloAgent(LiarsBarEdiEnv())
+    old_returns = {((1, 2, 1, 1), 2, (1, 3)): {(0, 0, 0, 0): [10.0, 20.0], (0, 1, 0, 0): [-5.0]}}
+    agent.compact_returns(old_returns)
+    state_id = agent.Q.lookup(pack_state((1, 2, 1, 1), 2, (1, 3)))
+    assert state_id >= 0
+    assert agent.Q.values[state_id, 0] == pytest.approx(15.0)
+    assert agent.Q.counts[state_id, 0] == 2
+
+def test_first_visit():
+    state = {"hand": [1, 1, 1, 1], "table_card": 1, "history": [], "num_players": 4}
+    episode = [
+        {"state": state, "action": [0, 1, 0, 0], "reward": 1},
+        {"state": state, "action": [0, 1, 0, 0], "reward": 2},
+    ]
+    every_visit = MonteCarloAgent(LiarsBarEdiEnv(), gamma=1.0)
+    first_visit = MonteCarloAgent(LiarsBarEdiEnv(), gamma=1.0, first_visit=True)
+    every_visit.learn(episode)
+    first_visit.learn(episode)
+
+    assert every_visit.Q.values[0].max() == pytest.approx(2.5)
+    assert first_visit.Q.values[0].max() == pytest.approx(3.0)
+    assert first_visit.Q.counts[0].sum() == 1
+
+def test_constant_step_size():
+    state = {"hand": [1, 1, 1, 1], "table_card": 1, "history": [], "num_players": 4}
+    agent = MonteCarloAgent(LiarsBarEdiEnv(), averaging="constant", alpha=0.5)
+    agent.learn([{"state": state, "action": [0, 1, 0, 0], "reward": 8}])
+    agent.learn([{"state": state, "action": [0, 1, 0, 0], "reward": 8}])
+    assert agent.Q.values[0].max() == pytest.approx(6.0)
@@ -0,0 +1,82 @@
+
+import numpy as np
+import pytest
+
+from LiarsBarArena import LiarsBarGame
+from monte_carlo import actions
+from solver.endgame import EndgameSolver, EndgameTree
+from solver.mccfr import InfosetTable, MCCFRTrainer, run_iterations
+from solver.policy import PolicyAgent
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return EndgameTree()
+
+def trained_table(workers):
+    trainer = MCCFRTrainer(num_players=3)
+    trainer.train(40, workers=workers, sync_every=20, seed=7, verbose=False)
+    return trainer.table
+
+def test_regrets_only_for_legal_actions():
+    table = run_iterations(InfosetTable(capacity=16), 4, 20, seed=0)
+    assert len(table) > 16
+    assert not np.any(table.regrets[~table.legal])
+    assert not np.any(table.policy_sums[~table.legal])
+    assert np.allclose(table.average_policy().sum(axis=1), 1)
+
+def test_merge_adds_changes():
+    snapshot = run_iterations(InfosetTable(), 2, 10, seed=0)
+    table = run_iterations(InfosetTable(), 2, 10, seed=0)
+    worker = run_iterations(InfosetTable(), 2, 10, seed=0)
+    run_iterations(worker, 2, 10, seed=1)
+
+    table.merge(worker.changes_since(snapshot))
+    expected = {key: row for key, row in zip(worker.keys.tolist(), worker.regrets)}
+    for key, row in zip(table.keys.tolist(), table.regrets):
+        assert np.allclose(row, expected[key])
+
+def test_same_seed_same_table():
+    first = trained_table(workers=2)
+    second = trained_table(workers=2)
+    assert np.array_equal(first.keys, second.keys)
+    assert np.array_equal(first.regrets, second.regrets)
+    assert np.array_equal(first.policy_sums, second.policy_sums)
+
+def test_exploitability_decreases(tree):
+    uniform = tree.legal_mask / tree.legal_mask.sum(axis=1, keepdims=True)
+    trainer = MCCFRTrainer(num_players=2)
+    trainer._tree = tree
+    history = trainer.train(400, sync_every=200, seed=0, evaluate_every=200, verbose=False)
+    assert [iterations for iterations, _ in history] == [200, 400]
+    assert history[1][1] < history[0][1] < tree.exploitability(uniform)
+
+    with pytest.raises(ValueError):
+        MCCFRTrainer(num_players=4).exploitability()
+
+def test_cfr_plus_is_nearly_unexploitable(tree):
+    solver = EndgameSolver(tree)
+    solver.iterate(100)
+    best_response, value = tree.best_response(solver.average_policy(), first=True)
+    responder = tree.first_player_infosets()
+    assert np.all(np.count_nonzero(best_response[responder], axis=1) == 1)
+    assert np.array_equal(best_response[~responder], solver.average_policy()[~responder])
+    assert value >= tree.game_value(solver.average_policy())
+    assert tree.exploitability(solver.average_policy()) < 0.1
+
+def test_policy_agent_plays_games():
+    trainer = MCCFRTrainer(num_players=4)
+    trainer.train(20, seed=0, verbose=False)
+    agent = trainer.agent()
+    assert isinstance(agent, PolicyAgent) and agent.num_players == 4
+
+    rng = np.random.default_rng(0)
+    game = LiarsBarGame(rng=rng)
+    for _ in range(4):
+        # The game tells players apart by identity, every seat gets its own agent sharing the policy
+        game.register_agent(PolicyAgent(agent.policy, num_players=4, rng=rng))
+    assert game.run_game() in range(4)
+
+    state = {"hand": [1, 1, 2, 1], "table_card": 2, "history": [], "num_players": 4}
+    for _ in range(20):
+        assert actions.state_action_mask(state)[actions.action_id(agent.act(state))]
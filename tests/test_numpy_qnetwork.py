@@ -0,0 +1,78 @@
+import os
+import random
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import torch
+
+from dqn.dqn_agent import DQNAgent
+from dqn.numpy_qnetwork import NumpyDQNPolicy, NumpyQNetwork, encode_state
+from monte_carlo.actions import NUM_ACTIONS, state_action_ids, state_action_mask
+from monte_carlo.mc_env import LiarsBarEdiEnv
+
+
+@pytest.fixture
+def states():
+    random.seed(0)
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(0))
+    collected = []
+    for _ in range(30):
+        env.reset()
+        done = False
+        while not done:
+            collected.append(env.get_obs())
+            _, _, done, _ = env.step(random.choice(env._get_available_actions()))
+    return collected
+
+@pytest.fixture
+def agents():
+    torch.manual_seed(0)
+    torch_agent = DQNAgent(LiarsBarEdiEnv())
+    numpy_agent = DQNAgent(LiarsBarEdiEnv(), backend="numpy")
+    numpy_agent.q_network.load_state_dict(torch_agent.q_network.state_dict())
+    return torch_agent, numpy_agent
+
+def test_forward_parity(agents, states):
+    torch_agent, numpy_agent = agents
+    network = numpy_agent.numpy_network()
+    rows = np.random.default_rng(0).random((64, 29), dtype=np.float32)
+    assert np.allclose(network(rows), torch_agent._forward(rows), atol=1e-5)
+
+    for state in states:
+        ids = state_action_ids(state)
+        assert np.allclose(numpy_agent.q_values(state, ids), torch_agent.q_values(state, ids), atol=1e-5)
+        assert numpy_agent.act(state) == torch_agent.act(state)
+        assert np.array_equal(encode_state(state), torch_agent.encode_state(state))
+
+    state_vecs = np.stack([encode_state(state) for state in states])
+    masks = np.stack([state_action_mask(state) for state in states])
+    assert np.allclose(numpy_agent.q_values_masked(state_vecs, masks), torch_agent.q_values_masked(state_vecs, masks), atol=1e-5)
+    assert network.q_values_all(state_vecs).shape == (len(states), NUM_ACTIONS)
+
+def test_numpy_weights_follow_training(agents, states):
+    _, agent = agents
+    for state, next_state in zip(states, states[1:]):
+        agent.remember(state, random.choice(LiarsBarEdiEnv.get_available_actions(state)), 10, next_state, False)
+    before = agent.numpy_network()
+    agent.train_step()
+    assert agent.numpy_network() is not before
+    rows = np.random.default_rng(1).random((8, 29), dtype=np.float32)
+    with torch.no_grad():
+        expected = agent.q_network(torch.from_numpy(rows)).numpy()[:, 0]
+    assert np.allclose(agent._forward(rows), expected, atol=1e-5)
+
+def test_policy_from_exported_weights(tmp_path, agents, states):
+    torch_agent, _ = agents
+    torch_agent.export_weights(tmp_path / "weights.npz")
+    policy = NumpyDQNPolicy.load(tmp_path / "weights.npz")
+    assert [policy.act(state) for state in states] == [torch_agent.act(state) for state in states]
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        DQNAgent(LiarsBarEdiEnv(), backend="jax")
+
+def test_policy_does_not_import_torch():
+    code = "import sys; from dqn.numpy_qnetwork import NumpyDQNPolicy; assert 'torch' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+
+import numpy as np
+
+from monte_carlo.actions import action_id, state_action_mask
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.mc_trainer import MonteCarloTrainer
+from monte_carlo.parallel import collect_episodes, merge_trajectories
+from monte_carlo.state_index import state_key
+from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
+
+
+def trained_table(agent_cls, trainer_cls, workers):
+    env = LiarsBarEdiEnv()
+    agent = agent_cls(env)
+    trainer_cls(env, agent).train_parallel(episodes=30, workers=workers, sync_every=10, seed=7)
+    return agent.Q
+
+def test_collected_trajectories_are_segmented_per_player():
+    trajectories = collect_episodes(MonteCarloAgent(None), 4, 5, seed=0)
+    segments = trajectories["segments"]
+    assert segments[0] == 0 and segments[-1] == len(trajectories["state_keys"])
+    assert len(trajectories["actions"]) == len(trajectories["rewards"]) == len(trajectories["legal_masks"])
+    # Every player trajectory is legal and ends the round at most once with a challenge
+    assert np.all(trajectories["legal_masks"][np.arange(segments[-1]), trajectories["actions"]])
+    assert np.count_nonzero(trajectories["actions"] == 0) == 5
+
+def test_same_seed_same_table():
+    for agent_cls, trainer_cls in ((MonteCarloAgent, MonteCarloTrainer), (SarsaAgent, SarsaTrainer)):
+        first = trained_table(agent_cls, trainer_cls, workers=2)
+        second = trained_table(agent_cls, trainer_cls, workers=2)
+        assert len(first) > 0
+        assert np.array_equal(first.indexer.keys, second.indexer.keys)
+        assert np.array_equal(first.values, second.values)
+
+def test_merge_matches_learn():
+    rng = np.random.default_rng(1)
+    env = LiarsBarEdiEnv(rng=rng)
+    learned = SarsaAgent(env, rng=rng)
+    merged = SarsaAgent(env)
+    for _ in range(5):
+        env.reset()
+        done = False
+        while not done:
+            _, _, done, _ = env.step(learned.choose_action(env.get_obs()))
+        for episode in env.get_player_reward_history():
+            learned.learn(episode)
+            merge_trajectories(merged, {
+                "state_keys": np.array([state_key(step["state"]) for step in episode], dtype=np.int64),
+                "actions": np.array([action_id(step["action"]) for step in episode], dtype=np.int8),
+                "rewards": np.array([step["reward"] for step in episode], dtype=np.float32),
+                "legal_masks": np.array([state_action_mask(step["state"]) for step in episode]).reshape(-1, 35),
+                "segments": np.array([0, len(episode)]),
+            })
+    # learned also holds the states it only chose actions in, valued 0
+    for state_id, key in enumerate(merged.Q.indexer.keys):
+        assert np.array_equal(merged.Q.values[state_id], learned.Q.values[learned.Q.lookup(key)])
+
+def test_parallel_and_sequential_agents_act_alike():
+    # With epsilon 1 the episodes do not depend on the table, so both agents learn the same ones
+    sequential = MonteCarloAgent(None, epsilon=1.0)
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(3))
+    sequential.env, sequential.rng = env, env.np_random
+    states = []
+    for _ in range(40):
+        env.reset()
+        done = False
+        while not done:
+            states.append(env.get_obs())
+            _, _, done, _ = env.step(sequential.choose_action(states[-1]))
+        for trajectory in env.get_player_reward_history():
+            if len(trajectory):
+                sequential.learn(trajectory)
+
+    parallel = MonteCarloAgent(None, epsilon=1.0)
+    merge_trajectories(parallel, collect_episodes(MonteCarloAgent(None, epsilon=1.0), 4, 40, seed=3))
+    assert np.array_equal(np.sort(parallel.Q.indexer.keys), np.sort(sequential.Q.indexer.keys))
+    # Untried legal actions are known at 0 in both, so a state whose tried actions lost picks the same one
+    assert all(parallel.act(state) == sequential.act(state) for state in states)
@@ -0,0 +1,115 @@
+
+import pickle
+
+import numpy as np
+import pytest
+
+from monte_carlo import actions
+from monte_carlo.history_encoding import HistoryEncoding
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.mc_trainer import MonteCarloTrainer
+from monte_carlo.q_table import QTable, UNKNOWN_ACTION_VALUE
+from monte_carlo.state_index import Observation, StateIndexer, pack_state, state_key, unpack_state_key
+from qlearn.q_agent import QLearningAgent
+from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
+
+
+def test_state_key_is_a_perfect_hash():
+    histories = [[], [1], [2], [3], [1, 1], [3, 3, 3], [1, 2, 3, 1, 2, 3], [3] * 20]
+    keys = set()
+    for history in histories:
+        for table_card in (1, 2, 3):
+            for hand in ([0, 0, 0, 0], [2, 1, 1, 1], [0, 0, 0, 5]):
+                key = pack_state(hand, table_card, history)
+                assert unpack_state_key(key) == (hand, table_card, history)
+                keys.add(key)
+    assert len(keys) == len(histories) * 3 * 3, "Different states got the same key."
+
+def test_observation_reads_like_a_dict():
+    state = Observation((2, 1, 1, 1), 3, (1, 2), 4)
+    as_dict = {"hand": (2, 1, 1, 1), "table_card": 3, "history": (1, 2), "num_players": 4}
+    assert dict(state) == as_dict and state == as_dict
+    assert state["hand"] is state.hand and state.get("players", 0) == 0 and "history" in state
+    assert state_key(state) == state.key == state_key(as_dict)
+    assert pickle.loads(pickle.dumps(state)) == state
+    with pytest.raises(KeyError):
+        state["key"]
+    with pytest.raises(TypeError):
+        state["hand"] = (1, 1, 1, 2)
+    assert state.get("key") is None and "_key" not in state and state.get("table_card") == 3
+    # The hot paths read the attributes of an Observation and the items of a dict the same way
+    assert actions.state_action_ids(state).tolist() == actions.state_action_ids(as_dict).tolist()
+    encoding = HistoryEncoding(last_plays=1, cards_played=True, cards_left=True)
+    assert encoding.state_key(state) == encoding.state_key(as_dict) and HistoryEncoding().state_key(state) == state.key
+
+def test_env_steps_share_one_observation():
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(0))
+    env.reset()
+    state = env.get_obs()
+    assert env.get_obs() is state
+    obs, _, _, _ = env.step(actions.action_from_id(actions.state_action_ids(state)[-1]))
+    assert obs is state and env.get_player_reward_history()[env._previous_player_index][-1]["state"] is state
+    assert env.get_obs() is not state and len(env.get_obs()["history"]) == 1
+
+def test_indexer_assigns_dense_ids():
+    indexer = StateIndexer(capacity=2)
+    for key in (10, 20, 10, 30, 40):
+        indexer.add(key)
+    assert len(indexer) == 4
+    assert indexer.keys.tolist() == [10, 20, 30, 40]
+    assert indexer.lookup(30) == 2
+    assert indexer.lookup(50) == -1
+
+def test_q_table_grows_and_picks_first_best_legal_action():
+    table = QTable(capacity=1)
+    ids = [table.add(key) for key in range(5)]
+    assert ids == [0, 1, 2, 3, 4]
+    assert table.values.shape == (5, actions.NUM_ACTIONS)
+
+    legal = actions.legal_action_mask([1, 1, 0, 0], True, True)
+    state_id = table.add(100, legal)
+    assert table.known_actions(state_id).tolist() == np.flatnonzero(legal).tolist()
+    assert table.best_action(state_id, legal) == actions.CHALLENGE
+    first, second = np.flatnonzero(legal)[1:3]
+    table.set(state_id, first, -5.0)
+    table.set(state_id, second, 7.0)
+    assert table.best_action(state_id, legal) == second
+
+    empty = table.add(200)
+    assert table.best_action(empty, legal, UNKNOWN_ACTION_VALUE) == actions.CHALLENGE
+    assert table.max_value(empty, default=0.0) == 0.0
+    table.set(empty, second, -3.0)
+    assert table.max_value(empty) == -3.0
+    assert table.best_action(empty, legal, UNKNOWN_ACTION_VALUE) == second
+
+def test_agents_train_and_act():
+    rng = np.random.default_rng(0)
+    env = LiarsBarEdiEnv(rng=rng)
+    mc = MonteCarloAgent(env, rng=rng)
+    sarsa = SarsaAgent(env, rng=rng)
+    qlearn = QLearningAgent(env, rng=rng)
+    MonteCarloTrainer(env, mc).train(episodes=20)
+    SarsaTrainer(env, sarsa).train(episodes=20)
+    for _ in range(20):
+        env.reset()
+        done = False
+        while not done:
+            state = env.get_obs()
+            action = qlearn.choose_action(state)
+            next_state, reward, done, _ = env.step(action)
+            qlearn.learn(state, action, reward, next_state, done)
+
+    for agent in (mc, sarsa, qlearn):
+        for _ in range(20):
+            state, _ = env.reset()
+            done = False
+            while not done:
+                state = env.get_obs()
+                action = agent.act(state)
+                assert action in env._get_available_actions(), "Agent played an illegal action."
+                _, _, done, _ = env.step(action)
+
+    assert len(mc.Q) > 0 and len(sarsa.Q) > 0 and len(qlearn.q_table) > 0
+    state = env.get_obs()
+    assert mc.Q.lookup(state_key(state)) == mc.Q.indexer.lookup(state_key(state))
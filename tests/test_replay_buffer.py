@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import torch
+
+from dqn.dqn_agent import DQNAgent
+from dqn.replay_buffer import PrioritizedReplayBuffer, ReplayBuffer, SumTree
+from monte_carlo.mc_env import LiarsBarEdiEnv
+
+
+def fill(buffer, n):
+    for i in range(n):
+        mask = np.zeros(buffer.n_actions, dtype=bool)
+        mask[i % buffer.n_actions] = True
+        buffer.store(np.full(buffer.state_dim, i, dtype=np.float32), i % 35, float(i), np.full(buffer.state_dim, i + 1), i % 2 == 0, mask)
+
+def test_ring_buffer_overwrites_oldest():
+    buffer = ReplayBuffer(capacity=5, seed=0)
+    fill(buffer, 7)
+    assert len(buffer) == 5
+    assert sorted(buffer.rewards.tolist()) == [2.0, 3.0, 4.0, 5.0, 6.0]
+
+    batch = buffer.sample(3)
+    assert batch["states"].shape == (3, 25)
+    assert batch["next_masks"].shape == (3, 35)
+    assert len(set(batch["indices"].tolist())) == 3
+    for index, state, reward in zip(batch["indices"], batch["states"], batch["rewards"]):
+        assert state[0] == reward == buffer.rewards[index]
+
+def test_sum_tree():
+    tree = SumTree(5)
+    tree.update(np.arange(5), np.array([1.0, 2.0, 3.0, 4.0, 0.0]))
+    assert tree.total == 10.0
+    assert tree.find(np.array([0.5, 1.5, 3.5, 9.9])).tolist() == [0, 1, 2, 3]
+    tree.update(np.array([0]), np.array([5.0]))
+    assert tree.total == 14.0
+
+def test_prioritized_sampling_follows_priorities():
+    buffer = PrioritizedReplayBuffer(capacity=4, alpha=1.0, seed=0)
+    fill(buffer, 4)
+    buffer.update_priorities(np.arange(4), np.array([0.0, 0.0, 0.0, 9.0]))
+    counts = np.bincount(np.concatenate([buffer.sample(4)["indices"] for _ in range(500)]), minlength=4)
+    assert counts[3] > 0.9 * counts.sum(), "High priority transition should dominate the samples."
+    batch = buffer.sample(4)
+    assert batch["weights"].max() == 1.0
+
+class LowestDraws:
+    """Stands in for the buffer's generator and draws the lower bound of every stratum."""
+
+    def uniform(self, low, high):
+        return np.asarray(low, dtype=np.float64)
+
+def test_zero_priority_leaf_is_never_sampled():
+    buffer = PrioritizedReplayBuffer(capacity=4, alpha=1.0, seed=0)
+    fill(buffer, 4)
+    buffer.tree.update(np.array([0, 2]), np.array([0.0, 0.0]))
+    buffer.rng = LowestDraws()
+    # The first draw is exactly 0 and later ones fall on the boundary before the zero leaf at 2
+    batch = buffer.sample(4)
+    assert 0 not in batch["indices"] and 2 not in batch["indices"]
+    assert np.all(np.isfinite(batch["weights"]))
+
+def test_save_and_load(tmp_path):
+    buffer = PrioritizedReplayBuffer(capacity=10, seed=0)
+    fill(buffer, 6)
+    buffer.update_priorities(np.array([1, 2]), np.array([3.0, 4.0]))
+    buffer.save(tmp_path / "buffer.npz")
+
+    loaded = PrioritizedReplayBuffer.load(tmp_path / "buffer.npz")
+    assert len(loaded) == 6
+    assert loaded.position == buffer.position
+    assert np.array_equal(loaded.states[:6], buffer.states[:6])
+    assert np.array_equal(loaded.next_masks[:6], buffer.next_masks[:6])
+    assert np.allclose(loaded.tree.priorities, buffer.tree.priorities)
+    assert loaded.tree.total == buffer.tree.total
+
+def test_dqn_trains_with_prioritized_replay():
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+    env = LiarsBarEdiEnv()
+    agent = DQNAgent(env, batch_size=8, prioritized_replay=True)
+    for _ in range(5):
+        state, _ = env.reset()
+        done = False
+        while not done:
+            action = agent.choose_action(state)
+            next_state, reward, done, _ = env.step(action)
+            agent.remember(state, action, reward, next_state, done)
+            agent.train_step()
+            state = env.get_obs()
+    assert agent.train_steps > 0
+    assert agent.memory.tree.total > 0
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from monte_carlo import actions
+from monte_carlo.history_encoding import HistoryEncoding
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.parallel import collect_episodes, merge_trajectories
+from monte_carlo.state_index import state_key
+from monte_carlo.symmetry import (CANONICAL_TABLE_CARD, FROM_CANONICAL, TO_CANONICAL, canonical_keys, canonical_state,
+                                  canonical_steps, from_canonical_action, to_canonical_action)
+from monte_carlo.trajectory_store import TrajectoryStore, TrajectoryWriter, learn_from_store
+from qlearn.q_agent import QLearningAgent
+from sarsa.sarsa_agent import SarsaAgent
+
+
+@pytest.fixture(scope="module")
+def episodes():
+    """Player reward histories of random 4-player episodes."""
+    rng = np.random.default_rng(0)
+    env = LiarsBarEdiEnv(rng=rng)
+    agent = MonteCarloAgent(env, epsilon=1.0, rng=rng)
+    recorded = []
+    for _ in range(60):
+        env.reset()
+        done = False
+        while not done:
+            _, _, done, _ = env.step(agent.choose_action(env.get_obs()))
+        recorded.append(env.get_player_reward_history())
+    return recorded
+
+@pytest.fixture(scope="module")
+def steps(episodes):
+    return [step for episode in episodes for trajectory in episode for step in trajectory]
+
+def test_action_relabeling_is_a_permutation():
+    for table_card in range(4):
+        assert sorted(TO_CANONICAL[table_card].tolist()) == list(range(actions.NUM_ACTIONS))
+        assert np.array_equal(FROM_CANONICAL[table_card][TO_CANONICAL[table_card]], np.arange(actions.NUM_ACTIONS))
+        assert to_canonical_action(0, table_card) == 0
+    assert to_canonical_action(5, None) == from_canonical_action(5, None) == 5
+
+def test_canonical_steps_keep_legality_and_honesty(steps):
+    for step in steps:
+        state, table_card = step["state"], step["state"]["table_card"]
+        canonical = canonical_state(state)
+        assert canonical["table_card"] == CANONICAL_TABLE_CARD and sorted(canonical["hand"]) == sorted(state["hand"])
+        action_id = to_canonical_action(actions.action_id(step["action"]), table_card)
+        assert actions.state_action_mask(canonical)[action_id]
+        assert np.array_equal(actions.state_action_mask(canonical)[TO_CANONICAL[table_card]], actions.state_action_mask(state))
+        # Cards of the table card and jokers stay the honest ones
+        played = actions.ACTIONS[action_id]
+        assert played[0] + played[1] == step["action"][0] + step["action"][table_card]
+
+def test_vectorized_matches(tmp_path, episodes, steps):
+    keys = [state_key(step["state"]) for step in steps]
+    assert canonical_keys(keys).tolist() == [state_key(canonical_state(step["state"])) for step in steps]
+
+    with TrajectoryWriter(tmp_path / "store") as writer:
+        for episode in episodes:
+            writer.add_episode(episode)
+    store = TrajectoryStore(tmp_path / "store")
+    ids, masks = canonical_steps(store["table_card"], store["action"], store.legal_masks())
+    assert ids.tolist() == [to_canonical_action(actions.action_id(step["action"]), step["state"]["table_card"]) for step in steps]
+    assert np.array_equal(masks, [actions.state_action_mask(canonical_state(step["state"])) for step in steps])
+
+@pytest.mark.parametrize("agent_cls", [MonteCarloAgent, SarsaAgent])
+def test_canonical_tables_are_smaller(episodes, agent_cls):
+    encoding = HistoryEncoding(last_plays=1)
+    plain = agent_cls(None, history_encoding=encoding)
+    canonical = agent_cls(None, history_encoding=encoding, canonical_ranks=True)
+    for episode in episodes:
+        for trajectory in episode:
+            if len(trajectory):
+                plain.learn(trajectory)
+                canonical.learn(trajectory)
+
+    table_cards = (canonical.Q.indexer.keys // actions.NUM_HANDS) % 4
+    assert np.all(table_cards == CANONICAL_TABLE_CARD)
+    # The observations that only differ by the table card share one state
+    assert set(canonical.Q.indexer.keys.tolist()) == set(canonical_keys(plain.Q.indexer.keys).tolist())
+    assert len(canonical.Q) < len(plain.Q)
+
+def test_parallel_collection():
+    agent = MonteCarloAgent(None, canonical_ranks=True)
+    trajectories = collect_episodes(agent, 4, 20, seed=0)
+    assert np.all((trajectories["state_keys"] // actions.NUM_HANDS) % 4 == CANONICAL_TABLE_CARD)
+    assert np.all(trajectories["legal_masks"][np.arange(len(trajectories["actions"])), trajectories["actions"]])
+    merge_trajectories(agent, trajectories)
+    assert len(agent.Q) > 0
+
+@pytest.mark.parametrize("agent_cls", [MonteCarloAgent, SarsaAgent])
+def test_store_learning_matches_collected(tmp_path, episodes, agent_cls):
+    with TrajectoryWriter(tmp_path / "store") as writer:
+        for episode in episodes:
+            writer.add_episode(episode)
+    offline = agent_cls(None, canonical_ranks=True, history_encoding=HistoryEncoding(last_plays=2))
+    learn_from_store(offline, TrajectoryStore(tmp_path / "store"), batch_size=100)
+
+    online = agent_cls(None, canonical_ranks=True, history_encoding=HistoryEncoding(last_plays=2))
+    for episode in episodes:
+        for trajectory in episode:
+            if len(trajectory):
+                online.learn(trajectory)
+    assert np.array_equal(offline.Q.indexer.keys, online.Q.indexer.keys)
+    assert np.allclose(offline.Q.values, online.Q.values)
+
+@pytest.mark.parametrize("agent_cls", [MonteCarloAgent, SarsaAgent, QLearningAgent])
+def test_agents_play_real_actions(tmp_path, agent_cls):
+    env = LiarsBarEdiEnv(rng=np.random.default_rng(1))
+    agent = agent_cls(env, canonical_ranks=True, rng=np.random.default_rng(1))
+    for _ in range(5):
+        env.reset()
+        done = False
+        while not done:
+            state = env.get_obs()
+            action = agent.choose_action(state)
+            assert env.get_action_mask()[actions.action_id(action)]
+            next_state, reward, done, _ = env.step(action)
+            if agent_cls is QLearningAgent:
+                agent.learn(state, action, reward, next_state, done)
+        if agent_cls is not QLearningAgent:
+            for trajectory in env.get_player_reward_history():
+                if len(trajectory):
+                    agent.learn(trajectory)
+
+    agent.save(tmp_path / "agent")
+    loaded = agent_cls.load(tmp_path / "agent")
+    assert loaded.canonical_ranks
+    for step in (step for trajectory in env.get_player_reward_history() for step in trajectory):
+        action = loaded.act(step["state"])
+        assert actions.state_action_mask(step["state"])[actions.action_id(action)]
+        if hasattr(loaded, "action_probabilities"):
+            probabilities = loaded.action_probabilities(step["state"])
+            assert probabilities[actions.action_id(action)] > 0
+            assert probabilities.sum() == pytest.approx(1)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
+from tournament import TournamentResult, run_tournament, seat_schedule, wilson_interval
+
+
+def untrained_mc():
+    return MonteCarloAgent(LiarsBarEdiEnv())
+
+def trained_sarsa():
+    env = LiarsBarEdiEnv()
+    agent = SarsaAgent(env)
+    SarsaTrainer(env, agent).train_parallel(episodes=20, workers=1, seed=0)
+    return agent
+
+AGENTS = {"mc_a": untrained_mc, "mc_b": untrained_mc, "sarsa": trained_sarsa, "mc_c": untrained_mc}
+
+def test_seat_schedule_is_balanced():
+    lineups = np.array(seat_schedule(4, 4))
+    assert len(lineups) == 24
+    for seat in range(4):
+        assert np.all(np.bincount(lineups[:, seat]) == 6), "Every agent should play every seat equally often."
+    assert len(seat_schedule(5, 2)) == 20
+    with pytest.raises(ValueError):
+        seat_schedule(2, 3)
+
+def test_wilson_interval():
+    low, high = wilson_interval([0, 50, 10], [10, 100, 0])
+    assert low[0] == 0.0 and 0.0 < high[0] < 0.35
+    assert low[1] == pytest.approx(0.404, abs=1e-3) and high[1] == pytest.approx(0.596, abs=1e-3)
+    assert (low[2], high[2]) == (0.0, 1.0)
+
+def test_result_statistics():
+    lineups = np.array([[0, 1, 2], [2, 0, 1]])
+    rankings = np.array([[1, 0, 2], [1, 2, 0]])
+    result = TournamentResult(["a", "b", "c"], lineups, rankings)
+    assert result.wins.tolist() == [0, 2, 0]
+    assert result.games.tolist() == [2, 2, 2]
+    assert result.seat_wins[1].tolist() == [0, 1, 1]
+    assert result.head_to_head[1].tolist() == [2, 0, 2]
+    assert result.head_to_head[0, 2] == 1 and result.head_to_head[2, 0] == 1
+    assert "head to head" in result.summary()
+
+def test_results_do_not_depend_on_workers():
+    single = run_tournament(AGENTS, matches=48, workers=1, seed=3)
+    pooled = run_tournament(AGENTS, matches=48, workers=2, seed=3, chunk_size=5)
+    assert np.array_equal(single.rankings, pooled.rankings)
+    assert single.wins.sum() == 48
+    assert np.all(single.seat_games == 12)
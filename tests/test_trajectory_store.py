@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from monte_carlo import actions
+from monte_carlo.mc_agent import MonteCarloAgent
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.mc_trainer import MonteCarloTrainer
+from monte_carlo.state_index import state_key
+from monte_carlo.trajectory_store import TrajectoryStore, TrajectoryWriter, learn_from_store, main, record_episodes
+from sarsa.sarsa_agent import SarsaAgent, SarsaTrainer
+
+
+def play_episodes(path, episodes, seed=0, num_players=4, chunk_size=64):
+    """Plays random episodes into the store at path and returns their steps, as the env recorded them."""
+    rng = np.random.default_rng(seed)
+    env = LiarsBarEdiEnv(num_players=num_players, rng=rng)
+    agent = MonteCarloAgent(env, epsilon=1.0, rng=rng)
+    steps = []
+    with TrajectoryWriter(path, chunk_size) as writer:
+        for _ in range(episodes):
+            env.reset()
+            done = False
+            while not done:
+                _, _, done, _ = env.step(agent.choose_action(env.get_obs()))
+            writer.add_episode(env.get_player_reward_history())
+            steps.extend(step for trajectory in env.get_player_reward_history() for step in trajectory)
+    return steps
+
+def entries(agent):
+    return {(key, action): agent.Q.values[row, action]
+            for row, key in enumerate(agent.Q.indexer.keys.tolist()) for action in np.flatnonzero(agent.Q.mask[row])}
+
+def test_columns_round_trip(tmp_path):
+    steps = play_episodes(tmp_path / "store", 40) + play_episodes(tmp_path / "store", 10, seed=1, num_players=3)
+    store = TrajectoryStore(tmp_path / "store")
+    assert len(store) == len(steps) and store.num_episodes == 50
+    assert store["episode"][-1] == 49 and np.all(np.diff(store["episode"]) >= 0)
+
+    assert store.state_keys().tolist() == [state_key(step["state"]) for step in steps]
+    assert np.array_equal(store.legal_masks(), [actions.state_action_mask(step["state"]) for step in steps])
+    assert store["action"].tolist() == [actions.action_id(step["action"]) for step in steps]
+    assert store["reward"].tolist() == [step["reward"] for step in steps]
+    assert np.array_equal(TrajectoryStore(tmp_path / "store", mmap=False)["history"], store["history"])
+
+def test_batches_hold_whole_trajectories(tmp_path):
+    play_episodes(tmp_path / "store", 30)
+    store = TrajectoryStore(tmp_path / "store")
+    segments = store.segments()
+    assert np.all(np.diff(segments) > 0)
+
+    batches = list(store.batches(batch_size=50))
+    assert len(batches) > 1
+    assert np.array_equal(np.concatenate([batch["state_keys"] for batch in batches]), store.state_keys())
+    offsets = np.concatenate([batch["segments"][:-1] + start for batch, start in
+                              zip(batches, np.cumsum([0] + [len(batch["actions"]) for batch in batches]))])
+    assert np.array_equal(offsets, segments[:-1])
+    # The recorded actions are legal in their recorded states
+    for batch in batches:
+        assert batch["segments"][-1] == len(batch["actions"])
+        assert np.all(batch["legal_masks"][np.arange(len(batch["actions"])), batch["actions"]])
+
+def test_uncommitted_rows_are_dropped(tmp_path):
+    play_episodes(tmp_path / "store", 5)
+    rows = len(TrajectoryStore(tmp_path / "store"))
+    with open(tmp_path / "store" / "reward.bin", "ab") as file:
+        file.write(b"\0" * 12)
+    play_episodes(tmp_path / "store", 5, seed=1)
+    store = TrajectoryStore(tmp_path / "store")
+    assert store.num_episodes == 10
+    assert len(store) == (tmp_path / "store" / "reward.bin").stat().st_size // 4
+    assert store["episode"][rows] == 5
+
+def test_empty_store_and_bad_chunk_size(tmp_path):
+    TrajectoryWriter(tmp_path / "store").close()
+    store = TrajectoryStore(tmp_path / "store")
+    assert len(store) == 0 and list(store.batches()) == []
+    with pytest.raises(ValueError):
+        TrajectoryWriter(tmp_path / "other", chunk_size=4)
+
+@pytest.mark.parametrize("agent_cls, trainer_cls", [(MonteCarloAgent, MonteCarloTrainer), (SarsaAgent, SarsaTrainer)])
+def test_learning_from_store_matches_training(tmp_path, capsys, agent_cls, trainer_cls):
+    rng = np.random.default_rng(0)
+    env = LiarsBarEdiEnv(rng=rng)
+    trained = agent_cls(env, rng=rng)
+    with TrajectoryWriter(tmp_path / "store") as writer:
+        trainer_cls(env, trained).train(episodes=30, recorder=writer)
+
+    offline = agent_cls(None)
+    trainer_cls(None, offline).train_from_store(tmp_path / "store", batch_size=40)
+    # The trained agent also has entries, still at 0, for the legal actions it did not take
+    learned = entries(offline)
+    assert len(learned) > 0 and set(learned) <= set(entries(trained))
+    assert all(value == pytest.approx(learned.get(entry, 0.0)) for entry, value in entries(trained).items())
+
+def test_record_episodes(tmp_path, capsys):
+    rows = record_episodes(MonteCarloAgent(None, epsilon=1.0), tmp_path / "store", 20, rng=np.random.default_rng(0))
+    assert rows == len(TrajectoryStore(tmp_path / "store"))
+    agent = MonteCarloAgent(None)
+    learn_from_store(agent, TrajectoryStore(tmp_path / "store"))
+    assert len(agent.Q) > 0
+
+    main([str(tmp_path / "store"), "--episodes", "5", "--seed", "1"])
+    assert TrajectoryStore(tmp_path / "store").num_episodes == 25
+    assert "the store has" in capsys.readouterr().out
@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+import pytest
+
+from monte_carlo.mc_env import LiarsBarEdiEnv
+from monte_carlo.vec_env import LiarsBarVecEnv
+
+
+@pytest.fixture
+def vec_env():
+    environment = LiarsBarVecEnv(num_envs=8, num_players=4, seed=0)
+    environment.reset()
+    return environment
+
+def test_reset_deals_five_cards(vec_env):
+    assert vec_env.hands.shape == (8, 4, 4)
+    assert np.all(vec_env.hands.sum(axis=2) == 5), "Every player should start with 5 cards."
+    assert np.all(vec_env.hands[:, :, 0].sum(axis=1) <= 2), "There are only 2 jokers."
+    assert np.all(np.isin(vec_env.table_card, [1, 2, 3]))
+    assert np.all(vec_env.history_length == 0)
+    assert np.all(vec_env.previous_player == -1)
+
+def test_challenge_without_previous_player(vec_env):
+    with pytest.raises(ValueError):
+        vec_env.step(np.zeros((8, 4), dtype=np.int8))
+
+def test_single_env_reset_seed():
+    def deals(env, seed):
+        return [env.reset(seed=seed)[0]] + [env.reset()[0] for _ in range(5)]
+    assert deals(LiarsBarEdiEnv(), 4) == deals(LiarsBarEdiEnv(), 4)
+    assert deals(LiarsBarEdiEnv(), 4) != deals(LiarsBarEdiEnv(), 5)
+    assert deals(LiarsBarEdiEnv(rng=np.random.default_rng(4)), None) == deals(LiarsBarEdiEnv(rng=np.random.default_rng(4)), None)
+
+def test_matches_single_env():
+    random.seed(1)
+    env = LiarsBarEdiEnv(num_players=3, rng=np.random.default_rng(1))
+    vec_env = LiarsBarVecEnv(num_envs=1, num_players=3, seed=1)
+
+    for _ in range(200):
+        env.reset()
+        vec_env.load_state(0, env)
+        done = False
+        while not done:
+            obs = vec_env.get_obs_dicts()[0]
+            assert obs == env.get_obs(), "Observations diverged."
+
+            player = env._current_player_index
+            previous = env._previous_player_index
+            action = random.choice(env._get_available_actions())
+            if previous is not None:
+                reward_before = env.get_player_reward_history()[previous][-1]["reward"]
+            _, reward, done, _ = env.step(action)
+            _, vec_reward, vec_done, info = vec_env.step(np.array([action]))
+
+            assert vec_done[0] == done
+            assert vec_reward[0] == reward
+            assert info["player_rewards"][0, player] == reward
+            if done and previous is not None:
+                expected = env.get_player_reward_history()[previous][-1]["reward"] - reward_before
+                if previous != player:
+                    assert info["player_rewards"][0, previous] == expected, "Punishment of the previous player differs."
+            if not done:
+                assert vec_env.hands[0].tolist() == [list(p["hand"]) for p in env._players]
+                assert vec_env.current_player[0] == env._current_player_index
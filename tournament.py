@@ -0,0 +1,193 @@
+"""
+Tournament runner around LiarsBarArena.LiarsBarGame.
+
+Matches are split in chunks and played by a process pool. Every worker builds
+its agents once, from a factory (any picklable callable, e.g. a module level
+function or functools.partial), a checkpoint path or an already trained agent,
+so the trainers never travel to the workers.
+
+Seats are assigned systematically: match i uses lineup i % len(lineups), where
+the lineups are every ordering of every group of `seats` agents. Each match gets
+its own numpy Generator seeded from (seed, match index), which deals the game and
+replaces the rng of the agents that have one, so the results do not depend on the
+number of workers or the chunk size.
+"""
+import copy
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, permutations
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from LiarsBarArena import LiarsBarGame
+from agent_registry import build_agent
+
+
+def seat_schedule(num_agents: int, seats: int) -> List[Tuple[int, ...]]:
+    """Every ordering of every group of `seats` agents; seat i is played by lineup[i]."""
+    if not 2 <= seats <= num_agents:
+        raise ValueError(f"Cannot seat {num_agents} agents at {seats} seats.")
+    return [lineup for group in combinations(range(num_agents), seats) for lineup in permutations(group)]
+
+
+def wilson_interval(wins, games, z: float = 1.96):
+    """Wilson score interval of a win rate, works element-wise on arrays."""
+    wins = np.asarray(wins, dtype=np.float64)
+    games = np.asarray(games, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = wins / games
+        denominator = 1 + z ** 2 / games
+        center = (p + z ** 2 / (2 * games)) / denominator
+        margin = z * np.sqrt(p * (1 - p) / games + z ** 2 / (4 * games ** 2)) / denominator
+    low = np.where(games > 0, np.clip(center - margin, 0.0, 1.0), 0.0)
+    high = np.where(games > 0, np.clip(center + margin, 0.0, 1.0), 1.0)
+    return low, high
+
+
+class TournamentResult:
+    """
+    Outcome of a tournament: rankings[m] holds the agent indices of match m
+    from the winner to the first player eliminated, lineups[m] the agent of every seat.
+    """
+
+    def __init__(self, names: List[str], lineups: np.ndarray, rankings: np.ndarray):
+        self.names = names
+        self.lineups = lineups
+        self.rankings = rankings
+
+        matches, seats = lineups.shape
+        num_agents = len(names)
+        rows = np.arange(matches)
+
+        # places[m, agent] = finishing place of agent in match m (0 = winner), -1 if it did not play
+        self.places = np.full((matches, num_agents), -1, dtype=np.int64)
+        self.places[rows[:, None], rankings] = np.arange(seats)
+
+        self.games = np.bincount(lineups.ravel(), minlength=num_agents)
+        self.wins = np.bincount(rankings[:, 0], minlength=num_agents)
+
+        self.seat_games = np.zeros((num_agents, seats), dtype=np.int64)
+        np.add.at(self.seat_games, (lineups, np.arange(seats)), 1)
+        self.seat_wins = np.zeros((num_agents, seats), dtype=np.int64)
+        winner_seats = np.argmax(lineups == rankings[:, :1], axis=1)
+        np.add.at(self.seat_wins, (rankings[:, 0], winner_seats), 1)
+
+        # head_to_head[a, b] = matches where a outlasted b
+        played = self.places >= 0
+        both = played[:, :, None] & played[:, None, :]
+        ahead = self.places[:, :, None] < self.places[:, None, :]
+        self.head_to_head = np.sum(both & ahead, axis=0)
+
+    @property
+    def win_rates(self) -> np.ndarray:
+        return self.wins / np.maximum(self.games, 1)
+
+    def confidence_intervals(self, z: float = 1.96):
+        return wilson_interval(self.wins, self.games, z)
+
+    @property
+    def seat_win_rates(self) -> np.ndarray:
+        return self.seat_wins / np.maximum(self.seat_games, 1)
+
+    def head_to_head_rates(self) -> np.ndarray:
+        """Share of the matches between a and b where a outlasted b."""
+        meetings = self.head_to_head + self.head_to_head.T
+        return self.head_to_head / np.maximum(meetings, 1)
+
+    def summary(self) -> str:
+        low, high = self.confidence_intervals()
+        width = max(len(name) for name in self.names)
+        lines = [f"{'agent':<{width}}  games   wins  win rate  95% CI           " + "  ".join(f"seat {i}" for i in range(self.lineups.shape[1]))]
+        for index, name in enumerate(self.names):
+            seats = "  ".join(f"{rate:6.3f}" for rate in self.seat_win_rates[index])
+            lines.append(
+                f"{name:<{width}}  {self.games[index]:5d}  {self.wins[index]:5d}  {self.win_rates[index]:8.3f}  "
+                f"[{low[index]:.3f}, {high[index]:.3f}]   {seats}"
+            )
+
+        lines.append("")
+        lines.append("head to head (row outlasted column)")
+        rates = self.head_to_head_rates()
+        lines.append(" " * width + "  " + "  ".join(f"{name:>{width}}" for name in self.names))
+        for index, name in enumerate(self.names):
+            lines.append(f"{name:<{width}}  " + "  ".join(
+                f"{'-':>{width}}" if index == other else f"{rates[index, other]:>{width}.3f}"
+                for other in range(len(self.names))
+            ))
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.summary()
+
+
+# Per-process state set by _init_worker
+_agents = []
+_lineups = []
+_entropy = 0
+
+
+def _init_worker(specs, lineups, entropy):
+    global _agents, _lineups, _entropy
+    _agents = []
+    for spec in specs:
+        agent = build_agent(spec)
+        # LiarsBarGame finds agents by identity, so every seat needs its own object
+        if any(agent is other for other in _agents):
+            agent = copy.deepcopy(agent)
+        _agents.append(agent)
+    _lineups = lineups
+    _entropy = entropy
+
+
+def _play_matches(match_indices: range) -> np.ndarray:
+    rankings = np.empty((len(match_indices), len(_lineups[0])), dtype=np.int64)
+    for row, match in enumerate(match_indices):
+        rng = np.random.default_rng(np.random.SeedSequence(_entropy, spawn_key=(match,)))
+
+        lineup = _lineups[match % len(_lineups)]
+        game = LiarsBarGame(rng=rng)
+        for agent_index in lineup:
+            agent = _agents[agent_index]
+            if hasattr(agent, "rng"):
+                agent.rng = rng
+            game.register_agent(agent)
+        game.run_game()
+        rankings[row] = [lineup[seat] for seat in game.get_ranking()]
+    return rankings
+
+
+def run_tournament(
+        agents: Dict[str, object],
+        matches: int = 1000,
+        seats: Optional[int] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        chunk_size: Optional[int] = None
+) -> TournamentResult:
+    """
+    Play `matches` games between the agents, given as name -> factory / checkpoint path / agent.
+    By default all agents sit at every game and one worker runs per CPU.
+    """
+    names = list(agents)
+    specs = list(agents.values())
+    seats = len(names) if seats is None else seats
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    lineups = seat_schedule(len(names), seats)
+    entropy = np.random.SeedSequence(seed).entropy
+
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(matches / (4 * workers)))
+    chunks = [range(start, min(start + chunk_size, matches)) for start in range(0, matches, chunk_size)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs, lineups, entropy)) as executor:
+            results = list(executor.map(_play_matches, chunks))
+    else:
+        _init_worker(specs, lineups, entropy)
+        results = [_play_matches(chunk) for chunk in chunks]
+
+    match_lineups = np.array([lineups[match % len(lineups)] for match in range(matches)], dtype=np.int64).reshape(matches, seats)
+    rankings = np.concatenate(results) if results else np.empty((0, seats), dtype=np.int64)
+    return TournamentResult(names, match_lineups, rankings)